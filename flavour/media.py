@@ -0,0 +1,171 @@
+"""
+Production media serving.
+
+django.views.static.serve reads each file through Python with no caching
+headers and no range support, holding a worker for the whole download. This
+view instead:
+
+* hands the transfer to the front-end server with X-Accel-Redirect (nginx) or
+  X-Sendfile (Apache/lighttpd) when MEDIA_X_ACCEL_REDIRECT_PREFIX or
+  MEDIA_USE_X_SENDFILE is configured, which is how production should run;
+* otherwise streams the file, including single byte ranges. A sync gunicorn
+  worker sends it with os.sendfile() (zero-copy); under the ASGI worker the
+  app is deployed on, it is read block by block on a thread instead (see
+  flavour.responses), which is why the front-end server should do it;
+* marks content-hashed files (e.g. image derivatives) as immutable for a year
+  and lets everything else revalidate cheaply via ETag/Last-Modified.
+"""
+import mimetypes
+import os
+import re
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .responses import AsyncFileResponse
+
+
+# Files named like "dish-card.0123456789ab.webp" never change content.
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[A-Za-z0-9]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+DEFAULT_MAX_AGE = 60 * 60
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """
+    File-like view of `length` bytes of an open file from its current offset.
+
+    fileno() is kept so a WSGI server can still sendfile() the range; it
+    sends exactly Content-Length bytes from the file's current position.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) inclusive for a single-range Range header.
+
+    Returns None when the header should be ignored (absent, malformed or
+    multi-range) and raises ValueError when the range is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError('empty suffix range')
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('range not satisfiable')
+    return start, end
+
+
+def cache_headers(response, path):
+    """Set Cache-Control for a media file depending on whether its name is hashed."""
+    if HASHED_NAME_RE.search(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=DEFAULT_MAX_AGE)
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid media path')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    # 304 Not Modified (or 412 for a failed If-Match), without touching the file
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if conditional is not None:
+        return cache_headers(conditional, path)
+
+    accel_prefix = getattr(settings, 'MEDIA_X_ACCEL_REDIRECT_PREFIX', '')
+    if accel_prefix or getattr(settings, 'MEDIA_USE_X_SENDFILE', False):
+        # The front-end server does the transfer (and range handling).
+        response = HttpResponse(content_type=content_type)
+        if accel_prefix:
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(path)
+        else:
+            response['X-Sendfile'] = full_path
+    else:
+        response = _file_response(request, full_path, stat.st_size, content_type, etag)
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Accept-Ranges'] = 'bytes'
+    return cache_headers(response, path)
+
+
+def _file_response(request, full_path, size, content_type, etag):
+    """Stream the whole file, or a single requested byte range of it."""
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    f = open(full_path, 'rb')
+    if byte_range is None:
+        return AsyncFileResponse(f, content_type=content_type)
+
+    start, end = byte_range
+    length = end - start + 1
+    f.seek(start)
+    response = AsyncFileResponse(FileRange(f, length), status=206, content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,42 @@
+"""
+Streaming responses that also stream under ASGI.
+
+Under ASGI, Django reads a StreamingHttpResponse (FileResponse included) with
+a synchronous iterator through sync_to_async(list): the whole body is built in
+memory, on a thread, before the first byte is sent. These subclasses keep the
+synchronous iterator, so WSGI (and the test client) streams it as before, and
+give the ASGI handler an asynchronous one that pulls a block at a time with
+sync_to_async, so only one block is held whichever way the app is served.
+"""
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, StreamingHttpResponse
+
+
+_END = object()
+
+
+class AsyncIterableMixin:
+    """Serve a synchronous streaming body to ASGI one block at a time."""
+
+    async def __aiter__(self):
+        if self.is_async:
+            async for part in self.streaming_content:
+                yield part
+            return
+        parts = self.streaming_content
+        # Thread-sensitive, so a database cursor behind parts stays on the
+        # thread that opened it.
+        next_part = sync_to_async(next)
+        while (part := await next_part(parts, _END)) is not _END:
+            yield part
+
+
+class AsyncStreamingHttpResponse(AsyncIterableMixin, StreamingHttpResponse):
+    """StreamingHttpResponse that streams under WSGI and ASGI alike."""
+
+
+class AsyncFileResponse(AsyncIterableMixin, FileResponse):
+    """FileResponse that streams under WSGI and ASGI alike."""
+
+    # Each block is a thread hop under ASGI, so use fewer, larger ones.
+    block_size = 64 * 1024
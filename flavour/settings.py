@@ -111,7 +111,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # For static files in production
+    'flavour.middleware.AsyncWhiteNoiseMiddleware',  # WhiteNoise (static files in production), async-capable
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -162,6 +162,38 @@ else:
     }
 
 
+# Cache configuration - use Redis when REDIS_URL is set, local memory otherwise.
+# The menu version lives in the default cache; without a shared cache each
+# worker only notices another's menu writes after MENU_VERSION_TIMEOUT.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# How long a worker trusts its cached menu version before recomputing it from
+# the database. A shared cache carries every bump to all workers; a
+# per-process one must expire so changes made elsewhere are picked up.
+MENU_VERSION_TIMEOUT = None if os.getenv('REDIS_URL') else 5
+
+# Rendered menu cards; keys include updated_at so entries never go stale and
+# can stay per-process. Kept separate so they cannot evict the menu version.
+CACHES['template_fragments'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'template-fragments',
+    'TIMEOUT': 86400,
+    'OPTIONS': {
+        'MAX_ENTRIES': 5000,
+    },
+}
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -234,7 +266,29 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Let the front-end server send media files in production. Without it the
+# ASGI worker streams each download through a thread, block by block (no sendfile).
+# nginx: set MEDIA_X_ACCEL_REDIRECT_PREFIX to an `internal` location aliased
+# to MEDIA_ROOT (e.g. /protected-media/). Apache/lighttpd: MEDIA_USE_X_SENDFILE=True.
+MEDIA_X_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_X_ACCEL_REDIRECT_PREFIX', '')
+MEDIA_USE_X_SENDFILE = os.getenv('MEDIA_USE_X_SENDFILE', 'False').lower() == 'true'
+
+# Rendered invoice PDFs. They are private, so keep this outside MEDIA_ROOT.
+INVOICE_ROOT = os.getenv('INVOICE_ROOT', str(BASE_DIR / 'private' / 'invoices'))
+
 
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY', '')
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
+
+# Stripe API calls (restaurant.payments): seconds allowed per attempt and
+# retries after a network error. STRIPE_API_BASE sends them to another server,
+# e.g. restaurant.fake_stripe in tests and benchmarks.
+STRIPE_TIMEOUT = float(os.getenv('STRIPE_TIMEOUT', '5'))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv('STRIPE_MAX_NETWORK_RETRIES', '1'))
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', '')
+
+
+# Cart storage (see restaurant.cart): 'session' keeps carts in the session and
+# only creates an Order at checkout; 'database' stores them as pending Orders.
+CART_ENGINE = os.getenv('CART_ENGINE', 'session')
@@ -29,16 +29,17 @@ urlpatterns = [
 
 # Serve media files
 # In development: use static() helper
-# In production: serve through Django (Railway's file system is ephemeral, but this works for now)
+# In production: serve through flavour.media (Railway's file system is ephemeral, but this works for now)
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 else:
-    # In production, serve media files through Django
+    # Sends long-lived cache headers, supports range requests and hands the
+    # transfer to nginx/Apache (X-Accel-Redirect/X-Sendfile) when configured.
     # Note: Railway's file system is ephemeral - files will be lost on redeploy
     # For production, consider using cloud storage (AWS S3, Cloudinary, etc.)
-    from django.views.static import serve
     from django.urls import re_path
+    from .media import serve_media
     
     urlpatterns += [
-        re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
-    ]
\ No newline at end of file
+        re_path(r'^media/(?P<path>.*)$', serve_media, name='media'),
+    ]
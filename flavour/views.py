@@ -1,5 +1,14 @@
 from django.shortcuts import render
 
+from restaurant.conditional import conditional_page, page_etag
+
+
+def _home_etag(request):
+    """The home page is static apart from the visitor's navbar."""
+    return page_etag(request, 'home')
+
+
+@conditional_page(_home_etag)
 def home(request):
     """Home page view."""
     return render(request, 'home.html')
@@ -1,5 +1,12 @@
-from django.contrib import admin
+import tempfile
+
+from django.contrib import admin, messages
+from django.utils import timezone
 from django.utils.html import format_html
+
+from flavour.responses import AsyncFileResponse
+
+from .invoice_archive import write_invoice_archive
 from .models import MenuItem, Order, OrderItem, Reservation
 
 
@@ -8,6 +15,19 @@ class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
     readonly_fields = ['subtotal']
+    
+    def get_queryset(self, request):
+        """Join the dish and order that each row's label (OrderItem.__str__) reads."""
+        return super().get_queryset(request).select_related('menu_item', 'order')
+    
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """Load the menu item choices once per request instead of once per row."""
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'menu_item':
+            if not hasattr(request, '_menu_item_choices'):
+                request._menu_item_choices = list(formfield.choices)
+            formfield.choices = request._menu_item_choices
+        return formfield
 
 
 @admin.register(MenuItem)
@@ -56,6 +76,12 @@ class MenuItemAdmin(admin.ModelAdmin):
     list_per_page = 25
     list_editable = ['is_available', 'price']  # Quick edit from list view
     
+    def save_model(self, request, obj, form, change):
+        """Save the item and generate resized copies of a new image."""
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            obj.update_image_derivatives()
+    
     def has_image(self, obj):
         """Display checkmark if item has image."""
         return bool(obj.image)
@@ -67,7 +93,7 @@ class MenuItemAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-width: 200px; max-height: 200px; border-radius: 8px;" />',
-                obj.image.url
+                obj.thumbnail_url
             )
         return format_html('<span style="color: #999;">No image uploaded</span>')
     image_preview.short_description = 'Image Preview'
@@ -86,10 +112,36 @@ class OrderAdmin(admin.ModelAdmin):
     ]
     list_filter = ['status', 'payment_status', 'created_at']
     search_fields = ['order_number', 'user__username', 'user__email']
-    readonly_fields = ['order_number', 'created_at', 'updated_at']
+    readonly_fields = ['order_number', 'total_amount', 'created_at', 'updated_at']
     inlines = [OrderItemInline]
     ordering = ['-created_at']
     list_per_page = 20
+    list_select_related = ['user']
+    actions = ['download_invoices']
+    
+    @admin.action(description='Download invoices of selected paid orders (ZIP)')
+    def download_invoices(self, request, queryset):
+        """
+        Return a ZIP of the selected paid orders' invoices. It is rendered in
+        this process; use the export_invoices command for large exports.
+        """
+        if not queryset.filter(payment_status='paid').exists():
+            self.message_user(request, 'None of the selected orders is paid.', messages.WARNING)
+            return None
+        archive = tempfile.TemporaryFile()
+        write_invoice_archive(queryset, archive)
+        archive.seek(0)
+        return AsyncFileResponse(
+            archive,
+            as_attachment=True,
+            filename=f'invoices-{timezone.now():%Y%m%d-%H%M%S}.zip',
+            content_type='application/zip',
+        )
+    
+    def save_related(self, request, form, formsets, change):
+        """Save the items, then reconcile the total with them."""
+        super().save_related(request, form, formsets, change)
+        form.instance.calculate_total()
 
 
 @admin.register(Reservation)
@@ -109,4 +161,5 @@ class ReservationAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     ordering = ['date', 'time']
     list_per_page = 20
+    list_select_related = ['user']
 
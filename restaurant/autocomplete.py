@@ -0,0 +1,321 @@
+"""
+Typo-tolerant, in-memory autocomplete over the available menu.
+
+Words from each item's name and description go into a prefix trie (for
+as-you-type matching) and a trigram index (for finding candidates within a
+small edit distance, so "tiramsu" still finds "Tiramisu"). The index is built
+from the menu snapshot and then kept current by restaurant.signals, which
+applies each committed MenuItem write instead of rebuilding. A write is made
+to a copy that then replaces the live index, so an index a lookup is reading
+never changes under it.
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from .menu_cache import get_menu_snapshot, get_menu_version
+
+
+MIN_FUZZY_LENGTH = 4
+
+_word_re = re.compile(r'\w+', re.UNICODE)
+
+_index = None
+_index_lock = threading.RLock()
+
+
+def normalize(text):
+    """Lower-case text and strip accents so "Crème" matches "creme"."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    """Split text into normalized words."""
+    return _word_re.findall(normalize(text))
+
+
+def trigrams(word):
+    """Return the set of padded trigrams of a word."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance(word):
+    """Allowed typos for a query word: none for short words, then one or two."""
+    if len(word) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def bounded_levenshtein(a, b, limit):
+    """Edit distance between a and b, or None as soon as it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > limit:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+class _TrieNode:
+    __slots__ = ('children', 'name_pks', 'description_pks')
+
+    def __init__(self):
+        self.children = {}
+        # Every pk with a word under this node, counted per occurrence so
+        # removing one of two words sharing a prefix keeps the other.
+        self.name_pks = Counter()
+        self.description_pks = Counter()
+
+    def copy(self):
+        node = _TrieNode()
+        node.children = dict(self.children)
+        node.name_pks = self.name_pks.copy()
+        node.description_pks = self.description_pks.copy()
+        return node
+
+
+class MenuAutocompleteIndex:
+    """Prefix trie plus trigram index over menu item words."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.root = _TrieNode()
+        self.words = {}       # word -> Counter of pks using it
+        self.trigrams = {}    # trigram -> set of words
+        self.entries = {}     # pk -> (name words, description words)
+        # id -> object for the nodes, counters and sets this index may change
+        # in place; None while it shares none of them with another index.
+        self._owned = None
+
+    @classmethod
+    def build(cls, items, version=None):
+        """Build an index from an iterable of menu items."""
+        index = cls(version)
+        for item in items:
+            index.add(item)
+        return index
+
+    def copy(self):
+        """
+        Return a copy to apply changes to.
+
+        Only the top-level maps are copied. Trie nodes, counters and trigram
+        buckets stay shared until a change reaches them, when the copy
+        replaces them with its own (path copying), so a change costs about
+        what it touches rather than the size of the menu.
+        """
+        clone = MenuAutocompleteIndex(self.version)
+        clone.root = self.root
+        clone.words = dict(self.words)
+        clone.trigrams = dict(self.trigrams)
+        clone.entries = dict(self.entries)
+        # Neither index may now change what they share in place
+        self._owned = {}
+        clone._owned = {}
+        return clone
+
+    def _own(self, obj):
+        """Return obj if this index may change it in place, else its own copy of it."""
+        if self._owned is None or id(obj) in self._owned:
+            return obj
+        return self._adopt(obj.copy())
+
+    def _adopt(self, obj):
+        """Record a new object as this index's own."""
+        if self._owned is not None:
+            self._owned[id(obj)] = obj
+        return obj
+
+    def add(self, item):
+        """Index a menu item, replacing any previous entry for it."""
+        self.remove(item.pk)
+        name_words = tokenize(item.name)
+        description_words = tokenize(item.description)
+        self.entries[item.pk] = (name_words, description_words)
+        for words, field in ((name_words, 'name_pks'), (description_words, 'description_pks')):
+            for word in words:
+                self._update_word(word, item.pk, field, 1)
+
+    def remove(self, pk):
+        """Drop a menu item from the index if present."""
+        entry = self.entries.pop(pk, None)
+        if entry is None:
+            return
+        name_words, description_words = entry
+        for words, field in ((name_words, 'name_pks'), (description_words, 'description_pks')):
+            for word in words:
+                self._update_word(word, pk, field, -1)
+
+    def _update_word(self, word, pk, field, delta):
+        node = self.root = self._own(self.root)
+        path = [node]
+        for char in word:
+            child = node.children.get(char)
+            child = self._adopt(_TrieNode()) if child is None else self._own(child)
+            node.children[char] = node = child
+            path.append(node)
+        for node in path:
+            counter = getattr(node, field)
+            counter[pk] += delta
+            if counter[pk] <= 0:
+                del counter[pk]
+        # Prune branches left empty by a removal
+        for depth in range(len(word), 0, -1):
+            node = path[depth]
+            if node.children or node.name_pks or node.description_pks:
+                break
+            del path[depth - 1].children[word[depth - 1]]
+
+        if word not in self.words:
+            self.words[word] = self._adopt(Counter())
+            for gram in trigrams(word):
+                bucket = self.trigrams.get(gram)
+                bucket = self._adopt(set()) if bucket is None else self._own(bucket)
+                self.trigrams[gram] = bucket
+                bucket.add(word)
+        users = self.words[word] = self._own(self.words[word])
+        users[pk] += delta
+        if users[pk] <= 0:
+            del users[pk]
+        if not users:
+            del self.words[word]
+            for gram in trigrams(word):
+                bucket = self.trigrams[gram] = self._own(self.trigrams[gram])
+                bucket.discard(word)
+                if not bucket:
+                    del self.trigrams[gram]
+
+    def _prefix_node(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _fuzzy_words(self, word, limit):
+        """Yield (vocabulary word, distance) pairs within limit edits of word."""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            for candidate in self.trigrams.get(gram, ()):
+                shared[candidate] += 1
+        # Each edit changes at most three trigrams (the q-gram lemma).
+        needed = len(grams) - 3 * limit
+        for candidate, count in shared.items():
+            if count < needed:
+                continue
+            distance = bounded_levenshtein(word, candidate, limit)
+            if distance is None and len(candidate) > len(word):
+                # Allow for a typo in a word that is still being typed.
+                distance = bounded_levenshtein(word, candidate[:len(word)], limit)
+            if distance:
+                yield candidate, distance
+
+    def _match_word(self, word):
+        """Score each pk for one query word; lower is better."""
+        scores = {}
+        node = self._prefix_node(word)
+        if node is not None:
+            for pk in node.description_pks:
+                scores[pk] = 1
+            for pk in node.name_pks:
+                scores[pk] = 0
+        limit = max_distance(word)
+        if limit:
+            for candidate, distance in self._fuzzy_words(word, limit):
+                for pk in self.words[candidate]:
+                    name_words = self.entries[pk][0]
+                    score = distance * 2 + (candidate not in name_words)
+                    if score < scores.get(pk, score + 1):
+                        scores[pk] = score
+        return scores
+
+    def suggest(self, query, limit=8):
+        """
+        Return pks of items matching every word of query, best match first.
+
+        Exact prefixes rank above typo matches and name matches above
+        description matches. limit=None returns all matches.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        totals = None
+        for word in words:
+            scores = self._match_word(word)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {pk: totals[pk] + score for pk, score in scores.items() if pk in totals}
+            if not totals:
+                return []
+        def rank(pk):
+            return (totals[pk], self.entries[pk][0], pk)
+
+        if limit is None:
+            return sorted(totals, key=rank)
+        return heapq.nsmallest(limit, totals, key=rank)
+
+
+def get_autocomplete_index():
+    """Return the index for the current menu version, rebuilding it if stale."""
+    global _index
+    version = get_menu_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != version:
+            snapshot = get_menu_snapshot()
+            _index = MenuAutocompleteIndex.build(snapshot.items, snapshot.version)
+        return _index
+
+
+def _replace_index(change):
+    """Apply change to a copy of the live index and swap the copy in."""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            index = _index.copy()
+            change(index)
+            _index = index
+
+
+def index_menu_item(item):
+    """Apply a saved menu item to the live index."""
+    if item.is_available:
+        _replace_index(lambda index: index.add(item))
+    else:
+        unindex_menu_item(item.pk)
+
+
+def unindex_menu_item(pk):
+    """Drop a deleted menu item from the live index."""
+    _replace_index(lambda index: index.remove(pk))
+
+
+def adopt_menu_version(previous, version):
+    """
+    Carry the live index over to a version bumped for a change it already has.
+
+    previous holds the versions the index may be at for that to be safe. If
+    it is at any other (another worker changed the menu), it is left stale so
+    the next lookup rebuilds it.
+    """
+    with _index_lock:
+        if _index is not None and _index.version in previous:
+            _index.version = version
@@ -0,0 +1,463 @@
+"""
+Shopping cart service.
+
+Views talk to the cart through get_cart(request) and never touch its storage.
+Two engines are available, chosen with settings.CART_ENGINE:
+
+* 'session' (default): lines live in the user's session as
+  {menu item id: quantity} and prices come from the menu snapshot, so
+  browsing and editing the cart write no Order rows at all. An Order is only
+  created at checkout, with its items in one bulk insert. A pending Order
+  left by the database engine is carried into the session on first use.
+* 'database': the cart is the user's pending Order and its OrderItems,
+  written on every change.
+
+Session cart counts cost nothing to read; database cart counts are cached
+per user and invalidated by the writes that can change them.
+
+Cart lines are addressed by line id: the menu item id for session carts, the
+OrderItem id for database carts. Lines expose pk, menu_item, quantity, price
+and subtotal, so templates render either kind.
+"""
+import json
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F
+
+from .forms import CartChangeForm
+from .menu_cache import get_menu_snapshot
+from .models import Order, OrderItem, order_item_rows, shift_order_total
+
+
+SESSION_CART_KEY = 'cart'
+
+# Database cart counts are cached per user for the navbar. Writes that can
+# change the count invalidate it; the timeout only bounds a missed one.
+CART_COUNT_TIMEOUT = 60 * 60
+
+
+# True while apply_changes deletes lines in bulk. The per-line post_delete
+# receivers (order total, cart count) skip those rows; the batch reconciles
+# the total and invalidates the count once instead.
+_deleting_lines_in_bulk = ContextVar('deleting_lines_in_bulk', default=False)
+
+
+@contextmanager
+def bulk_line_delete():
+    """Delete order lines without the per-line signal work inside this block."""
+    token = _deleting_lines_in_bulk.set(True)
+    try:
+        yield
+    finally:
+        _deleting_lines_in_bulk.reset(token)
+
+
+def in_bulk_line_delete():
+    """Return True inside bulk_line_delete()."""
+    return _deleting_lines_in_bulk.get()
+
+
+def new_order_number():
+    """Return a fresh order number for a cart."""
+    return f'CART-{uuid.uuid4().hex[:8].upper()}'
+
+
+def cart_count_key(user_id):
+    """Return the cache key of a user's database cart count."""
+    return f'restaurant:cart_count:{user_id}'
+
+
+def invalidate_cart_count(user_id):
+    """
+    Forget a user's cached cart count; the next read recounts.
+
+    Forgotten again once the current transaction commits: a request reading
+    the count before then recounts the old lines and caches that.
+    """
+    key = cart_count_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def _upsert_sql():
+    """Return the INSERT ... ON CONFLICT statement that adds to a line's quantity."""
+    qn = connection.ops.quote_name
+    opts = OrderItem._meta
+    table = qn(opts.db_table)
+    order, menu_item, quantity, price, subtotal = (
+        qn(opts.get_field(name).column)
+        for name in ('order', 'menu_item', 'quantity', 'price', 'subtotal')
+    )
+    return (
+        f'INSERT INTO {table} ({order}, {menu_item}, {quantity}, {price}, {subtotal}) '
+        f'VALUES (%s, %s, %s, %s, %s) '
+        f'ON CONFLICT ({order}, {menu_item}) DO UPDATE SET '
+        f'{quantity} = {table}.{quantity} + excluded.{quantity}, '
+        f'{subtotal} = {table}.{price} * ({table}.{quantity} + excluded.{quantity}) '
+        f'RETURNING {price}'
+    )
+
+
+def _add_to_line(order_id, menu_item, quantity):
+    """
+    Portable fallback for databases without INSERT ... ON CONFLICT: an F()
+    update, else an insert, retrying the update if a concurrent insert won.
+    Returns the line's price.
+    """
+    lines = OrderItem.objects.filter(order_id=order_id, menu_item=menu_item)
+    # subtotal first: MySQL evaluates SET assignments left to right
+    increment = {
+        'subtotal': ExpressionWrapper(
+            F('price') * (F('quantity') + quantity), output_field=DecimalField()
+        ),
+        'quantity': F('quantity') + quantity,
+    }
+    if not lines.update(**increment):
+        try:
+            with transaction.atomic():
+                OrderItem.objects.bulk_create([OrderItem(
+                    order_id=order_id, menu_item=menu_item, quantity=quantity,
+                    price=menu_item.price, subtotal=menu_item.price * quantity,
+                )])
+            return menu_item.price
+        except IntegrityError:
+            lines.update(**increment)
+    return lines.values_list('price', flat=True).get()
+
+
+@transaction.atomic
+def upsert_line(order_id, menu_item, quantity):
+    """
+    Add quantity of a menu item to an order without a read-modify-write race.
+
+    A new line is inserted at the current price; an existing one has its
+    quantity raised in the same statement (quantity = quantity + n), so
+    concurrent adds never lose an update or create a second line. The order
+    total moves by the same amount in the same transaction.
+    """
+    features = connection.features
+    if features.supports_update_conflicts_with_target and features.can_return_columns_from_insert:
+        price_field = OrderItem._meta.get_field('price')
+        with connection.cursor() as cursor:
+            cursor.execute(_upsert_sql(), [
+                order_id, menu_item.pk, quantity,
+                price_field.get_db_prep_save(menu_item.price, connection),
+                price_field.get_db_prep_save(menu_item.price * quantity, connection),
+            ])
+            price = Decimal(str(cursor.fetchone()[0])).quantize(Decimal('0.01'))
+    else:
+        price = _add_to_line(order_id, menu_item, quantity)
+    shift_order_total(order_id, price * quantity)
+
+
+def parse_cart_changes(body):
+    """
+    Return {line id: quantity} from a JSON list of {"item_id", "quantity"}
+    changes; a later change to the same line wins.
+
+    Raises ValueError describing the first invalid change.
+    """
+    try:
+        changes = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Body must be a JSON list of changes')
+    if not isinstance(changes, list) or not changes:
+        raise ValueError('Body must be a non-empty JSON list of changes')
+    parsed = {}
+    for index, change in enumerate(changes):
+        form = CartChangeForm(change if isinstance(change, dict) else {})
+        if not form.is_valid():
+            field, errors = next(iter(form.errors.items()))
+            raise ValueError(f'Change {index}: {field}: {errors[0]}')
+        parsed[form.cleaned_data['item_id']] = form.cleaned_data['quantity']
+    return parsed
+
+
+def cart_payload(lines):
+    """Return the JSON-ready state of a cart from its lines."""
+    return {
+        'items': [
+            {
+                'item_id': line.pk,
+                'menu_item_id': line.menu_item.pk,
+                'name': line.menu_item.name,
+                'quantity': line.quantity,
+                'price': str(line.price),
+                'subtotal': str(line.subtotal),
+            }
+            for line in lines
+        ],
+        'count': len(lines),
+        'total': str(sum((line.subtotal for line in lines), Decimal('0.00'))),
+    }
+
+
+class CartLine:
+    """A line of a session cart, priced from the current menu."""
+
+    def __init__(self, menu_item, quantity):
+        self.menu_item = menu_item
+        self.quantity = quantity
+        self.price = menu_item.price
+        self.subtotal = self.price * quantity
+
+    @property
+    def pk(self):
+        return self.menu_item.pk
+
+
+class SessionCart:
+    """Cart kept in the session until checkout."""
+
+    def __init__(self, request):
+        self.request = request
+        self.session = request.session
+
+    def _data(self):
+        data = self.session.get(SESSION_CART_KEY)
+        if data is None:
+            data = self._pending_order_lines()
+            if self.request.user.is_authenticated:
+                # Stored even when empty, so the lookup happens once per session
+                self._save(data)
+        return data
+
+    def _pending_order_lines(self):
+        """Return the lines of the user's pending Order as session cart data."""
+        if not self.request.user.is_authenticated:
+            return {}
+        return {
+            str(menu_item_id): quantity
+            for menu_item_id, quantity in OrderItem.objects.filter(
+                order__user=self.request.user, order__status='pending', order__payment_status='pending'
+            ).values_list('menu_item_id', 'quantity')
+        }
+
+    def _save(self, data):
+        self.session[SESSION_CART_KEY] = data
+
+    def lines(self):
+        """Return the cart lines whose dishes are still available."""
+        by_pk = get_menu_snapshot().by_pk
+        return [
+            CartLine(by_pk[int(pk)], quantity)
+            for pk, quantity in self._data().items() if int(pk) in by_pk
+        ]
+
+    def count(self):
+        """Return the number of lines in the cart."""
+        by_pk = get_menu_snapshot().by_pk
+        return sum(1 for pk in self._data() if int(pk) in by_pk)
+
+    def add(self, menu_item, quantity):
+        """Add quantity of a menu item, merging with an existing line."""
+        data = self._data()
+        key = str(menu_item.pk)
+        data[key] = data.get(key, 0) + quantity
+        self._save(data)
+
+    def set_quantity(self, line_id, quantity):
+        """Change a line's quantity (0 removes it). Returns False if there is no such line."""
+        return not self.apply_changes({line_id: quantity})
+
+    def apply_changes(self, changes):
+        """
+        Apply {line id: quantity} changes (0 removes a line) in one session write.
+
+        Returns the sorted ids of lines not in the cart; if there are any,
+        nothing is changed.
+        """
+        data = self._data()
+        missing = sorted(line_id for line_id in changes if str(line_id) not in data)
+        if missing:
+            return missing
+        for line_id, quantity in changes.items():
+            if quantity > 0:
+                data[str(line_id)] = quantity
+            else:
+                del data[str(line_id)]
+        self._save(data)
+        return []
+
+    def remove(self, line_id):
+        """Remove a line. Returns False if there is no such line."""
+        return self.set_quantity(line_id, 0)
+
+    @transaction.atomic
+    def checkout_order(self):
+        """
+        Write the cart to a pending Order, or return None if it is empty.
+
+        A user has at most one pending order, so revisiting checkout (from
+        any session) rewrites that order instead of creating another one.
+        """
+        lines = self.lines()
+        if not lines:
+            return None
+        order, created = Order.objects.get_or_create(
+            user=self.request.user,
+            status='pending',
+            payment_status='pending',
+            defaults={'order_number': new_order_number()}
+        )
+        if not created:
+            # The total is rewritten below, so skip the per-line signal work
+            with bulk_line_delete():
+                order.order_items.all().delete()
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, menu_item=line.menu_item, quantity=line.quantity,
+                price=line.price, subtotal=line.subtotal
+            )
+            for line in lines
+        ])
+        # bulk_create skips OrderItem.save, so set the total here
+        order.total_amount = sum((line.subtotal for line in lines), Decimal('0.00'))
+        Order.objects.filter(pk=order.pk).update(total_amount=order.total_amount)
+        return order
+
+    def clear(self):
+        """Empty the cart once its order has been paid."""
+        # Empty rather than absent, so later requests don't look for a pending order
+        if self.session.get(SESSION_CART_KEY) != {}:
+            self._save({})
+
+
+class DatabaseCart:
+    """Cart stored as the user's pending Order."""
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+
+    def order(self):
+        """Return the user's pending order, or None."""
+        return Order.objects.filter(
+            user=self.user, status='pending', payment_status='pending'
+        ).order_by().first()
+
+    def lines(self):
+        """Return the order items of the cart."""
+        return list(order_item_rows(OrderItem.objects.filter(
+            order__user=self.user, order__status='pending', order__payment_status='pending'
+        )))
+
+    def count(self):
+        """Return the number of lines in the cart, cached per user."""
+        key = cart_count_key(self.user.pk)
+        count = cache.get(key)
+        if count is None:
+            count = OrderItem.objects.filter(
+                order__user=self.user, order__status='pending', order__payment_status='pending'
+            ).count()
+            cache.set(key, count, CART_COUNT_TIMEOUT)
+        return count
+
+    def add(self, menu_item, quantity):
+        """
+        Add quantity of a menu item, merging with an existing line.
+
+        Safe under concurrent requests: the order_one_cart_per_user constraint
+        makes a racing get_or_create fall back to the winner's cart, and the
+        line is upserted atomically.
+        """
+        order, created = Order.objects.get_or_create(
+            user=self.user,
+            status='pending',
+            payment_status='pending',
+            defaults={'order_number': new_order_number()}
+        )
+        upsert_line(order.pk, menu_item, quantity)
+        # The upsert bypasses the OrderItem signals
+        invalidate_cart_count(self.user.pk)
+
+    def _line(self, line_id):
+        return OrderItem.objects.filter(
+            pk=line_id, order__user=self.user,
+            order__status='pending', order__payment_status='pending'
+        ).first()
+
+    def set_quantity(self, line_id, quantity):
+        """Change a line's quantity (0 removes it). Returns False if there is no such line."""
+        order_item = self._line(line_id)
+        if order_item is None:
+            return False
+        if quantity > 0:
+            order_item.quantity = quantity
+            order_item.save()
+        else:
+            order_item.delete()
+        return True
+
+    def remove(self, line_id):
+        """Remove a line. Returns False if there is no such line."""
+        return self.set_quantity(line_id, 0)
+
+    @transaction.atomic
+    def apply_changes(self, changes):
+        """
+        Apply {line id: quantity} changes (0 removes a line) in one transaction:
+        one bulk update, one bulk delete and a single total recalculation.
+
+        Returns the sorted ids of lines not in the cart; if there are any,
+        nothing is changed.
+        """
+        lines = {
+            line.pk: line
+            for line in OrderItem.objects.select_for_update().select_related('order').filter(
+                pk__in=changes, order__user=self.user,
+                order__status='pending', order__payment_status='pending'
+            )
+        }
+        missing = sorted(set(changes) - set(lines))
+        if missing:
+            return missing
+        updated, removed = [], []
+        for line_id, quantity in changes.items():
+            line = lines[line_id]
+            if quantity > 0:
+                line.quantity = quantity
+                line.subtotal = line.price * quantity
+                updated.append(line)
+            else:
+                removed.append(line_id)
+        # Neither statement goes through OrderItem.save, and the delete skips
+        # the per-line receivers, so the total is reconciled once at the end
+        # instead of moved per line
+        OrderItem.objects.bulk_update(updated, ['quantity', 'subtotal'])
+        if removed:
+            with bulk_line_delete():
+                OrderItem.objects.filter(pk__in=removed).delete()
+            invalidate_cart_count(self.user.pk)
+        next(iter(lines.values())).order.calculate_total()
+        return []
+
+    def checkout_order(self):
+        """Return the pending order with its total reconciled, or None if it is empty."""
+        order = self.order()
+        if order is None or not order.order_items.exists():
+            return None
+        order.calculate_total()
+        return order
+
+    def clear(self):
+        """Nothing to do: the paid order is no longer pending."""
+
+
+CART_ENGINES = {
+    'session': SessionCart,
+    'database': DatabaseCart,
+}
+
+
+def get_cart(request):
+    """Return the cart of the request's user, using settings.CART_ENGINE."""
+    engine = getattr(settings, 'CART_ENGINE', 'session')
+    return CART_ENGINES[engine](request)
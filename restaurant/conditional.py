@@ -0,0 +1,72 @@
+"""
+Conditional GET support for pages that rarely change.
+
+A page's ETag is built from what it renders: the data version passed in by the
+view plus the per-visitor parts of the layout (user, cart badge, CSRF cookie).
+Browsers and proxies revalidate with If-None-Match and get an empty 304 when
+nothing changed. Pages with pending flash messages are never validated, since
+those messages must be rendered exactly once.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .context_processors import get_cart_count
+
+
+def has_pending_messages(request):
+    """Check for flash messages without marking them as shown."""
+    return len(get_messages(request)) > 0
+
+
+def visitor_etag_parts(request):
+    """Return the parts of the page layout that differ between visitors."""
+    user = request.user
+    if user.is_authenticated:
+        parts = [f'user:{user.pk}', f'staff:{user.is_staff}', f'cart:{get_cart_count(request)}']
+    else:
+        parts = ['anonymous']
+    # Forms embed a token derived from the CSRF cookie
+    parts.append(request.META.get('CSRF_COOKIE', ''))
+    return parts
+
+
+def page_etag(request, *parts):
+    """Build an ETag for a page from its data parts and the visitor's layout."""
+    if has_pending_messages(request):
+        return None
+    key = '|'.join(str(part) for part in (*parts, *visitor_etag_parts(request)))
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def conditional_page(etag_func, last_modified_func=None):
+    """
+    Decorator answering conditional GETs for a page with 304 Not Modified.
+
+    Last-Modified only covers the data, not the visitor's layout, so it is
+    sent to anonymous visitors only; everyone revalidates on each visit.
+    """
+    def anonymous_last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated or has_pending_messages(request):
+            return None
+        return last_modified_func(request, *args, **kwargs)
+
+    def decorator(view_func):
+        conditional_view = condition(
+            etag_func=etag_func,
+            last_modified_func=anonymous_last_modified if last_modified_func else None,
+        )(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
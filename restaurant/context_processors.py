@@ -1,23 +1,24 @@
-def cart_count(request):
-    """Context processor to add cart item count to all templates."""
-    cart_count = 0
-    if request.user.is_authenticated:
-        try:
-            cart = request.user.orders.get(status='pending', payment_status='pending')
-            cart_count = cart.order_items.count()
-        except:
-            pass
-    return {'cart_count': cart_count}
-
-
-
-
-
-
+from django.utils.functional import SimpleLazyObject, new_method_proxy
 
+from .cart import get_cart
 
 
+class LazyCount(SimpleLazyObject):
+    """
+    A number computed on first use, so pages that never render it pay nothing.
+    int/float are proxied as well so filters such as pluralize work.
+    """
+    __int__ = new_method_proxy(int)
+    __float__ = new_method_proxy(float)
 
 
+def get_cart_count(request):
+    """Return the number of lines in the user's cart."""
+    if not request.user.is_authenticated:
+        return 0
+    return get_cart(request).count()
 
 
+def cart_count(request):
+    """Context processor to add cart item count to all templates."""
+    return {'cart_count': LazyCount(lambda: get_cart_count(request))}
@@ -0,0 +1,135 @@
+"""
+A local stand-in for the Stripe API, for tests and benchmarks.
+
+FakeStripe serves the PaymentIntent endpoints the payment views use on a
+random localhost port, answering each request after `latency` seconds so
+slow Stripe round trips can be simulated. Point settings.STRIPE_API_BASE at
+its url:
+
+    with FakeStripe(latency=0.3) as fake, override_settings(STRIPE_API_BASE=fake.url):
+        ...
+"""
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+INTENT_PATH_RE = re.compile(r'^/v1/payment_intents/(?P<intent_id>[\w-]+)$')
+
+
+class FakeStripe:
+    """In-memory PaymentIntents behind a threaded HTTP server."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.intents = {}
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def create_intent(self, amount=1000, currency='gbp', metadata=None, status='requires_payment_method'):
+        """Store a PaymentIntent and return it as a dict."""
+        with self._lock:
+            intent_id = f'pi_fake_{next(self._ids)}'
+            self.intents[intent_id] = {
+                'id': intent_id,
+                'object': 'payment_intent',
+                'amount': amount,
+                'currency': currency,
+                'metadata': metadata or {},
+                'client_secret': f'{intent_id}_secret_fake',
+                'status': status,
+            }
+            return dict(self.intents[intent_id])
+
+    def succeed(self, intent_id):
+        """Mark a PaymentIntent as paid, as if the customer completed the payment."""
+        with self._lock:
+            self.intents[intent_id]['status'] = 'succeeded'
+
+
+def _handler_for(fake):
+    """Return a request handler class bound to a FakeStripe."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            params = dict(parse_qsl(self.rfile.read(length).decode()))
+            if self.path != '/v1/payment_intents':
+                return self.respond(404, _error(f'Unrecognized request URL (POST: {self.path})'))
+            metadata = {
+                key[len('metadata['):-1]: value
+                for key, value in params.items() if key.startswith('metadata[')
+            }
+            intent = fake.create_intent(
+                amount=int(params.get('amount', 0)), currency=params.get('currency', ''), metadata=metadata
+            )
+            self.respond(200, intent)
+
+        def do_GET(self):
+            match = INTENT_PATH_RE.match(self.path.split('?')[0])
+            intent = fake.intents.get(match['intent_id']) if match else None
+            if intent is None:
+                return self.respond(404, _error(f'No such payment_intent: {self.path}'))
+            self.respond(200, intent)
+
+        def respond(self, status, payload):
+            with fake._lock:
+                fake.requests += 1
+                request_number = fake.requests
+            if fake.latency:
+                time.sleep(fake.latency)
+            body = json.dumps(payload).encode()
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Request-Id', f'req_fake_{request_number}')
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up (timed out) first
+                pass
+
+        def log_message(self, format, *args):
+            """Keep test and benchmark output quiet."""
+
+    return Handler
+
+
+def _error(message):
+    """Return a Stripe-style error body."""
+    return {'error': {'type': 'invalid_request_error', 'message': message}}
@@ -41,6 +41,13 @@ class MenuItemForm(forms.ModelForm):
             }),
         }
     
+    def save(self, commit=True):
+        """Save the menu item and generate resized copies of a new image."""
+        menu_item = super().save(commit=commit)
+        if commit and 'image' in self.changed_data:
+            menu_item.update_image_derivatives()
+        return menu_item
+    
     def clean_price(self):
         """Validate that price is positive."""
         price = self.cleaned_data.get('price')
@@ -161,6 +168,45 @@ class OrderItemForm(forms.Form):
         return quantity
 
 
+class CartChangeForm(forms.Form):
+    """
+    One change in a batch cart update: a cart line and its new quantity.
+    A quantity of 0 removes the line.
+    """
+    item_id = forms.IntegerField(min_value=1)
+    quantity = forms.IntegerField(min_value=0, max_value=10)
+
+
+class OrderExportForm(forms.Form):
+    """
+    Filters and format of an order export. Dates are inclusive and in the
+    site's time zone; leaving a filter empty exports everything.
+    """
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    status = forms.ChoiceField(choices=[('', 'Any')] + Order.STATUS_CHOICES, required=False)
+    payment_status = forms.ChoiceField(choices=[('', 'Any')] + Order.PAYMENT_STATUS_CHOICES, required=False)
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+    
+    def clean_format(self):
+        """Default to CSV."""
+        return self.cleaned_data.get('format') or 'csv'
+    
+    def clean(self):
+        """Ensure the date range is not reversed."""
+        cleaned_data = super().clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+        if start and end and start > end:
+            raise ValidationError('The start date must not be after the end date.')
+        return cleaned_data
+
+
 
 
 
@@ -0,0 +1,187 @@
+"""
+Responsive image derivatives for menu item photos.
+
+Uploads are stored as-is, which means multi-hundred-KB JPEGs on a phone. For
+each upload we write resized copies (thumbnail, card and detail widths) in
+AVIF and WebP plus a JPEG fallback next to the original, and record them on
+MenuItem.image_derivatives so templates can emit srcset without touching
+storage.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+
+# Target widths in pixels; images are never upscaled.
+DERIVATIVE_SIZES = {
+    'thumb': 200,
+    'card': 480,
+    'detail': 1200,
+}
+
+# (key, Pillow format, save options, mime type), most efficient first.
+DERIVATIVE_FORMATS = [
+    ('avif', 'AVIF', {'quality': 55, 'speed': 8}, 'image/avif'),
+    ('webp', 'WEBP', {'quality': 75, 'method': 4}, 'image/webp'),
+    ('jpeg', 'JPEG', {'quality': 80, 'optimize': True, 'progressive': True}, 'image/jpeg'),
+]
+
+DERIVATIVE_DIR = 'derivatives'
+
+# Hex digits of the content hash kept in derivative filenames.
+HASH_LENGTH = 12
+
+FILE_EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+MIME_TYPES = {key: mime for key, _, _, mime in DERIVATIVE_FORMATS}
+
+
+def available_formats():
+    """Return the output formats this Pillow build can encode."""
+    return [fmt for fmt in DERIVATIVE_FORMATS if fmt[0] == 'jpeg' or features.check(fmt[0])]
+
+
+def derivative_name(source_name, size, fmt, digest):
+    """
+    Return the storage path for one derivative of source_name.
+
+    The name embeds the source's content hash, so a URL never changes meaning
+    and can be cached forever (see flavour.media).
+    """
+    directory, filename = os.path.split(source_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory, DERIVATIVE_DIR,
+        f'{stem}-{size}.{digest[:HASH_LENGTH]}.{FILE_EXTENSIONS[fmt]}'
+    )
+
+
+def _flatten(image):
+    """Return an RGB copy of image, compositing transparency onto white."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def content_hash(data):
+    """Return the hex digest used to detect unchanged source images."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def render_derivatives(data, source_name):
+    """
+    Resize the bytes of an image into every derivative size and format.
+
+    Returns (metadata, files) where files maps storage paths to encoded bytes
+    and metadata is the structure stored on MenuItem.image_derivatives.
+    """
+    largest_width = max(DERIVATIVE_SIZES.values())
+    with Image.open(BytesIO(data)) as original:
+        # Let the JPEG decoder downscale very large photos while decoding.
+        original.draft('RGB', (largest_width, largest_width))
+        original = _flatten(ImageOps.exif_transpose(original))
+
+    digest = content_hash(data)
+    formats = available_formats()
+    files = {}
+    sizes = {}
+    previous_width = None
+    for size, target_width in DERIVATIVE_SIZES.items():
+        width = min(target_width, original.width)
+        if width == previous_width:
+            # The original is smaller than this size; reuse the last one.
+            continue
+        previous_width = width
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.LANCZOS, reducing_gap=2.0)
+
+        entry = {'width': width, 'height': height}
+        for fmt, pil_format, options, mime in formats:
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            name = derivative_name(source_name, size, fmt, digest)
+            files[name] = buffer.getvalue()
+            entry[fmt] = name
+        sizes[size] = entry
+
+    metadata = {'source': source_name, 'hash': digest, 'sizes': sizes}
+    return metadata, files
+
+
+def store_derivatives(storage, files):
+    """Write rendered derivatives to storage, replacing older copies."""
+    for name, content in files.items():
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(content))
+
+
+def generate_derivatives(image_field):
+    """Render and store derivatives for a saved ImageField file."""
+    image_field.open('rb')
+    try:
+        data = image_field.read()
+    finally:
+        image_field.close()
+    metadata, files = render_derivatives(data, image_field.name)
+    store_derivatives(image_field.storage, files)
+    return metadata
+
+
+def derivatives_exist(storage, metadata):
+    """Check that every file listed in a derivatives structure is in storage."""
+    return all(storage.exists(name) for name in derivative_files(metadata))
+
+
+def derivative_files(metadata):
+    """Return the set of storage paths listed in a derivatives structure."""
+    return {
+        entry[fmt]
+        for entry in (metadata or {}).get('sizes', {}).values()
+        for fmt in FILE_EXTENSIONS if fmt in entry
+    }
+
+
+def delete_derivatives(storage, metadata, keep=None):
+    """Remove the files listed in a derivatives structure, except those in keep."""
+    stale = derivative_files(metadata) - derivative_files(keep)
+    for name in stale:
+        if storage.exists(name):
+            storage.delete(name)
+
+
+def build_picture(storage, metadata, largest='detail'):
+    """
+    Return template data for a <picture> element, or None without derivatives.
+
+    Only sizes up to `largest` are offered, so a card never downloads the
+    detail-size image. The result has 'sources' (one srcset per modern
+    format), 'src'/'srcset' for the JPEG fallback, and the fallback size.
+    """
+    sizes = (metadata or {}).get('sizes')
+    if not sizes:
+        return None
+    allowed = list(DERIVATIVE_SIZES)[:list(DERIVATIVE_SIZES).index(largest) + 1]
+    entries = [sizes[size] for size in allowed if size in sizes]
+
+    def srcset(fmt):
+        return ', '.join(
+            f"{storage.url(entry[fmt])} {entry['width']}w" for entry in entries if fmt in entry
+        )
+
+    fallback = entries[-1]
+    return {
+        'sources': [
+            {'type': MIME_TYPES[fmt], 'srcset': srcset(fmt)}
+            for fmt in ('avif', 'webp') if fmt in fallback
+        ],
+        'src': storage.url(fallback['jpeg']),
+        'srcset': srcset('jpeg'),
+        'width': fallback['width'],
+        'height': fallback['height'],
+    }
@@ -0,0 +1,149 @@
+"""
+Bulk invoice archives.
+
+Accounting wants every paid invoice for a month or a customer account in one
+ZIP. write_invoice_archive() walks the matching orders in primary-key chunks
+(one query for the orders and one for their lines per chunk), renders the
+invoices that aren't already in invoice storage in worker processes, and
+appends each PDF to the ZIP on disk as soon as it arrives. Only a chunk of
+orders and a bounded number of rendered PDFs are held in memory at a time,
+however many orders match.
+"""
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+
+import django
+from django.db import connections
+from django.db.models import Prefetch
+
+from .invoices import invoice_name, invoice_storage, render_invoice_pdf
+from .models import Order, OrderItem, order_item_rows
+
+
+DEFAULT_CHUNK_SIZE = 200
+
+# Rendered PDFs waiting to be written, per worker process
+PENDING_PER_WORKER = 4
+
+
+@dataclass
+class ArchiveStats:
+    """What went into an archive and how long it took."""
+    invoices: int = 0
+    rendered: int = 0
+    reused: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def per_second(self):
+        return self.invoices / self.seconds if self.seconds else 0.0
+
+
+def paid_orders():
+    """Return the orders that have an invoice."""
+    return Order.objects.filter(payment_status='paid')
+
+
+def iter_order_chunks(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield lists of orders from queryset in primary-key order, each with its
+    user and its lines (order.order_items.all()) loaded.
+    """
+    lines = Prefetch('order_items', queryset=order_item_rows(OrderItem.objects.order_by('pk')))
+    queryset = queryset.select_related('user').prefetch_related(lines).order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def archive_entry_name(order):
+    """Return the name of an order's invoice inside the archive."""
+    return f'Invoice_{order.order_number}.pdf'
+
+
+def write_invoice_archive(queryset, path, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write the invoices of the paid orders in queryset to a ZIP at path.
+
+    path may also be a binary file object. With workers > 1 the PDFs are
+    rendered in that many processes. Returns an ArchiveStats.
+    """
+    stats = ArchiveStats()
+    start = time.perf_counter()
+    orders = iter_order_chunks(queryset.filter(payment_status='paid'), chunk_size)
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for order, pdf, rendered in _invoice_pdfs(orders, workers):
+            archive.writestr(archive_entry_name(order), pdf)
+            stats.invoices += 1
+            stats.bytes += len(pdf)
+            if rendered:
+                stats.rendered += 1
+            else:
+                stats.reused += 1
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def _init_worker():
+    """Make sure Django is configured in worker processes (spawn start method)."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'flavour.settings')
+    django.setup()
+
+
+def _render(order):
+    """Render an order's invoice. Runs in a worker process, without the database."""
+    return render_invoice_pdf(order, order.order_items.all())
+
+
+def _stored_pdf(storage, order):
+    """Return the stored PDF of the order's current invoice, or None."""
+    name = invoice_name(order)
+    if not storage.exists(name):
+        return None
+    with storage.open(name, 'rb') as f:
+        return f.read()
+
+
+def _invoice_pdfs(chunks, workers):
+    """Yield (order, pdf bytes, rendered) for every order in chunks."""
+    storage = invoice_storage()
+    if workers <= 1:
+        for chunk in chunks:
+            for order in chunk:
+                pdf = _stored_pdf(storage, order)
+                yield (order, pdf, False) if pdf is not None else (order, _render(order), True)
+        return
+
+    # Forked workers must not share the parent's database connections.
+    connections.close_all()
+    limit = workers * PENDING_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = deque()
+        for chunk in chunks:
+            for order in chunk:
+                pdf = _stored_pdf(storage, order)
+                if pdf is not None:
+                    yield order, pdf, False
+                    continue
+                pending.append((order, pool.submit(_render, order)))
+                while len(pending) >= limit:
+                    yield from _drain(pending)
+        while pending:
+            yield from _drain(pending)
+
+
+def _drain(pending):
+    """Wait for at least one render to finish and yield the finished ones in order."""
+    wait([pending[0][1]], return_when=FIRST_COMPLETED)
+    while pending and pending[0][1].done():
+        order, future = pending.popleft()
+        yield order, future.result(), True
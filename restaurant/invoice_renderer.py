@@ -0,0 +1,237 @@
+"""
+PDF rendering for invoices.
+
+Paragraph styles, table styles and the restaurant's contact details don't
+depend on the order, so InvoiceRenderer builds them once per process and
+each render only lays out the order's own data. flowables() returns the
+invoice body without building a document, so receipts and statements can
+embed it in their own layouts.
+"""
+import threading
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+
+RESTAURANT_NAME = 'FLAVOUR RESTAURANT'
+RESTAURANT_DETAILS = (
+    '32 Chepstow',
+    'Newport',
+    'Phone: +44 20 1234 5678',
+    'Email: info@flavourrestaurant.com',
+)
+FOOTER = (
+    '<i>Thank you for your order! We appreciate your business.</i><br/>'
+    '<i>For any inquiries, please contact us at info@flavourrestaurant.com</i>'
+)
+
+BRAND_RED = colors.HexColor('#c41e3a')
+TEXT_DARK = colors.HexColor('#1a1a1a')
+TEXT_MUTED = colors.HexColor('#6c757d')
+LIGHT_GREY = colors.HexColor('#f8f9fa')
+GRID_GREY = colors.HexColor('#dee2e6')
+
+ITEM_COLUMN_WIDTHS = [2.5 * inch, 1.5 * inch, 0.8 * inch, 1.2 * inch, 1 * inch]
+
+
+class InvoiceRenderer:
+    """Renders orders into the invoice layout. Safe to share between threads."""
+
+    def __init__(self):
+        sample = getSampleStyleSheet()
+        # Own copy of Normal: the sample sheet's styles must not be mutated
+        self.normal_style = ParagraphStyle('InvoiceNormal', parent=sample['Normal'], fontSize=10)
+        self.title_style = ParagraphStyle(
+            'InvoiceTitle',
+            parent=sample['Heading1'],
+            fontSize=24,
+            textColor=BRAND_RED,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        )
+        self.heading_style = ParagraphStyle(
+            'InvoiceHeading',
+            parent=sample['Heading2'],
+            fontSize=14,
+            textColor=TEXT_DARK,
+            spaceAfter=12,
+            fontName='Helvetica-Bold'
+        )
+        self.footer_style = ParagraphStyle(
+            'InvoiceFooter',
+            parent=self.normal_style,
+            fontSize=9,
+            textColor=TEXT_MUTED,
+            alignment=TA_CENTER,
+            spaceBefore=20
+        )
+
+        self.block_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ])
+        self.header_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ])
+        self.info_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), LIGHT_GREY),
+            ('TEXTCOLOR', (0, 0), (0, -1), TEXT_DARK),
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, GRID_GREY),
+        ])
+        self.items_table_style = TableStyle([
+            # Header row
+            ('BACKGROUND', (0, 0), (-1, 0), BRAND_RED),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('TOPPADDING', (0, 0), (-1, 0), 12),
+
+            # Data rows
+            ('BACKGROUND', (0, 1), (-1, -2), colors.white),
+            ('TEXTCOLOR', (0, 1), (-1, -2), TEXT_DARK),
+            ('ALIGN', (0, 1), (-1, -2), 'LEFT'),
+            ('ALIGN', (2, 1), (2, -2), 'CENTER'),
+            ('ALIGN', (3, 1), (4, -2), 'RIGHT'),
+            ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -2), 9),
+            ('BOTTOMPADDING', (0, 1), (-1, -2), 8),
+            ('TOPPADDING', (0, 1), (-1, -2), 8),
+            ('GRID', (0, 0), (-1, -2), 0.5, GRID_GREY),
+
+            # Total row
+            ('BACKGROUND', (0, -1), (-1, -1), LIGHT_GREY),
+            ('TEXTCOLOR', (0, -1), (-1, -1), TEXT_DARK),
+            ('ALIGN', (0, -1), (2, -1), 'RIGHT'),
+            ('ALIGN', (3, -1), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, -1), (-1, -1), 11),
+            ('BOTTOMPADDING', (0, -1), (-1, -1), 12),
+            ('TOPPADDING', (0, -1), (-1, -1), 12),
+            ('LINEABOVE', (3, -1), (-1, -1), 1, BRAND_RED),
+        ])
+
+        # Markup that is the same on every invoice
+        self.header_rows = [(f'<b>{RESTAURANT_NAME}</b>', self.title_style)] + [
+            (line, self.normal_style) for line in RESTAURANT_DETAILS
+        ]
+
+    def render(self, order, order_items):
+        """Return the invoice of an order as PDF bytes."""
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5 * inch, bottomMargin=0.5 * inch)
+        doc.build(self.flowables(order, order_items))
+        return buffer.getvalue()
+
+    def flowables(self, order, order_items):
+        """Return the invoice body as a list of reportlab flowables."""
+        return [
+            *self.header(),
+            Paragraph('INVOICE', self.heading_style),
+            Spacer(1, 0.2 * inch),
+            *self.order_info(order),
+            *self.items(order, order_items),
+            *self.payment_info(order),
+            *self.special_instructions(order),
+            Paragraph(FOOTER, self.footer_style),
+        ]
+
+    def header(self):
+        """Restaurant name and contact details."""
+        table = Table([[Paragraph(text, style)] for text, style in self.header_rows], colWidths=[7 * inch])
+        table.setStyle(self.header_table_style)
+        return [table, Spacer(1, 0.3 * inch)]
+
+    def order_info(self, order):
+        """Invoice number, dates and customer details."""
+        user = order.user
+        rows = [
+            ['Invoice Number:', order.order_number],
+            ['Invoice Date:', order.created_at.strftime('%B %d, %Y')],
+            ['Order Date:', order.created_at.strftime('%B %d, %Y at %I:%M %p')],
+            ['Customer Name:', user.get_full_name() or user.username],
+            ['Customer Email:', user.email or 'N/A'],
+        ]
+        if order.delivery_address:
+            rows.append(['Delivery Address:', order.delivery_address])
+        table = Table(rows, colWidths=[2 * inch, 5 * inch])
+        table.setStyle(self.info_table_style)
+        return [table, Spacer(1, 0.3 * inch)]
+
+    def items(self, order, order_items):
+        """The order lines and the total."""
+        rows = [['Item', 'Category', 'Quantity', 'Unit Price', 'Subtotal']]
+        for item in order_items:
+            rows.append([
+                item.menu_item.name,
+                item.menu_item.get_category_display(),
+                str(item.quantity),
+                f'£{item.price:.2f}',
+                f'£{item.subtotal:.2f}'
+            ])
+        rows.append([
+            '', '', '',
+            Paragraph('<b>Total:</b>', self.normal_style),
+            Paragraph(f'<b>£{order.total_amount:.2f}</b>', self.normal_style)
+        ])
+        table = Table(rows, colWidths=ITEM_COLUMN_WIDTHS)
+        table.setStyle(self.items_table_style)
+        return [Paragraph('Order Items', self.heading_style), table, Spacer(1, 0.3 * inch)]
+
+    def payment_info(self, order):
+        """Payment status and the Stripe transaction."""
+        rows = [
+            [Paragraph('<b>Payment Information</b>', self.heading_style)],
+            [Paragraph(f'Payment Status: <b>{order.get_payment_status_display()}</b>', self.normal_style)],
+            [Paragraph('Payment Method: Stripe', self.normal_style)],
+        ]
+        if order.stripe_payment_intent_id:
+            rows.append([Paragraph(
+                f'Transaction ID: {escape(order.stripe_payment_intent_id)}', self.normal_style
+            )])
+        table = Table(rows, colWidths=[7 * inch])
+        table.setStyle(self.block_table_style)
+        return [table, Spacer(1, 0.3 * inch)]
+
+    def special_instructions(self, order):
+        """The customer's instructions, if any."""
+        if not order.special_instructions:
+            return []
+        table = Table([
+            [Paragraph('<b>Special Instructions</b>', self.heading_style)],
+            # Customer text: escape it so '<' or '&' can't break the markup
+            [Paragraph(escape(order.special_instructions), self.normal_style)],
+        ], colWidths=[7 * inch])
+        table.setStyle(self.block_table_style)
+        return [table, Spacer(1, 0.3 * inch)]
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_invoice_renderer():
+    """Return the process-wide InvoiceRenderer, building it on first use."""
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = InvoiceRenderer()
+    return _renderer
@@ -0,0 +1,70 @@
+"""
+Invoice PDFs.
+
+A paid order's invoice doesn't change, so it is rendered once and kept in
+INVOICE_STORAGE under a name derived from (order.pk, order.updated_at).
+Any write to the order moves updated_at and so selects a new file; older
+files of the order are deleted when the new one is written. Invoices are
+private, so the storage must not be one that is served as media.
+"""
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+from .invoice_renderer import get_invoice_renderer
+from .models import order_item_rows
+
+
+# Bump when the layout changes so stored invoices are rendered again.
+INVOICE_LAYOUT_VERSION = 1
+
+
+def invoice_storage():
+    """Return the storage that holds rendered invoices."""
+    return FileSystemStorage(location=settings.INVOICE_ROOT, base_url=None)
+
+
+def invoice_key(order):
+    """Return the version string of an order's invoice: layout, pk and updated_at."""
+    return f'{INVOICE_LAYOUT_VERSION}-{order.pk}-{order.updated_at.timestamp():.6f}'
+
+
+def invoice_etag(order):
+    """Return the ETag of an order's invoice."""
+    return f'"invoice-{invoice_key(order)}"'
+
+
+def invoice_name(order):
+    """Return the storage name of an order's current invoice."""
+    return f'{order.pk}/{invoice_key(order)}.pdf'
+
+
+def open_invoice(order):
+    """
+    Return an open binary file of the order's invoice, rendering and storing
+    it first if this version hasn't been rendered yet.
+    """
+    storage = invoice_storage()
+    name = invoice_name(order)
+    if not storage.exists(name):
+        pdf = render_invoice_pdf(order, order_item_rows(order.order_items.all()))
+        saved = storage.save(name, ContentFile(pdf))
+        if saved != name:
+            # Another request stored the same version first; keep theirs
+            storage.delete(saved)
+        _delete_old_invoices(storage, order, name)
+    return storage.open(name, 'rb')
+
+
+def _delete_old_invoices(storage, order, current):
+    """Delete the order's invoices other than the current one."""
+    directory = str(order.pk)
+    for filename in storage.listdir(directory)[1]:
+        path = f'{directory}/{filename}'
+        if path != current:
+            storage.delete(path)
+
+
+def render_invoice_pdf(order, order_items):
+    """Return the invoice PDF of an order as bytes."""
+    return get_invoice_renderer().render(order, order_items)
@@ -78,3 +78,5 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS(f'\n✓ Assigned {assigned_count} images to menu items')
         )
+        if assigned_count:
+            self.stdout.write('Run "python manage.py process_menu_images" to generate resized copies.')
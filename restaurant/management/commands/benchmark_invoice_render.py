@@ -0,0 +1,79 @@
+"""
+Management command to measure invoice PDF rendering throughput and peak
+memory, building the styles per render (as the view used to) and with the
+shared InvoiceRenderer.
+"""
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from restaurant.invoice_renderer import InvoiceRenderer
+from restaurant.models import MenuItem, Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Benchmark invoice PDF rendering per request versus with the shared renderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=8, help='Order lines per invoice')
+        parser.add_argument('--runs', type=int, default=50, help='Timed renders per mode')
+
+    def handle(self, *args, **options):
+        order, items = self.build_order(options['lines'])
+        runs = options['runs']
+        shared = InvoiceRenderer()
+
+        modes = [
+            ('Styles per render', lambda: InvoiceRenderer().render(order, items)),
+            ('Shared renderer', lambda: shared.render(order, items)),
+        ]
+        self.stdout.write(f'Rendering a {len(items)}-line invoice, {runs} runs per mode...')
+        results = {}
+        for label, render in modes:
+            render()  # warm up imports and font metrics
+            per_second = runs / self.time_renders(render, runs)
+            peak = self.peak_memory(render)
+            results[label] = per_second
+            self.stdout.write(f'  {label + ":":<19}{per_second:8.1f} PDFs/s   peak {peak / 1024:8.1f} KiB/invoice')
+
+        speedup = results['Shared renderer'] / results['Styles per render']
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Shared renderer is {speedup:.2f}x the throughput'))
+
+    def build_order(self, lines):
+        """Build an unsaved paid order; rendering needs no database rows."""
+        user = User(username='benchmark', first_name='Bench', last_name='Mark', email='bench@example.com')
+        order = Order(
+            pk=1, user=user, order_number='BENCH-0001', status='completed', payment_status='paid',
+            stripe_payment_intent_id='pi_benchmark', created_at=timezone.now(),
+            delivery_address='1 Benchmark Road, Newport',
+            special_instructions='Ring the bell twice & leave by the door <please>.',
+        )
+        categories = [value for value, label in MenuItem.CATEGORY_CHOICES]
+        items = []
+        for i in range(lines):
+            menu_item = MenuItem(pk=i + 1, name=f'Benchmark Dish {i}', price=Decimal('9.95'),
+                                 category=categories[i % len(categories)])
+            items.append(OrderItem(order=order, menu_item=menu_item, quantity=2,
+                                   price=menu_item.price, subtotal=menu_item.price * 2))
+        order.total_amount = sum(item.subtotal for item in items)
+        return order, items
+
+    def time_renders(self, render, runs):
+        """Return the seconds taken by runs renders."""
+        start = time.perf_counter()
+        for _ in range(runs):
+            render()
+        return time.perf_counter() - start
+
+    def peak_memory(self, render):
+        """Return the peak bytes allocated while rendering one invoice."""
+        tracemalloc.start()
+        try:
+            render()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
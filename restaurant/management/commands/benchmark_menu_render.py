@@ -0,0 +1,89 @@
+"""
+Management command to measure menu_list template render time with and without
+the per-card fragment cache.
+"""
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from restaurant.menu_cache import group_by_category
+from restaurant.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = 'Benchmark menu_list rendering with and without card fragment caching'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=500, help='Number of menu items to render')
+        parser.add_argument('--runs', type=int, default=10, help='Timed renders per mode')
+
+    def handle(self, *args, **options):
+        items = self.build_items(options['items'])
+        runs = options['runs']
+
+        request = RequestFactory().get('/restaurant/menu/')
+        request.user = AnonymousUser()
+        context = {
+            'menu_items': items,
+            'categories': group_by_category(items),
+            'category_filter': '',
+            'search_query': '',
+            'category_choices': MenuItem.CATEGORY_CHOICES,
+        }
+
+        self.stdout.write(f'Rendering {len(items)} menu items, {runs} runs per mode...')
+
+        uncached_caches = dict(settings.CACHES)
+        uncached_caches['template_fragments'] = {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }
+        with override_settings(CACHES=uncached_caches):
+            uncached = self.time_renders(request, context, runs)
+
+        fresh_caches = dict(settings.CACHES)
+        fresh_caches['template_fragments'] = dict(
+            settings.CACHES['template_fragments'], LOCATION='benchmark-menu-render'
+        )
+        with override_settings(CACHES=fresh_caches):
+            cold = self.time_renders(request, context, 1)
+            warm = self.time_renders(request, context, runs)
+
+        self.stdout.write(f'  Uncached:        {uncached * 1000:8.2f} ms/render')
+        self.stdout.write(f'  Cached (cold):   {cold * 1000:8.2f} ms/render')
+        self.stdout.write(f'  Cached (warm):   {warm * 1000:8.2f} ms/render')
+        self.stdout.write(
+            self.style.SUCCESS(f'\n✓ Warm fragment cache renders {uncached / warm:.1f}x faster')
+        )
+
+    def build_items(self, count):
+        """Build unsaved menu items; rendering needs no database rows."""
+        now = timezone.now()
+        categories = [value for value, label in MenuItem.CATEGORY_CHOICES]
+        items = [
+            MenuItem(
+                pk=i,
+                name=f'Benchmark Dish {i}',
+                description='Slow-cooked seasonal ingredients with house sauce, fresh herbs '
+                            'and a side of something delicious from the kitchen.',
+                price=Decimal('9.99'),
+                category=categories[i % len(categories)],
+                is_available=True,
+                updated_at=now,
+            )
+            for i in range(1, count + 1)
+        ]
+        items.sort(key=lambda item: (item.category, item.name))
+        return items
+
+    def time_renders(self, request, context, runs):
+        """Return the mean seconds per render of menu_list.html."""
+        start = time.perf_counter()
+        for _ in range(runs):
+            render_to_string('restaurant/menu_list.html', context, request=request)
+        return (time.perf_counter() - start) / runs
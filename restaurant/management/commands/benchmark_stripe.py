@@ -0,0 +1,129 @@
+"""
+Management command to measure payment_success throughput while Stripe is
+slow: a pool of sync workers, each blocked for every Stripe round trip, versus
+one ASGI event loop on which the round trips overlap.
+
+Stripe is simulated by restaurant.fake_stripe with the given latency. Run it
+against the development database; it creates a throwaway user and orders and
+removes them afterwards.
+"""
+import asyncio
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from restaurant.fake_stripe import FakeStripe
+from restaurant.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Benchmark payment_success under simulated Stripe latency: sync workers versus ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency', type=int, default=300, help='Simulated Stripe latency (ms)')
+        parser.add_argument('--requests', type=int, default=40, help='Requests per mode')
+        parser.add_argument('--workers', type=int, default=4, help='Sync workers to compare against')
+
+    def handle(self, *args, **options):
+        latency, requests, workers = options['latency'], options['requests'], options['workers']
+        user = User.objects.create_user(username=f'stripe-benchmark-{time.time_ns()}')
+        try:
+            with FakeStripe(latency=latency / 1000) as stripe, override_settings(
+                STRIPE_SECRET_KEY='sk_test_benchmark', STRIPE_PUBLISHABLE_KEY='pk_test_benchmark',
+                STRIPE_API_BASE=stripe.url, STRIPE_MAX_NETWORK_RETRIES=0,
+                # The test clients send Host: testserver
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                self.stdout.write(
+                    f'{requests} payment_success requests per mode, Stripe latency {latency} ms...'
+                )
+                sync_rate = self.report(
+                    f'Sync workers ({workers}):', self.run_sync(self.orders(stripe, user, requests), workers)
+                )
+                asgi_rate = self.report(
+                    'ASGI event loop:', asyncio.run(self.run_asgi(self.orders(stripe, user, requests)))
+                )
+        finally:
+            user.delete()
+        self.stdout.write(self.style.SUCCESS(f'\n✓ ASGI serves {asgi_rate / sync_rate:.2f}x the requests per second'))
+
+    def orders(self, stripe, user, count):
+        """Create orders whose PaymentIntents have succeeded; return (user, intent id) pairs."""
+        intent_ids = [stripe.create_intent(status='succeeded')['id'] for _ in range(count)]
+        # 'processing', not a pending cart, which a user may only have one of
+        Order.objects.bulk_create([
+            Order(user=user, order_number=f'BENCH-{user.pk}-{intent_id}', status='processing',
+                  stripe_payment_intent_id=intent_id)
+            for intent_id in intent_ids
+        ])
+        return [(user, intent_id) for intent_id in intent_ids]
+
+    def report(self, label, result):
+        """Print one mode's result; return its requests per second."""
+        elapsed, statuses = result
+        failed = [status for status in statuses if status != 200]
+        if failed:
+            raise CommandError(f'{label} {len(failed)} requests failed, e.g. with status {failed[0]}')
+        rate = len(statuses) / elapsed
+        self.stdout.write(f'  {label:<19}{rate:8.1f} req/s   {elapsed:6.2f}s')
+        return rate
+
+    def run_sync(self, payments, workers):
+        """Serve the requests with threads standing in for sync workers. Returns (seconds, statuses)."""
+        pending = queue.Queue()
+        for payment in payments:
+            pending.put(payment)
+        statuses = []
+        url = reverse('restaurant:payment_success')
+        clients = []
+        for _ in range(workers):
+            client = Client()
+            client.force_login(payments[0][0])
+            clients.append(client)
+
+        def worker(client):
+            try:
+                while True:
+                    try:
+                        _, intent_id = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    statuses.append(client.get(url, {'payment_intent': intent_id}).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        for client in clients:
+            client.logout()
+        return elapsed, statuses
+
+    async def run_asgi(self, payments):
+        """Serve the requests concurrently through the ASGI handler. Returns (seconds, statuses)."""
+        url = reverse('restaurant:payment_success')
+        clients = []
+        for user, _ in payments:
+            client = AsyncClient()
+            await client.aforce_login(user)
+            clients.append(client)
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.get(url, {'payment_intent': intent_id})
+            for client, (_, intent_id) in zip(clients, payments)
+        ])
+        elapsed = time.perf_counter() - start
+        for client in clients:
+            await client.alogout()
+        return elapsed, [response.status_code for response in responses]
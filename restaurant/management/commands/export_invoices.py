@@ -0,0 +1,70 @@
+"""
+Management command to write the invoices of paid orders for a month and/or a
+customer account into one ZIP, rendering them in worker processes.
+"""
+import os
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from restaurant.invoice_archive import DEFAULT_CHUNK_SIZE, paid_orders, write_invoice_archive
+
+
+class Command(BaseCommand):
+    help = 'Export the invoices of paid orders to a ZIP archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the ZIP file to write')
+        parser.add_argument('--month', help='Only orders placed in this month (YYYY-MM)')
+        parser.add_argument('--user', help='Only orders of this account (username or email)')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Worker processes (default: CPU count; 1 renders in this process)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f'Orders loaded per query (default: {DEFAULT_CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        orders = paid_orders()
+        if options['month']:
+            start, end = self.month_range(options['month'])
+            orders = orders.filter(created_at__gte=start, created_at__lt=end)
+        if options['user']:
+            orders = orders.filter(user=self.find_user(options['user']))
+
+        workers = max(1, options['workers'])
+        self.stdout.write(f'Exporting invoices to {options["output"]} with {workers} worker(s)...')
+        stats = write_invoice_archive(
+            orders, options['output'], workers=workers, chunk_size=max(1, options['chunk_size'])
+        )
+        if not stats.invoices:
+            self.stdout.write(self.style.WARNING('No paid orders matched; the archive is empty'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {stats.invoices} invoices ({stats.rendered} rendered, {stats.reused} from storage) '
+            f'in {stats.seconds:.2f}s ({stats.per_second:.1f} PDFs/sec), '
+            f'{stats.bytes / 1024:.0f} KiB of PDFs'
+        ))
+
+    def month_range(self, value):
+        """Return the aware [start, end) datetimes of a YYYY-MM month."""
+        try:
+            start = datetime.strptime(value, '%Y-%m')
+        except ValueError:
+            raise CommandError(f'--month must look like 2025-01, not {value!r}')
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        return timezone.make_aware(start), timezone.make_aware(end)
+
+    def find_user(self, value):
+        """Return the user with this username or email."""
+        users = list(User.objects.filter(Q(username=value) | Q(email__iexact=value))[:2])
+        if len(users) != 1:
+            raise CommandError(
+                f'No user {value!r}' if not users else f'{value!r} matches more than one user'
+            )
+        return users[0]
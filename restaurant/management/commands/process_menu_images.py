@@ -0,0 +1,182 @@
+"""
+Management command to (re)generate responsive derivatives for every image in
+media/menu_images/ using a pool of worker processes.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from restaurant.images import (
+    DERIVATIVE_DIR, content_hash, delete_derivatives, derivatives_exist, render_derivatives,
+    store_derivatives,
+)
+from restaurant.menu_cache import bump_menu_version
+from restaurant.models import MenuItem
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif'}
+
+
+def _init_worker():
+    """Make sure Django is configured in worker processes (spawn start method)."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'flavour.settings')
+    django.setup()
+
+
+def process_image(name, known):
+    """
+    Regenerate derivatives for one stored image unless its content is unchanged.
+
+    Runs in a worker process. Returns (name, metadata, processed).
+    """
+    with default_storage.open(name, 'rb') as f:
+        data = f.read()
+    if known and known.get('hash') == content_hash(data) and derivatives_exist(default_storage, known):
+        return name, known, False
+    metadata, files = render_derivatives(data, name)
+    store_derivatives(default_storage, files)
+    if known:
+        # Derivative names carry the content hash, so old copies are orphaned
+        delete_derivatives(default_storage, known, keep=metadata)
+    return name, metadata, True
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive image derivatives for media/menu_images/ in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory', default='menu_images',
+            help='Storage directory to scan (default: menu_images)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Worker processes (default: CPU count; 1 processes in this process)'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate even when the source image is unchanged'
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        manifest_name = os.path.join(directory, DERIVATIVE_DIR, 'manifest.json')
+
+        names = self.find_images(directory)
+        if not names:
+            self.stdout.write(self.style.WARNING(f'No images found in {directory}/'))
+            return
+
+        known = {} if options['force'] else self.load_manifest(manifest_name)
+        items_by_image = {}
+        for item in MenuItem.objects.exclude(image='').exclude(image__isnull=True):
+            items_by_image.setdefault(item.image.name, []).append(item)
+            if not options['force'] and item.image_derivatives.get('hash'):
+                known.setdefault(item.image.name, item.image_derivatives)
+
+        workers = max(1, options['workers'])
+        self.stdout.write(f'Processing {len(names)} images with {workers} worker(s)...')
+
+        start = time.perf_counter()
+        results = {}
+        processed = errors = 0
+        for name, outcome in self.run(names, known, workers):
+            if isinstance(outcome, Exception):
+                errors += 1
+                self.stdout.write(self.style.ERROR(f'  ✗ {name}: {outcome}'))
+                continue
+            metadata, was_processed = outcome
+            results[name] = metadata
+            if was_processed:
+                processed += 1
+                self.stdout.write(self.style.SUCCESS(f'  ✓ {name}'))
+        elapsed = time.perf_counter() - start
+
+        self.save_manifest(manifest_name, results)
+        updated = self.update_menu_items(items_by_image, results)
+
+        skipped = len(results) - processed
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✓ {processed} processed, {skipped} unchanged, {errors} failed '
+            f'in {elapsed:.2f}s ({rate:.1f} images/sec); {updated} menu items updated'
+        ))
+
+    def find_images(self, directory):
+        """Return storage names of the source images in directory."""
+        if not default_storage.exists(directory):
+            return []
+        _, files = default_storage.listdir(directory)
+        return sorted(
+            os.path.join(directory, filename) for filename in files
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+        )
+
+    def run(self, names, known, workers):
+        """Yield (name, (metadata, processed)) or (name, exception) per image."""
+        if workers == 1:
+            for name in names:
+                try:
+                    _, metadata, was_processed = process_image(name, known.get(name))
+                    yield name, (metadata, was_processed)
+                except Exception as e:
+                    yield name, e
+            return
+
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(process_image, name, known.get(name)): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    _, metadata, was_processed = future.result()
+                    yield name, (metadata, was_processed)
+                except Exception as e:
+                    yield name, e
+
+    def load_manifest(self, manifest_name):
+        """Return {source name: metadata} from the last run, if any."""
+        if not default_storage.exists(manifest_name):
+            return {}
+        with default_storage.open(manifest_name, 'rb') as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                return {}
+
+    def save_manifest(self, manifest_name, results):
+        """Record the metadata of every image so the next run can skip it."""
+        if default_storage.exists(manifest_name):
+            default_storage.delete(manifest_name)
+        default_storage.save(manifest_name, ContentFile(json.dumps(results, sort_keys=True).encode()))
+
+    def update_menu_items(self, items_by_image, results):
+        """Point menu items at their regenerated derivatives in one query."""
+        now = timezone.now()
+        changed = []
+        for name, items in items_by_image.items():
+            metadata = results.get(name)
+            if metadata is None:
+                continue
+            for item in items:
+                if item.image_derivatives != metadata:
+                    item.image_derivatives = metadata
+                    item.updated_at = now
+                    changed.append(item)
+        if changed:
+            MenuItem.objects.bulk_update(changed, ['image_derivatives', 'updated_at'])
+            # bulk_update sends no signals, so invalidate cached menus here
+            bump_menu_version()
+        return len(changed)
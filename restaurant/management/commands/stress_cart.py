@@ -0,0 +1,92 @@
+"""
+Management command to hammer the database cart with concurrent adds and check
+that no cart, line or quantity is duplicated or lost.
+
+Run it against the development database (or a PostgreSQL DATABASE_URL); it
+creates a throwaway user and menu item and removes them afterwards.
+"""
+import threading
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from restaurant.cart import DatabaseCart
+from restaurant.models import MenuItem, Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Stress-test concurrent add-to-cart requests against the configured database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--adds', type=int, default=25, help='Adds per client')
+        parser.add_argument('--quantity', type=int, default=1, help='Quantity per add')
+
+    def handle(self, *args, **options):
+        threads, adds, quantity = options['threads'], options['adds'], options['quantity']
+        user = User.objects.create_user(username=f'cart-stress-{time.time_ns()}')
+        menu_item = MenuItem.objects.create(
+            name=f'Stress Dish {user.pk}', price=Decimal('4.25'), is_available=False
+        )
+        try:
+            self.stdout.write(f'{threads} threads x {adds} adds of {quantity} on one cart...')
+            elapsed, errors = self.run_clients(user, menu_item, threads, adds, quantity)
+            self.check_cart(user, menu_item, threads * adds * quantity, errors)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'✓ {threads * adds} concurrent adds in {elapsed:.2f}s: '
+                    'one cart, one line, no lost updates'
+                )
+            )
+        finally:
+            menu_item.delete()
+            user.delete()
+
+    def run_clients(self, user, menu_item, threads, adds, quantity):
+        """Run the clients in threads, all released at once. Returns (seconds, errors)."""
+        barrier = threading.Barrier(threads)
+        errors = []
+        request = SimpleNamespace(user=user)
+
+        def client():
+            try:
+                barrier.wait()
+                cart = DatabaseCart(request)
+                for _ in range(adds):
+                    cart.add(menu_item, quantity)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=client) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - start, errors
+
+    def check_cart(self, user, menu_item, expected_quantity, errors):
+        """Raise CommandError unless the adds produced exactly one consistent cart."""
+        if errors:
+            raise CommandError(f'{len(errors)} clients failed, first error: {errors[0]!r}')
+        carts = list(Order.objects.filter(user=user, status='pending', payment_status='pending'))
+        if len(carts) != 1:
+            raise CommandError(f'Expected one pending cart, found {len(carts)}')
+        lines = list(OrderItem.objects.filter(order=carts[0], menu_item=menu_item))
+        if len(lines) != 1:
+            raise CommandError(f'Expected one cart line, found {len(lines)}')
+        line = lines[0]
+        if line.quantity != expected_quantity:
+            raise CommandError(f'Lost updates: quantity {line.quantity}, expected {expected_quantity}')
+        expected_total = menu_item.price * expected_quantity
+        if line.subtotal != expected_total or carts[0].total_amount != expected_total:
+            raise CommandError(
+                f'Totals drifted: subtotal {line.subtotal}, order {carts[0].total_amount}, '
+                f'expected {expected_total}'
+            )
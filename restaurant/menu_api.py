@@ -0,0 +1,145 @@
+"""
+Read-only JSON menu API for kiosks and the mobile app.
+
+The catalog is serialized once per menu version (and per requested fieldset)
+from the in-process menu snapshot, then compressed up front, so answering a
+request is a dict lookup and a copy of ready-made bytes. A MenuItem write
+bumps the menu version, which makes the next request rebuild the bodies.
+"""
+import gzip
+import hashlib
+import json
+import threading
+
+from .menu_cache import get_menu_snapshot
+from .models import MenuItem
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+API_VERSION = 1
+
+# Serializers for each public field, in output order.
+FIELDS = {
+    'id': lambda item: item.pk,
+    'name': lambda item: item.name,
+    'description': lambda item: item.description,
+    'price': lambda item: str(item.price),
+    'category': lambda item: item.category,
+    'image': lambda item: item.image.url if item.image else None,
+    'thumbnail': lambda item: item.thumbnail_url or None,
+    'updated_at': lambda item: item.updated_at.isoformat(),
+}
+
+# Fieldsets kept per menu version; kiosks use a handful, so this is plenty.
+MAX_CACHED_FIELDSETS = 16
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+_bodies = {}
+_bodies_version = None
+_bodies_lock = threading.Lock()
+
+
+class MenuBody:
+    """One serialized menu representation with its pre-compressed variants."""
+
+    def __init__(self, version, fields, content):
+        self.version = version
+        self.fields = fields
+        self.encodings = {'identity': content, 'gzip': gzip.compress(content, GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(content, quality=BROTLI_QUALITY)
+        digest = hashlib.sha256(content).hexdigest()[:16]
+        self.etags = {encoding: f'"{digest}-{encoding}"' for encoding in self.encodings}
+
+
+def parse_fields(value):
+    """
+    Return the requested fields as a tuple in output order.
+
+    Raises ValueError naming any unknown field. An empty value selects all.
+    """
+    if not value:
+        return tuple(FIELDS)
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = requested - set(FIELDS)
+    if unknown:
+        raise ValueError(', '.join(sorted(unknown)))
+    # The id is always included so clients can key their caches on it
+    requested.add('id')
+    return tuple(name for name in FIELDS if name in requested)
+
+
+def serialize_menu(snapshot, fields):
+    """Return the compact JSON bytes of the menu, grouped by category."""
+    serializers = [(name, FIELDS[name]) for name in fields]
+    categories = []
+    for key, label in MenuItem.CATEGORY_CHOICES:
+        items = snapshot.categories.get(key)
+        if not items:
+            continue
+        categories.append({
+            'key': key,
+            'name': label,
+            'items': [{name: serialize(item) for name, serialize in serializers} for item in items],
+        })
+    payload = {
+        'api_version': API_VERSION,
+        'menu_version': snapshot.version,
+        'fields': list(fields),
+        'categories': categories,
+    }
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def get_menu_body(fields):
+    """Return the MenuBody for the current menu version and fieldset, building it if needed."""
+    global _bodies, _bodies_version
+    snapshot = get_menu_snapshot()
+    body = _bodies.get(fields) if _bodies_version == snapshot.version else None
+    if body is not None:
+        return body
+    with _bodies_lock:
+        if _bodies_version != snapshot.version:
+            _bodies, _bodies_version = {}, snapshot.version
+        body = _bodies.get(fields)
+        if body is None:
+            body = MenuBody(snapshot.version, fields, serialize_menu(snapshot, fields))
+            if len(_bodies) >= MAX_CACHED_FIELDSETS:
+                _bodies.pop(next(iter(_bodies)))
+            _bodies[fields] = body
+        return body
+
+
+def accepted_encodings(header):
+    """Return the content codings a client accepts (q > 0), from Accept-Encoding."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def choose_encoding(body, header):
+    """Pick the smallest pre-compressed variant the client accepts."""
+    accepted = accepted_encodings(header or '')
+    for encoding in ('br', 'gzip'):
+        if encoding in body.encodings and (encoding in accepted or '*' in accepted):
+            return encoding
+    return 'identity'
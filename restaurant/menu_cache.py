@@ -0,0 +1,125 @@
+"""
+In-process snapshot of the available menu.
+
+The menu is read on every visit but only changes a few times a day, so the
+available items are fetched and grouped once per menu version and reused
+until the version changes. The version is derived from the data itself (the
+latest updated_at and deletion, and the item count), so every process
+computing it agrees, and it is kept in the default cache for
+MENU_VERSION_TIMEOUT seconds. A MenuItem write recomputes it straight away
+(see restaurant.signals); a change this process did not see, such as a
+management command's bulk_update or a write in another worker when the cache
+is per-process, is noticed once the cached version expires.
+"""
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .models import MenuItem, MenuItemTombstone
+
+
+MENU_VERSION_CACHE_KEY = 'restaurant:menu_version'
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def group_by_category(items):
+    """Group items into an ordered {category: [items]} dict, keeping their order."""
+    categories = {}
+    for item in items:
+        categories.setdefault(item.category, []).append(item)
+    return categories
+
+
+def menu_sort_key(item):
+    """Sort key of the menu's ordering, with the pk breaking ties."""
+    return (item.category, item.name, item.pk)
+
+
+class MenuSnapshot:
+    """Grouped, category-ordered view of the available menu at one version."""
+
+    def __init__(self, version, items):
+        self.version = version
+        # Sorted in Python too, so pagination can binary-search the same order
+        self.items = tuple(sorted(items, key=menu_sort_key))
+        self.by_pk = {item.pk: item for item in self.items}
+        self.categories = group_by_category(self.items)
+        # Deletes don't move any updated_at, so the version's own time counts too
+        self.last_modified = max(
+            [item.updated_at for item in self.items] + [menu_version_time(version)]
+        )
+
+    def filter(self, category='', ids=None):
+        """
+        Return the items in a category and/or among the given ids.
+
+        When ids is given (e.g. ranked search results) its order is kept.
+        """
+        if ids is not None:
+            items = [self.by_pk[pk] for pk in ids if pk in self.by_pk]
+            if category:
+                items = [item for item in items if item.category == category]
+            return items
+        if category:
+            return list(self.categories.get(category, []))
+        return list(self.items)
+
+
+def compute_menu_version():
+    """
+    Return the version token of the menu as currently stored.
+
+    It starts with the time of the latest change in hex milliseconds (see
+    menu_version_time), followed by a digest that tells apart changes made
+    within the same millisecond.
+    """
+    items = MenuItem.objects.aggregate(latest=Max('updated_at'), count=Count('pk'))
+    deleted = MenuItemTombstone.objects.aggregate(latest=Max('deleted_at'))['latest']
+    changed = [moment for moment in (items['latest'], deleted) if moment is not None]
+    millis = int(max(changed).timestamp() * 1000) if changed else 0
+    state = f'{items["latest"]}|{deleted}|{items["count"]}'
+    return f'{millis:x}-{hashlib.sha256(state.encode()).hexdigest()[:12]}'
+
+
+def menu_version_time(version):
+    """Return the time of the latest change in a menu version, as an aware datetime."""
+    millis = int(version.split('-', 1)[0], 16)
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc)
+
+
+def get_menu_version():
+    """Return the current menu version, computing it if the cache has none."""
+    version = cache.get(MENU_VERSION_CACHE_KEY)
+    if version is None:
+        # add(), so a version computed from rows read before a concurrent
+        # commit cannot overwrite the one that commit stored
+        cache.add(MENU_VERSION_CACHE_KEY, compute_menu_version(), settings.MENU_VERSION_TIMEOUT)
+        version = cache.get(MENU_VERSION_CACHE_KEY)
+    return version
+
+
+def bump_menu_version():
+    """Recompute the menu version after a write, invalidating every snapshot built before it."""
+    version = compute_menu_version()
+    cache.set(MENU_VERSION_CACHE_KEY, version, settings.MENU_VERSION_TIMEOUT)
+    return version
+
+
+def get_menu_snapshot():
+    """Return the snapshot for the current menu version, rebuilding it if stale."""
+    global _snapshot
+    # Read the version before querying so a bump during the rebuild is not lost.
+    version = get_menu_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = MenuSnapshot(version, MenuItem.objects.filter(is_available=True))
+        return _snapshot
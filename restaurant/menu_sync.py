@@ -0,0 +1,93 @@
+"""
+Delta sync for menu clients (kiosks, the mobile app).
+
+Instead of polling the whole catalog, a client keeps the sync token from its
+last poll and asks for the items changed since then: rows whose updated_at
+moved (an index on updated_at keeps this a range scan) plus tombstones for
+deleted rows. Traffic is then proportional to how much the menu changed.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .menu_api import FIELDS
+from .menu_cache import menu_version_time
+from .models import MenuItem, MenuItemTombstone
+
+
+# Tombstones older than this are pruned; older clients must resync in full.
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+# Re-send changes from slightly before the token, so a transaction that
+# stamped updated_at before the previous poll but committed after it is not
+# missed. Clients apply upserts idempotently, so repeats are harmless.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def format_sync_token(moment):
+    """Return the token a client sends back as ?since= on its next poll."""
+    return moment.astimezone(dt_timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def parse_since(value):
+    """
+    Return the aware datetime for a sync token, ISO timestamp or menu version.
+
+    Raises ValueError if value is none of those.
+    """
+    value = (value or '').strip().replace(' ', '+')  # an unescaped '+' arrives as a space
+    if not value:
+        raise ValueError('missing')
+    moment = parse_datetime(value)
+    if moment is None:
+        # A menu version, as returned in the full menu payload
+        try:
+            moment = menu_version_time(value)
+        except (OverflowError, OSError) as e:
+            raise ValueError(value) from e
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def record_deletion(pk):
+    """Write a tombstone for a deleted menu item and prune expired ones."""
+    now = timezone.now()
+    MenuItemTombstone.objects.create(menu_item_id=pk, deleted_at=now)
+    MenuItemTombstone.objects.filter(deleted_at__lt=now - TOMBSTONE_RETENTION).delete()
+
+
+def menu_changes(since, fields=tuple(FIELDS)):
+    """
+    Return the delta payload for changes made since the given datetime.
+
+    Items that became unavailable are reported as deleted, since clients only
+    hold the available menu. If since is older than the tombstone retention
+    the payload asks the client to reset and fetch the full menu instead.
+    """
+    now = timezone.now()
+    payload = {
+        'since': format_sync_token(since),
+        'sync_token': format_sync_token(now),
+        'reset': False,
+        'upserted': [],
+        'deleted': [],
+    }
+    if since < now - TOMBSTONE_RETENTION:
+        payload['reset'] = True
+        return payload
+
+    window_start = since - SYNC_OVERLAP
+    serializers = [(name, FIELDS[name]) for name in fields]
+    deleted = set(
+        MenuItemTombstone.objects.filter(deleted_at__gte=window_start)
+        .values_list('menu_item_id', flat=True)
+    )
+    for item in MenuItem.objects.filter(updated_at__gte=window_start).order_by('updated_at', 'pk'):
+        if item.is_available:
+            payload['upserted'].append({name: serialize(item) for name, serialize in serializers})
+        else:
+            deleted.add(item.pk)
+    payload['deleted'] = sorted(deleted)
+    return payload
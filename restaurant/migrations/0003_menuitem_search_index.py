@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-17 09:00
+
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from restaurant.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from restaurant.search import uninstall_search_index
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant", "0002_order_orderitem_reservation"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
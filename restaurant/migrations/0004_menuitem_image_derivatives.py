@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0003_menuitem_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='menuitem',
+            options={'ordering': ['category', 'name'], 'verbose_name': 'Menu Item', 'verbose_name_plural': 'Menu Items'},
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of the image, generated on upload'),
+        ),
+    ]
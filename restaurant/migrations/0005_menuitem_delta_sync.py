@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0004_menuitem_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuItemTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('menu_item_id', models.PositiveIntegerField(help_text='Primary key of the deleted menu item')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Date and time the menu item was deleted')),
+            ],
+            options={
+                'verbose_name': 'Menu Item Tombstone',
+                'verbose_name_plural': 'Menu Item Tombstones',
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['updated_at'], name='menuitem_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitemtombstone',
+            index=models.Index(fields=['deleted_at'], name='menuitemtombstone_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:58
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """
+    Make existing data satisfy the new constraints.
+
+    Of several pending carts per user the newest is kept and the others are
+    cancelled; duplicate lines of an order are merged into one.
+    """
+    Order = apps.get_model('restaurant', 'Order')
+    OrderItem = apps.get_model('restaurant', 'OrderItem')
+
+    carts = Order.objects.filter(status='pending', payment_status='pending')
+    duplicated_users = (
+        carts.values('user').annotate(carts=Count('id')).filter(carts__gt=1).values_list('user', flat=True)
+    )
+    for user_id in list(duplicated_users):
+        newest = carts.filter(user_id=user_id).order_by('-created_at', '-id').first()
+        carts.filter(user_id=user_id).exclude(pk=newest.pk).update(status='cancelled')
+
+    duplicated_lines = (
+        OrderItem.objects.values('order', 'menu_item').annotate(lines=Count('id')).filter(lines__gt=1)
+    )
+    changed_orders = set()
+    for group in list(duplicated_lines):
+        lines = list(
+            OrderItem.objects.filter(order_id=group['order'], menu_item_id=group['menu_item']).order_by('id')
+        )
+        keep = lines[0]
+        keep.quantity = sum(line.quantity for line in lines)
+        keep.subtotal = keep.price * keep.quantity
+        keep.save(update_fields=['quantity', 'subtotal'])
+        OrderItem.objects.filter(pk__in=[line.pk for line in lines[1:]]).delete()
+        changed_orders.add(group['order'])
+    for order_id in changed_orders:
+        total = OrderItem.objects.filter(order_id=order_id).aggregate(total=Sum('subtotal'))['total']
+        Order.objects.filter(pk=order_id).update(total_amount=total or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0006_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_cart_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('payment_status', 'pending'), ('status', 'pending')), fields=('user',), name='order_one_cart_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(fields=('order', 'menu_item'), name='orderitem_unique_line'),
+        ),
+    ]
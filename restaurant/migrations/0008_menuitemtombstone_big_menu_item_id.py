@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0007_cart_unique_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='menuitemtombstone',
+            name='menu_item_id',
+            field=models.PositiveBigIntegerField(help_text='Primary key of the deleted menu item'),
+        ),
+    ]
@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from decimal import Decimal
 
+from .images import build_picture, delete_derivatives, generate_derivatives
+
 # Create your models here.
 class MenuItem(models.Model):
     """
@@ -48,6 +52,13 @@ class MenuItem(models.Model):
         help_text = "Upload an image of the menu item"
     )
 
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text = "Resized copies of the image, generated on upload"
+    )
+
     is_available = models.BooleanField(
         default=True,
         help_text = "Is the menu item available?"
@@ -65,6 +76,35 @@ class MenuItem(models.Model):
     def __str__(self):
         return self.name
 
+    def update_image_derivatives(self):
+        """Regenerate the resized copies of the image and save their paths."""
+        previous = self.image_derivatives
+        if self.image:
+            self.image_derivatives = generate_derivatives(self.image)
+        else:
+            self.image_derivatives = {}
+        if previous:
+            delete_derivatives(self.image.storage, previous, keep=self.image_derivatives)
+        self.save(update_fields=['image_derivatives', 'updated_at'])
+
+    @property
+    def card_picture(self):
+        """Responsive image data for menu cards (up to card size)."""
+        return build_picture(self.image.storage, self.image_derivatives, largest='card')
+
+    @property
+    def detail_picture(self):
+        """Responsive image data for the detail page (up to detail size)."""
+        return build_picture(self.image.storage, self.image_derivatives, largest='detail')
+
+    @property
+    def thumbnail_url(self):
+        """URL of the smallest derivative, or the original if there is none."""
+        picture = build_picture(self.image.storage, self.image_derivatives, largest='thumb')
+        if picture:
+            return picture['src']
+        return self.image.url if self.image else ''
+
     class Meta:
         """" 
         Metadata for the menu item model.
@@ -72,6 +112,54 @@ class MenuItem(models.Model):
         ordering = ['category', 'name']
         verbose_name = "Menu Item"
         verbose_name_plural = "Menu Items"
+        indexes = [
+            # Delta sync asks for items changed since a point in time
+            models.Index(fields=['updated_at'], name='menuitem_updated_at_idx'),
+            # The menu snapshot and category filters read only available
+            # items, in menu order
+            models.Index(
+                fields=['category', 'name'],
+                condition=models.Q(is_available=True),
+                name='menuitem_available_idx',
+            ),
+        ]
+
+
+class MenuItemTombstone(models.Model):
+    """
+    Record of a deleted menu item, so delta sync can tell clients to drop it.
+    Written by restaurant.signals for every delete (views, admin, querysets).
+    """
+    menu_item_id = models.PositiveBigIntegerField(
+        help_text="Primary key of the deleted menu item"
+    )
+    deleted_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Date and time the menu item was deleted"
+    )
+
+    def __str__(self):
+        return f"Menu item {self.menu_item_id} deleted at {self.deleted_at}"
+
+    class Meta:
+        ordering = ['deleted_at']
+        verbose_name = "Menu Item Tombstone"
+        verbose_name_plural = "Menu Item Tombstones"
+        indexes = [
+            models.Index(fields=['deleted_at'], name='menuitemtombstone_deleted_idx'),
+        ]
+
+
+def shift_order_total(order_id, delta):
+    """
+    Add delta to an order's total_amount in a single UPDATE.
+    
+    The addition happens in the database, so concurrent item writes on the
+    same order can't overwrite each other. Returns the new updated_at.
+    """
+    now = timezone.now()
+    Order.objects.filter(pk=order_id).update(total_amount=F('total_amount') + delta, updated_at=now)
+    return now
 
 
 class Order(models.Model):
@@ -150,18 +238,43 @@ class Order(models.Model):
         return f"Order {self.order_number} by {self.user.username}"
     
     def calculate_total(self):
-        """Calculate total amount from order items."""
-        total = Decimal('0.00')
-        for item in self.order_items.all():
-            total += item.subtotal
+        """
+        Recalculate the total from the order items in the database.
+        
+        OrderItem keeps total_amount current with delta updates; this is the
+        reconciliation, summed by the database and written to one column.
+        """
+        total = self.order_items.aggregate(total=Sum('subtotal'))['total'] or Decimal('0.00')
         self.total_amount = total
-        self.save()
+        self.updated_at = timezone.now()
+        Order.objects.filter(pk=self.pk).update(total_amount=total, updated_at=self.updated_at)
         return total
     
+    def add_to_total(self, delta):
+        """Atomically move total_amount by delta (a change in one item's subtotal)."""
+        if not delta:
+            return
+        self.updated_at = shift_order_total(self.pk, delta)
+        self.total_amount += delta
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Order"
         verbose_name_plural = "Orders"
+        constraints = [
+            # A user has at most one cart (pending, unpaid order). The unique
+            # partial index also serves the cart lookup.
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(status='pending', payment_status='pending'),
+                name='order_one_cart_per_user',
+            ),
+        ]
+        indexes = [
+            # A user's order history, newest first (scanned backwards, with
+            # id as the pagination tie breaker)
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -195,14 +308,37 @@ class OrderItem(models.Model):
         help_text="Subtotal for this item (price * quantity)"
     )
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored order and subtotal so saves can apply a delta."""
+        instance = super().from_db(db, field_names, values)
+        instance._saved_total = (instance.__dict__.get('order_id'), instance.__dict__.get('subtotal'))
+        return instance
+    
     def save(self, *args, **kwargs):
-        """Calculate subtotal before saving."""
+        """Calculate subtotal before saving and move the order total by the change."""
         if not self.price:
             self.price = self.menu_item.price
         self.subtotal = self.price * self.quantity
-        super().save(*args, **kwargs)
-        # Update order total
-        self.order.calculate_total()
+        saved_order_id, saved_subtotal = getattr(self, '_saved_total', (None, None))
+        if self.pk and saved_subtotal is None:
+            # Loaded with subtotal deferred (or built by hand); read it once
+            saved_order_id, saved_subtotal = (
+                OrderItem.objects.filter(pk=self.pk).values_list('order_id', 'subtotal').first()
+                or (None, None)
+            )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if saved_order_id is not None and saved_order_id != self.order_id:
+                # Moved to another order
+                shift_order_total(saved_order_id, -saved_subtotal)
+                saved_subtotal = None
+            delta = self.subtotal - (saved_subtotal or Decimal('0.00'))
+            if OrderItem.order.is_cached(self):
+                self.order.add_to_total(delta)
+            else:
+                shift_order_total(self.order_id, delta)
+        self._saved_total = (self.order_id, self.subtotal)
     
     def __str__(self):
         return f"{self.quantity}x {self.menu_item.name} in Order {self.order.order_number}"
@@ -210,6 +346,23 @@ class OrderItem(models.Model):
     class Meta:
         verbose_name = "Order Item"
         verbose_name_plural = "Order Items"
+        constraints = [
+            # One line per dish; adding it again raises the quantity instead
+            models.UniqueConstraint(fields=['order', 'menu_item'], name='orderitem_unique_line'),
+        ]
+
+
+# What a rendered order line needs: the line itself plus its dish's name,
+# category and image, without the description and other wide columns.
+ORDER_ITEM_ROW_FIELDS = (
+    'id', 'order_id', 'menu_item_id', 'quantity', 'price', 'subtotal',
+    'menu_item__id', 'menu_item__name', 'menu_item__category', 'menu_item__image',
+)
+
+
+def order_item_rows(queryset):
+    """Return queryset of order items with their dishes joined in, for display."""
+    return queryset.select_related('menu_item').only(*ORDER_ITEM_ROW_FIELDS)
 
 
 class Reservation(models.Model):
@@ -276,4 +429,8 @@ class Reservation(models.Model):
     class Meta:
         ordering = ['date', 'time']
         verbose_name = "Reservation"
-        verbose_name_plural = "Reservations"
\ No newline at end of file
+        verbose_name_plural = "Reservations"
+        indexes = [
+            # A user's reservations in date order
+            models.Index(fields=['user', 'date', 'time', 'id'], name='reservation_user_date_idx'),
+        ]
\ No newline at end of file
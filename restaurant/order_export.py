@@ -0,0 +1,116 @@
+"""
+Order line exports as CSV or JSON Lines.
+
+One row per order line, with its order's columns repeated. Rows are read as
+tuples (values_list, no model instances) through a chunked iterator, and
+serialized into text blocks of about EXPORT_BLOCK_SIZE characters, so memory
+stays constant whether the export holds a hundred lines or millions. Orders
+without lines (empty carts) have no rows.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from io import StringIO
+
+from django.utils import timezone
+
+from .models import OrderItem
+
+
+# Export column name: OrderItem lookup
+EXPORT_COLUMNS = {
+    'order_number': 'order__order_number',
+    'created_at': 'order__created_at',
+    'username': 'order__user__username',
+    'email': 'order__user__email',
+    'status': 'order__status',
+    'payment_status': 'order__payment_status',
+    'order_total': 'order__total_amount',
+    'menu_item_id': 'menu_item_id',
+    'menu_item': 'menu_item__name',
+    'quantity': 'quantity',
+    'price': 'price',
+    'subtotal': 'subtotal',
+}
+
+# Rows fetched from the database per round trip
+EXPORT_CHUNK_SIZE = 2000
+
+# Characters of serialized rows collected before they are handed on
+EXPORT_BLOCK_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def export_rows(start=None, end=None, status='', payment_status=''):
+    """
+    Return an iterator of order line tuples in EXPORT_COLUMNS order for orders
+    placed between the start and end dates (inclusive) with the given statuses.
+    """
+    lines = OrderItem.objects.order_by('order_id', 'pk')
+    if start:
+        lines = lines.filter(order__created_at__gte=_start_of_day(start))
+    if end:
+        lines = lines.filter(order__created_at__lt=_start_of_day(end + timedelta(days=1)))
+    if status:
+        lines = lines.filter(order__status=status)
+    if payment_status:
+        lines = lines.filter(order__payment_status=payment_status)
+    return lines.values_list(*EXPORT_COLUMNS.values()).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def export_blocks(rows, export_format='csv'):
+    """Yield the serialized export of rows as text blocks, header first."""
+    serialize = _csv_blocks if export_format == 'csv' else _jsonl_blocks
+    return serialize(rows)
+
+
+def _start_of_day(day):
+    """Return midnight at the start of a date in the current time zone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _text(value):
+    """Return a CSV cell value; datetimes as ISO 8601."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    """Serialize what json can't: datetimes as ISO 8601, Decimals as exact strings."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_blocks(rows):
+    """Yield CSV text blocks."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([_text(value) for value in row])
+        if buffer.tell() >= EXPORT_BLOCK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _jsonl_blocks(rows):
+    """Yield JSON Lines text blocks, one object per row."""
+    columns = list(EXPORT_COLUMNS)
+    block, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, row)), default=_json_value) + '\n'
+        block.append(line)
+        size += len(line)
+        if size >= EXPORT_BLOCK_SIZE:
+            yield ''.join(block)
+            block, size = [], 0
+    if block:
+        yield ''.join(block)
@@ -0,0 +1,197 @@
+"""
+Keyset (cursor) pagination for the menu, order and reservation listings.
+
+OFFSET pagination makes the database walk and throw away every earlier row,
+and numbered pages need a COUNT(*) over the whole result. Here each page link
+carries an opaque cursor with the sort key of the row the page starts after
+(or ends before), and the page is fetched with a WHERE on that key, so a deep
+page costs the same index range scan as the first one. The trade-off is
+previous/next links instead of page numbers.
+
+Orderings must be on non-null fields; the primary key is appended as a tie
+breaker so every row has a unique position.
+"""
+import base64
+import json
+from bisect import bisect_left, bisect_right
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+CURSOR_PARAM = 'cursor'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class KeysetPage:
+    """One page of results plus the links to its neighbours."""
+
+    def __init__(self, request, object_list, next_key=None, previous_key=None):
+        self.object_list = object_list
+        self.next_url = _page_url(request, NEXT, next_key) if next_key is not None else None
+        self.previous_url = (
+            _page_url(request, PREVIOUS, previous_key) if previous_key is not None else None
+        )
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_url is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_url is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(direction, key):
+    """Return the URL-safe cursor for a direction and a sort key."""
+    payload = json.dumps([direction, list(key)], separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (direction, key list) from a cursor, or None if it is malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(key, list):
+        return None
+    return direction, key
+
+
+def _page_url(request, direction, key):
+    """Return the current URL with its cursor replaced."""
+    params = request.GET.copy()
+    params[CURSOR_PARAM] = encode_cursor(direction, key)
+    return f'?{params.urlencode()}'
+
+
+def _ordering_fields(queryset, ordering):
+    """Return [(field name, descending)] for ordering, ending with the primary key."""
+    fields = []
+    for name in ordering:
+        descending = name.startswith('-')
+        fields.append((name.lstrip('-'), descending))
+    if fields[-1][0] not in ('pk', queryset.model._meta.pk.name):
+        fields.append(('pk', fields[-1][1]))
+    return fields
+
+
+def _parse_key(queryset, fields, key):
+    """Convert cursor values back to Python values, or None if they don't fit."""
+    if len(key) != len(fields):
+        return None
+    opts = queryset.model._meta
+    values = []
+    for (name, _), raw in zip(fields, key):
+        try:
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+            values.append(field.to_python(raw))
+        except (FieldDoesNotExist, ValidationError, TypeError):
+            return None
+    return values
+
+
+def _after(fields, values, reverse=False):
+    """
+    Build the WHERE clause for rows strictly after a key in the ordering
+    (strictly before it when reverse is set).
+
+    (a, b, pk) > (x, y, z) expands to
+    a > x OR (a = x AND b > y) OR (a = x AND b = y AND pk > z),
+    with > swapped for < on descending fields.
+    """
+    condition = Q()
+    equal = {}
+    for (name, descending), value in zip(fields, values):
+        lookup = 'lt' if descending != reverse else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def keyset_paginate(request, queryset, ordering, per_page):
+    """
+    Return the KeysetPage of queryset selected by the request's cursor.
+
+    Fetches at most per_page + 1 rows and never counts the result.
+    """
+    fields = _ordering_fields(queryset, ordering)
+    order_by = [f"{'-' if descending else ''}{name}" for name, descending in fields]
+    reverse_order_by = [f"{'' if descending else '-'}{name}" for name, descending in fields]
+
+    def key_of(obj):
+        return [getattr(obj, name) for name, _ in fields]
+
+    cursor = decode_cursor(request.GET.get(CURSOR_PARAM))
+    values = _parse_key(queryset, fields, cursor[1]) if cursor else None
+
+    items = []
+    if values is not None:
+        if cursor[0] == NEXT:
+            rows = list(queryset.filter(_after(fields, values)).order_by(*order_by)[:per_page + 1])
+            items = rows[:per_page]
+            has_next, has_previous = len(rows) > per_page, True
+        else:
+            rows = list(
+                queryset.filter(_after(fields, values, reverse=True))
+                .order_by(*reverse_order_by)[:per_page + 1]
+            )
+            items = rows[:per_page][::-1]
+            has_next, has_previous = True, len(rows) > per_page
+
+    if not items:
+        # First page, or a stale cursor whose rows have all gone
+        rows = list(queryset.order_by(*order_by)[:per_page + 1])
+        items = rows[:per_page]
+        has_next, has_previous = len(rows) > per_page, False
+
+    return KeysetPage(
+        request, items,
+        next_key=key_of(items[-1]) if has_next else None,
+        previous_key=key_of(items[0]) if has_previous else None,
+    )
+
+
+def keyset_paginate_list(request, items, key, per_page):
+    """
+    Return the KeysetPage of an in-memory list sorted ascending by key(item).
+
+    The cursor is located by binary search, so any page is O(log n).
+    """
+    cursor = decode_cursor(request.GET.get(CURSOR_PARAM))
+    start = 0
+    if cursor:
+        direction, value = cursor
+        try:
+            if direction == NEXT:
+                start = bisect_right(items, tuple(value), key=key)
+            else:
+                start = max(0, bisect_left(items, tuple(value), key=key) - per_page)
+        except TypeError:
+            # Values of the wrong type for this list; show the first page
+            start = 0
+
+    page = items[start:start + per_page]
+    if not page:
+        start, page = 0, items[:per_page]
+    has_next = start + per_page < len(items)
+    return KeysetPage(
+        request, page,
+        next_key=key(page[-1]) if has_next and page else None,
+        previous_key=key(page[0]) if start > 0 and page else None,
+    )
@@ -0,0 +1,70 @@
+"""
+Stripe calls that don't block a worker.
+
+checkout and payment_success are async views. Served through flavour/asgi.py,
+a Stripe round trip waits on the event loop while the worker carries on with
+other requests. The calls go through stripe's HTTPXClient (httpx.AsyncClient)
+with settings.STRIPE_TIMEOUT seconds per attempt and
+settings.STRIPE_MAX_NETWORK_RETRIES retries, and to settings.STRIPE_API_BASE
+when that is set.
+"""
+import asyncio
+import weakref
+
+from django.conf import settings
+
+try:
+    import stripe
+except ImportError:
+    stripe = None
+
+
+# Event loop: (settings the client was built with, StripeClient)
+_clients = weakref.WeakKeyDictionary()
+
+
+def payments_configured():
+    """Return True if Stripe is installed and both API keys are set."""
+    return bool(
+        stripe
+        and getattr(settings, 'STRIPE_SECRET_KEY', '')
+        and getattr(settings, 'STRIPE_PUBLISHABLE_KEY', '')
+    )
+
+
+def get_stripe_client():
+    """
+    Return the StripeClient of the running event loop.
+
+    An httpx connection pool belongs to the loop that opened it, so each loop
+    gets its own client: one per process under ASGI, one per request when an
+    async view runs under WSGI.
+    """
+    loop = asyncio.get_running_loop()
+    config = (
+        settings.STRIPE_SECRET_KEY, settings.STRIPE_API_BASE,
+        settings.STRIPE_TIMEOUT, settings.STRIPE_MAX_NETWORK_RETRIES,
+    )
+    cached = _clients.get(loop)
+    if cached is None or cached[0] != config:
+        api_key, api_base, timeout, retries = config
+        client = stripe.StripeClient(
+            api_key,
+            base_addresses={'api': api_base} if api_base else {},
+            http_client=stripe.HTTPXClient(timeout=timeout),
+            max_network_retries=retries,
+        )
+        cached = _clients[loop] = (config, client)
+    return cached[1]
+
+
+async def create_payment_intent(amount, currency, metadata):
+    """Create a PaymentIntent for amount in the currency's smallest unit."""
+    return await get_stripe_client().payment_intents.create_async(
+        params={'amount': amount, 'currency': currency, 'metadata': metadata}
+    )
+
+
+async def retrieve_payment_intent(payment_intent_id):
+    """Fetch a PaymentIntent to check its status."""
+    return await get_stripe_client().payment_intents.retrieve_async(payment_intent_id)
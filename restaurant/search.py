@@ -0,0 +1,161 @@
+"""
+Full-text search over menu items.
+
+SQLite uses an FTS5 index and PostgreSQL a generated tsvector column with a
+GIN index. Both are maintained by the database itself, so they stay in sync on
+every MenuItem write, including bulk updates. Other backends (or an SQLite
+build without FTS5) fall back to icontains.
+"""
+import re
+
+from django.db import connection, OperationalError
+from django.db.models import Q
+
+from .models import MenuItem
+
+
+MENU_TABLE = MenuItem._meta.db_table
+SQLITE_FTS_TABLE = f'{MENU_TABLE}_fts'
+POSTGRES_SEARCH_INDEX = f'{MENU_TABLE}_search_gin'
+
+_word_re = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        name, description,
+        content='{MENU_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai AFTER INSERT ON {MENU_TABLE} BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad AFTER DELETE ON {MENU_TABLE} BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au AFTER UPDATE OF name, description ON {MENU_TABLE} BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL_SQL = [
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}",
+]
+
+POSTGRES_INSTALL_SQL = [
+    f"""
+    ALTER TABLE {MENU_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    f"CREATE INDEX IF NOT EXISTS {POSTGRES_SEARCH_INDEX} ON {MENU_TABLE} USING GIN (search_vector)",
+]
+
+POSTGRES_UNINSTALL_SQL = [
+    f"DROP INDEX IF EXISTS {POSTGRES_SEARCH_INDEX}",
+    f"ALTER TABLE {MENU_TABLE} DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def install_search_index(conn):
+    """
+    Create the search index for this database if it is missing.
+
+    Safe to run repeatedly: SQLite drops triggers whenever Django rebuilds the
+    menu table during a migration, so this also runs after every migrate.
+    """
+    if MENU_TABLE not in conn.introspection.table_names():
+        return
+    if conn.vendor == 'sqlite':
+        statements = SQLITE_INSTALL_SQL
+    elif conn.vendor == 'postgresql':
+        statements = POSTGRES_INSTALL_SQL
+    else:
+        return
+    with conn.cursor() as cursor:
+        try:
+            for sql in statements:
+                cursor.execute(sql)
+        except OperationalError:
+            # SQLite compiled without FTS5; searches use the fallback.
+            if conn.vendor != 'sqlite':
+                raise
+
+
+def uninstall_search_index(conn):
+    """Drop the search index created by install_search_index()."""
+    if conn.vendor == 'sqlite':
+        statements = SQLITE_UNINSTALL_SQL
+    elif conn.vendor == 'postgresql':
+        statements = POSTGRES_UNINSTALL_SQL
+    else:
+        return
+    with conn.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def _fallback_search(query):
+    """Plain substring search for databases without a full-text index."""
+    return list(
+        MenuItem.objects.filter(
+            Q(name__icontains=query) | Q(description__icontains=query)
+        ).values_list('pk', flat=True)
+    )
+
+
+def search_menu_item_ids(query):
+    """
+    Return the pks of menu items matching a search query, best match first.
+
+    Every word must match, as a prefix, so partially typed words still find
+    results. Name matches outrank description matches.
+    """
+    words = _word_re.findall(query.lower())
+    if not words:
+        return _fallback_search(query) if query.strip() else []
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{word}"*' for word in words)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT rowid FROM {SQLITE_FTS_TABLE} "
+                    f"WHERE {SQLITE_FTS_TABLE} MATCH %s "
+                    f"ORDER BY bm25({SQLITE_FTS_TABLE}, 10.0, 1.0)",
+                    [match],
+                )
+                return [row[0] for row in cursor.fetchall()]
+        except OperationalError:
+            return _fallback_search(query)
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM {MENU_TABLE}, to_tsquery('english', %s) query "
+                f"WHERE search_vector @@ query "
+                f"ORDER BY ts_rank(search_vector, query) DESC, name",
+                [tsquery],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    return _fallback_search(query)
@@ -0,0 +1,84 @@
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from . import autocomplete
+from .cart import in_bulk_line_delete, invalidate_cart_count
+from .menu_cache import bump_menu_version, get_menu_version
+from .menu_sync import record_deletion
+from .models import MenuItem, Order, OrderItem, shift_order_total
+from .search import install_search_index
+
+
+def _apply_committed_menu_change(update_index, before, written):
+    """
+    Apply a committed write to the local autocomplete index and move to a new version.
+
+    The index is carried over only if the menu has not changed since the
+    write, so an index from just before it lacks nothing else; otherwise it
+    is left stale and the next lookup rebuilds it.
+    """
+    if get_menu_version() != written:
+        bump_menu_version()
+        return
+    update_index()
+    autocomplete.adopt_menu_version((before, written), bump_menu_version())
+
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def menu_item_changed(sender, instance, signal, **kwargs):
+    """Invalidate the menu snapshot whenever a menu item is written."""
+    if signal is post_delete:
+        record_deletion(instance.pk)
+        update_index = partial(autocomplete.unindex_menu_item, instance.pk)
+    else:
+        update_index = partial(autocomplete.index_menu_item, instance)
+    # Invalidate now so this transaction reads its own write, leaving the
+    # autocomplete index stale until commit.
+    before = get_menu_version()
+    written = bump_menu_version()
+    # Bump again once committed so no worker keeps a snapshot built from
+    # rows read before this transaction became visible. Only then does the
+    # write reach the index, so a rolled-back save never does.
+    transaction.on_commit(partial(_apply_committed_menu_change, update_index, before, written))
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, **kwargs):
+    """Take a deleted item's subtotal off its order's total."""
+    if in_bulk_line_delete():
+        return  # the batch recalculates the total once
+    if OrderItem.order.is_cached(instance):
+        instance.order.add_to_total(-instance.subtotal)
+    else:
+        shift_order_total(instance.order_id, -instance.subtotal)
+
+
+@receiver([post_save, post_delete], sender=Order)
+def order_changed(sender, instance, **kwargs):
+    """A new, paid or cancelled order can change its user's cart count."""
+    invalidate_cart_count(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def order_item_changed(sender, instance, signal, created=False, **kwargs):
+    """Invalidate the cart count of the item's user when a line is added or removed."""
+    if signal is post_save and not created:
+        return
+    if in_bulk_line_delete():
+        return  # the batch invalidates the count once
+    if OrderItem.order.is_cached(instance):
+        user_id = instance.order.user_id
+    else:
+        user_id = Order.objects.filter(pk=instance.order_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate_cart_count(user_id)
+
+
+@receiver(post_migrate)
+def ensure_search_index(sender, using, **kwargs):
+    """Restore the search index if a migration rebuilt the menu table."""
+    if sender.name == 'restaurant':
+        install_search_index(connections[using])
@@ -1,12 +1,52 @@
-from django.test import TestCase, Client
+import asyncio
+import csv
+import gzip
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time as clock
+import warnings
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.core.management import call_command
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import IntegrityError, connection, transaction
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
-from datetime import date, time, timedelta
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+from PIL import Image
 
-from .models import MenuItem, Order, OrderItem, Reservation
+from flavour.middleware import AsyncWhiteNoiseMiddleware
+
+from . import urls as restaurant_urls, views as restaurant_views
+from .models import MenuItem, MenuItemTombstone, Order, OrderItem, Reservation, shift_order_total
 from .forms import MenuItemForm, ReservationForm
+from .autocomplete import MenuAutocompleteIndex, bounded_levenshtein, get_autocomplete_index
+from .invoice_archive import write_invoice_archive
+from .invoice_renderer import get_invoice_renderer
+from .invoices import invoice_name, invoice_storage, open_invoice
+from .menu_api import brotli
+from .menu_cache import MENU_VERSION_CACHE_KEY, get_menu_snapshot, get_menu_version, menu_version_time
+from .fake_stripe import FakeStripe
+from .order_export import export_blocks, export_rows
+from .search import search_menu_item_ids
+from .pagination import decode_cursor, encode_cursor
+from .cart import SESSION_CART_KEY, DatabaseCart, cart_count_key, upsert_line
+from .context_processors import cart_count, get_cart_count
 
 
 class MenuItemModelTest(TestCase):
@@ -198,6 +238,36 @@ class ReservationFormTest(TestCase):
         self.assertFalse(form.is_valid())
 
 
+class InvoiceRootMixin:
+    """Keep rendered invoices in a throwaway directory."""
+    
+    def use_throwaway_invoice_root(self):
+        """Point INVOICE_ROOT at a temporary directory for this test."""
+        self.invoice_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.invoice_root, ignore_errors=True)
+        settings_override = override_settings(INVOICE_ROOT=self.invoice_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class FakeStripeMixin:
+    """Send Stripe API calls to a local fake."""
+    
+    def use_fake_stripe(self, latency=0.0, **settings):
+        """Start a FakeStripe for this test and point the Stripe settings at it."""
+        self.stripe = FakeStripe(latency=latency).start()
+        self.addCleanup(self.stripe.stop)
+        settings_override = override_settings(**{
+            'STRIPE_SECRET_KEY': 'sk_test_fake',
+            'STRIPE_PUBLISHABLE_KEY': 'pk_test_fake',
+            'STRIPE_API_BASE': self.stripe.url,
+            'STRIPE_MAX_NETWORK_RETRIES': 0,
+            **settings,
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
 class ViewTests(TestCase):
     """Test cases for views."""
     
@@ -322,8 +392,9 @@ class ViewTests(TestCase):
         response = self.client.get(reverse('restaurant:reservation_list'))
         self.assertEqual(response.status_code, 200)
     
+    @override_settings(CART_ENGINE='database')
     def test_add_to_cart_creates_order(self):
-        """Test that adding to cart creates a pending order."""
+        """Test that adding to a database cart creates a pending order."""
         self.client.login(username='testuser', password='testpass123')
         
         # No orders initially
@@ -344,6 +415,7 @@ class ViewTests(TestCase):
         self.assertEqual(order.order_items.count(), 1)
         self.assertEqual(order.order_items.first().quantity, 2)
     
+    @override_settings(CART_ENGINE='database')
     def test_update_cart_item(self):
         """Test updating cart item quantity."""
         self.client.login(username='testuser', password='testpass123')
@@ -371,6 +443,7 @@ class ViewTests(TestCase):
         expected_total = order_item.price * 3
         self.assertEqual(order.total_amount, expected_total)
     
+    @override_settings(CART_ENGINE='database')
     def test_remove_cart_item(self):
         """Test removing item from cart."""
         self.client.login(username='testuser', password='testpass123')
@@ -517,3 +590,2024 @@ class CustomLogicTest(TestCase):
         self.assertEqual(status_counts['pending'], 1)
         self.assertEqual(status_counts['confirmed'], 1)
         self.assertEqual(status_counts['cancelled'], 1)
+
+
+class MenuSnapshotTest(TestCase):
+    """Test cases for the in-process menu snapshot."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.client = Client()
+        self.burger = MenuItem.objects.create(
+            name='Snapshot Burger',
+            description='Grilled beef patty',
+            price=Decimal('12.00'),
+            category='main'
+        )
+        self.cake = MenuItem.objects.create(
+            name='Snapshot Cake',
+            price=Decimal('6.00'),
+            category='dessert'
+        )
+    
+    def test_snapshot_reused_until_menu_changes(self):
+        """Test that the snapshot is served without queries until a write."""
+        snapshot = get_menu_snapshot()
+        with self.assertNumQueries(0):
+            self.assertIs(get_menu_snapshot(), snapshot)
+            response = self.client.get(reverse('restaurant:menu_list'))
+        self.assertContains(response, 'Snapshot Burger')
+        
+        self.burger.is_available = False
+        self.burger.save()
+        self.assertIsNot(get_menu_snapshot(), snapshot)
+        self.assertNotIn(self.burger.pk, get_menu_snapshot().by_pk)
+    
+    def test_snapshot_invalidated_on_delete(self):
+        """Test that deleting an item drops it from the snapshot."""
+        self.assertIn(self.cake.pk, get_menu_snapshot().by_pk)
+        self.cake.delete()
+        self.assertNotIn(self.cake.pk, get_menu_snapshot().by_pk)
+    
+    def test_snapshot_filter(self):
+        """Test category and search filtering on the snapshot."""
+        snapshot = get_menu_snapshot()
+        self.assertEqual(snapshot.filter(category='dessert'), [self.cake])
+        ids = [self.cake.pk, self.burger.pk]
+        self.assertEqual(snapshot.filter(ids=ids), [self.cake, self.burger])
+        self.assertEqual(snapshot.filter(category='main', ids=ids), [self.burger])
+    
+    def test_version_derived_from_data(self):
+        """Test that recomputing the version gives the same token until the menu changes."""
+        version = get_menu_version()
+        cache.delete(MENU_VERSION_CACHE_KEY)
+        self.assertEqual(get_menu_version(), version)
+        self.assertAlmostEqual(menu_version_time(version), self.cake.updated_at, delta=timedelta(milliseconds=1))
+    
+    def test_unsignalled_change_seen_once_version_expires(self):
+        """Test that a write this process missed is picked up when the cached version expires."""
+        snapshot = get_menu_snapshot()
+        # As another process would: no signals reach this one
+        MenuItem.objects.filter(pk=self.cake.pk).update(is_available=False, updated_at=timezone.now())
+        self.assertIs(get_menu_snapshot(), snapshot)
+        later = clock.time() + settings.MENU_VERSION_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertNotIn(self.cake.pk, get_menu_snapshot().by_pk)
+
+
+class MenuSearchTest(TestCase):
+    """Test cases for full-text menu search."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.pizza = MenuItem.objects.create(
+            name='Margherita Pizza',
+            description='Tomato, mozzarella and basil',
+            price=Decimal('11.00')
+        )
+        self.salad = MenuItem.objects.create(
+            name='Caprese Salad',
+            description='Fresh mozzarella with tomato',
+            price=Decimal('8.00'),
+            category='appetizer'
+        )
+    
+    def test_name_matches_rank_first(self):
+        """Test that name matches outrank description matches."""
+        MenuItem.objects.create(name='Mozzarella Sticks', price=Decimal('6.00'))
+        ids = search_menu_item_ids('mozzarella')
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(MenuItem.objects.get(pk=ids[0]).name, 'Mozzarella Sticks')
+    
+    def test_prefix_and_all_words(self):
+        """Test prefix matching and that every word must match."""
+        self.assertEqual(search_menu_item_ids('marg'), [self.pizza.pk])
+        self.assertEqual(search_menu_item_ids('tomato basil'), [self.pizza.pk])
+        self.assertEqual(search_menu_item_ids('"; DROP'), [])
+    
+    def test_index_follows_writes(self):
+        """Test that the index is updated on save and delete."""
+        self.salad.name = 'Burrata Plate'
+        self.salad.save()
+        self.assertEqual(search_menu_item_ids('caprese'), [])
+        self.assertEqual(search_menu_item_ids('burrata'), [self.salad.pk])
+        self.salad.delete()
+        self.assertEqual(search_menu_item_ids('burrata'), [])
+    
+    def test_menu_list_search(self):
+        """Test the menu list search uses the index."""
+        response = self.client.get(reverse('restaurant:menu_list'), {'search': 'basil'})
+        self.assertContains(response, 'Margherita Pizza')
+        self.assertNotContains(response, 'Caprese Salad')
+
+
+class MenuAutocompleteTest(TestCase):
+    """Test cases for the typo-tolerant autocomplete index."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.tiramisu = MenuItem.objects.create(
+            name='Tiramisu',
+            description='Coffee-soaked ladyfingers with mascarpone',
+            price=Decimal('7.00'),
+            category='dessert'
+        )
+        self.pizza = MenuItem.objects.create(
+            name='Margherita Pizza',
+            description='Tomato and mozzarella',
+            price=Decimal('11.00')
+        )
+    
+    def test_bounded_levenshtein(self):
+        """Test edit distance with an early cut-off."""
+        self.assertEqual(bounded_levenshtein('tiramsu', 'tiramisu', 2), 1)
+        self.assertEqual(bounded_levenshtein('margarita', 'margherita', 2), 2)
+        self.assertIsNone(bounded_levenshtein('pizza', 'tiramisu', 2))
+    
+    def test_prefix_and_typo_matches(self):
+        """Test prefix lookups and typo-tolerant lookups."""
+        index = MenuAutocompleteIndex.build([self.tiramisu, self.pizza])
+        self.assertEqual(index.suggest('tira'), [self.tiramisu.pk])
+        self.assertEqual(index.suggest('tiramsu'), [self.tiramisu.pk])
+        self.assertEqual(index.suggest('margarita'), [self.pizza.pk])
+        self.assertEqual(index.suggest('mascarpone pizza'), [])
+        self.assertEqual(index.suggest(''), [])
+    
+    def test_copy_shares_untouched_structure(self):
+        """Test that a change to a copy copies only what it touches."""
+        index = MenuAutocompleteIndex.build([self.tiramisu, self.pizza])
+        changed = index.copy()
+        self.pizza.name = 'Quattro Formaggi'
+        changed.add(self.pizza)
+        self.assertEqual(index.suggest('margherita'), [self.pizza.pk])
+        self.assertEqual(index.suggest('formaggi'), [])
+        self.assertEqual(changed.suggest('formaggi'), [self.pizza.pk])
+        self.assertIsNot(changed.root, index.root)
+        self.assertIs(changed.root.children['l'], index.root.children['l'])
+        self.assertIs(changed.words['tiramisu'], index.words['tiramisu'])
+        self.assertEqual(changed.suggest('tiramisu'), index.suggest('tiramisu'))
+    
+    def test_incremental_updates(self):
+        """Test that committed writes are applied to the live index without a rebuild."""
+        get_autocomplete_index()
+        self.pizza.name = 'Quattro Formaggi'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pizza.save()
+        with mock.patch.object(MenuAutocompleteIndex, 'build') as build:
+            index = get_autocomplete_index()
+        build.assert_not_called()
+        self.assertEqual(index.suggest('margherita'), [])
+        self.assertEqual(index.suggest('formagi'), [self.pizza.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tiramisu.delete()
+        index = get_autocomplete_index()
+        self.assertEqual(index.suggest('tiramisu'), [])
+        self.assertNotIn('i', index.root.children['t'].children)
+    
+    def test_updates_do_not_change_an_index_in_use(self):
+        """Test that a write swaps in a new index instead of changing the one being read."""
+        index = get_autocomplete_index()
+        self.pizza.name = 'Quattro Formaggi'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pizza.save()
+        self.assertIsNot(get_autocomplete_index(), index)
+        self.assertEqual(index.suggest('margherita'), [self.pizza.pk])
+        self.assertEqual(index.suggest('formaggi'), [])
+    
+    def test_rolled_back_write_is_not_indexed(self):
+        """Test that a write rolled back after save never shows up in suggestions."""
+        get_autocomplete_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.pizza.name = 'Quattro Formaggi'
+                self.pizza.save()
+                raise RuntimeError
+        index = get_autocomplete_index()
+        self.assertEqual(index.suggest('formaggi'), [])
+        self.assertEqual(index.suggest('margherita'), [self.pizza.pk])
+    
+    def test_autocomplete_endpoint(self):
+        """Test the autocomplete endpoint answers from memory."""
+        url = reverse('restaurant:menu_autocomplete')
+        self.client.get(url, {'q': 'warm'})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'q': 'tiramsu'})
+        data = response.json()
+        self.assertEqual([r['name'] for r in data['results']], ['Tiramisu'])
+    
+    def test_menu_list_falls_back_to_fuzzy(self):
+        """Test that a misspelled search still finds the item."""
+        response = self.client.get(reverse('restaurant:menu_list'), {'search': 'tiramsu'})
+        self.assertContains(response, 'closest items')
+        self.assertContains(response, 'Coffee-soaked')
+
+
+class ConditionalGetTest(TestCase):
+    """Test cases for ETag/Last-Modified handling on menu pages."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.menu_item = MenuItem.objects.create(
+            name='Test Item',
+            price=Decimal('10.00')
+        )
+    
+    def test_menu_list_not_modified(self):
+        """Test that an unchanged menu is answered with an empty 304."""
+        url = reverse('restaurant:menu_list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        
+        self.menu_item.price = Decimal('11.00')
+        self.menu_item.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_menu_detail_not_modified(self):
+        """Test conditional GET on the menu detail page."""
+        url = reverse('restaurant:menu_detail', args=[self.menu_item.pk])
+        response = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        
+        missing = reverse('restaurant:menu_detail', args=[self.menu_item.pk + 100])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+    
+    def test_etag_depends_on_visitor(self):
+        """Test that the user's cart and pending messages change validation."""
+        url = reverse('restaurant:menu_list')
+        anonymous_etag = self.client.get(url)['ETag']
+        
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(url)
+        user_etag = response['ETag']
+        self.assertNotEqual(user_etag, anonymous_etag)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('Last-Modified', response)
+        
+        # Adding to cart queues a flash message, so the next page is not validated
+        self.client.post(reverse('restaurant:add_to_cart'), {
+            'menu_item_id': self.menu_item.pk,
+            'quantity': 1
+        })
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=user_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        
+        # The cart badge changed, so the old ETag no longer matches
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=user_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], user_etag)
+    
+    def test_home_not_modified(self):
+        """Test conditional GET on the home page."""
+        response = self.client.get(reverse('home'))
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class MenuCardCacheTest(TestCase):
+    """Test cases for menu card fragment caching."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.menu_item = MenuItem.objects.create(
+            name='Cached Curry',
+            price=Decimal('13.50')
+        )
+    
+    def test_card_refreshes_after_update(self):
+        """Test that a cached card is re-rendered once the item changes."""
+        url = reverse('restaurant:menu_list')
+        self.assertContains(self.client.get(url), '£13.50')
+        self.menu_item.price = Decimal('14.25')
+        self.menu_item.save()
+        response = self.client.get(url)
+        self.assertContains(response, '£14.25')
+        self.assertNotContains(response, '£13.50')
+    
+    def test_cached_cards_hold_no_csrf_token(self):
+        """Test that the per-user CSRF token lives outside the cached cards."""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('restaurant:menu_list'))
+        self.assertContains(response, 'csrfmiddlewaretoken', count=1)
+        self.assertContains(response, 'form="addToCartForm"')
+        
+        # The shared form still adds the clicked item
+        self.client.post(reverse('restaurant:add_to_cart'), {
+            'menu_item_id': self.menu_item.pk,
+            'quantity': 1
+        })
+        self.assertContains(self.client.get(reverse('restaurant:cart')), 'Cached Curry')
+
+
+class ImageDerivativeTest(TestCase):
+    """Test cases for responsive image derivatives."""
+    
+    def setUp(self):
+        """Use a throwaway media directory."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+    
+    def make_upload(self, size=(800, 600), name='dish.png'):
+        """Return an uploaded PNG with transparency."""
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 40, 40, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+    
+    def test_form_upload_generates_derivatives(self):
+        """Test that uploading through MenuItemForm writes every size and format."""
+        form = MenuItemForm(
+            data={'name': 'Pictured Dish', 'price': '9.50', 'category': 'main', 'is_available': True},
+            files={'image': self.make_upload()}
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        menu_item = form.save()
+        menu_item.refresh_from_db()
+        
+        sizes = menu_item.image_derivatives['sizes']
+        self.assertEqual(list(sizes), ['thumb', 'card', 'detail'])
+        self.assertEqual(sizes['detail']['width'], 800)  # never upscaled
+        self.assertEqual(sizes['card']['width'], 480)
+        self.assertEqual(sizes['card']['height'], 360)
+        for fmt in ('webp', 'jpeg'):
+            path = sizes['card'][fmt]
+            self.assertTrue(menu_item.image.storage.exists(path))
+        with menu_item.image.storage.open(sizes['thumb']['jpeg']) as f:
+            self.assertEqual(Image.open(f).size, (200, 150))
+    
+    def test_menu_pages_emit_srcset(self):
+        """Test that menu pages offer the derivatives via srcset."""
+        form = MenuItemForm(
+            data={'name': 'Pictured Dish', 'price': '9.50', 'category': 'main', 'is_available': True},
+            files={'image': self.make_upload(size=(1600, 900))}
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        menu_item = form.save()
+        
+        response = self.client.get(reverse('restaurant:menu_list'))
+        self.assertRegex(response.content.decode(), r'dish-card\.[0-9a-f]{12}\.webp 480w')
+        self.assertNotContains(response, 'dish-detail')
+        response = self.client.get(reverse('restaurant:menu_detail', args=[menu_item.pk]))
+        self.assertRegex(response.content.decode(), r'dish-detail\.[0-9a-f]{12}\.jpg 1200w')
+        self.assertContains(response, 'type="image/webp"')
+    
+    def test_replacing_image_removes_old_derivatives(self):
+        """Test that a new upload replaces the previous derivatives."""
+        menu_item = MenuItem.objects.create(name='Dish', price=Decimal('5.00'))
+        menu_item.image.save('first.png', self.make_upload(), save=True)
+        menu_item.update_image_derivatives()
+        old_path = menu_item.image_derivatives['sizes']['card']['jpeg']
+        
+        menu_item.image.save('second.png', self.make_upload(), save=True)
+        menu_item.update_image_derivatives()
+        self.assertFalse(menu_item.image.storage.exists(old_path))
+        self.assertIn('second-card', menu_item.image_derivatives['sizes']['card']['jpeg'])
+
+
+class ProcessMenuImagesCommandTest(TestCase):
+    """Test cases for the process_menu_images command."""
+    
+    def setUp(self):
+        """Use a throwaway media directory with two source images."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        os.makedirs(os.path.join(self.media_root, 'menu_images'))
+        self.write_image('soup.jpg', (120, 80, 40))
+        self.write_image('salad.png', (40, 160, 60))
+        self.menu_item = MenuItem.objects.create(
+            name='Soup', price=Decimal('5.00'), image='menu_images/soup.jpg'
+        )
+    
+    def write_image(self, filename, color):
+        """Write a solid-colour source image."""
+        path = os.path.join(self.media_root, 'menu_images', filename)
+        Image.new('RGB', (640, 480), color).save(path)
+    
+    def run_command(self, **options):
+        """Run the command in-process and return its output."""
+        out = StringIO()
+        call_command('process_menu_images', workers=1, stdout=out, **options)
+        return out.getvalue()
+    
+    def test_processes_then_skips_unchanged(self):
+        """Test that a second run skips images whose content is unchanged."""
+        output = self.run_command()
+        self.assertIn('2 processed, 0 unchanged, 0 failed', output)
+        self.assertIn('images/sec', output)
+        self.menu_item.refresh_from_db()
+        self.assertEqual(self.menu_item.image_derivatives['source'], 'menu_images/soup.jpg')
+        self.assertIn('card', self.menu_item.image_derivatives['sizes'])
+        
+        output = self.run_command()
+        self.assertIn('0 processed, 2 unchanged', output)
+        
+        self.write_image('salad.png', (10, 10, 200))
+        output = self.run_command()
+        self.assertIn('1 processed, 1 unchanged', output)
+        
+        output = self.run_command(force=True)
+        self.assertIn('2 processed, 0 unchanged', output)
+    
+    def test_missing_derivative_is_regenerated(self):
+        """Test that an unchanged image is reprocessed if a derivative is gone."""
+        self.run_command()
+        self.menu_item.refresh_from_db()
+        os.remove(os.path.join(
+            self.media_root, self.menu_item.image_derivatives['sizes']['thumb']['jpeg']
+        ))
+        output = self.run_command()
+        self.assertIn('1 processed, 1 unchanged', output)
+
+
+class MediaServingTest(TestCase):
+    """Test cases for production media serving."""
+    
+    def setUp(self):
+        """Serve from a throwaway media directory."""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        os.makedirs(os.path.join(self.media_root, 'menu_images', 'derivatives'))
+        self.write_file('menu_images/soup.jpg', b'0123456789')
+        self.write_file('menu_images/derivatives/soup-card.0123456789ab.webp', b'webp-bytes')
+        self.client = Client()
+    
+    def write_file(self, name, content):
+        """Write a file below the media root."""
+        with open(os.path.join(self.media_root, name), 'wb') as f:
+            f.write(content)
+    
+    def test_full_response(self):
+        """Test that a file is served with validators and a short max-age."""
+        response = self.client.get('/media/menu_images/soup.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertIn('max-age=3600', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+    
+    def test_hashed_file_is_immutable(self):
+        """Test that content-hashed derivatives are cached for a year."""
+        response = self.client.get('/media/menu_images/derivatives/soup-card.0123456789ab.webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+    
+    def test_if_none_match_returns_304(self):
+        """Test that a matching ETag is answered without a body."""
+        etag = self.client.get('/media/menu_images/soup.jpg')['ETag']
+        response = self.client.get('/media/menu_images/soup.jpg', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_range_request(self):
+        """Test that a single byte range is answered with 206."""
+        response = self.client.get('/media/menu_images/soup.jpg', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+        
+        response = self.client.get('/media/menu_images/soup.jpg', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+    
+    def test_unsatisfiable_range(self):
+        """Test that a range past the end of the file returns 416."""
+        response = self.client.get('/media/menu_images/soup.jpg', HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+    
+    def test_stale_if_range_sends_whole_file(self):
+        """Test that a range is ignored when If-Range does not match."""
+        response = self.client.get(
+            '/media/menu_images/soup.jpg', HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+    
+    def test_missing_and_traversal_return_404(self):
+        """Test that missing files and paths outside MEDIA_ROOT are not served."""
+        self.assertEqual(self.client.get('/media/menu_images/nope.jpg').status_code, 404)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/menu_images').status_code, 404)
+    
+    @override_settings(MEDIA_X_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_x_accel_redirect(self):
+        """Test that nginx is asked to send the file when configured."""
+        response = self.client.get('/media/menu_images/soup.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/menu_images/soup.jpg')
+        self.assertEqual(response.content, b'')
+
+
+class KeysetPaginationTest(TestCase):
+    """Test cases for cursor pagination of the listings."""
+    
+    def setUp(self):
+        """Create a user with more orders and reservations than fit on a page."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='regular', password='testpass123')
+        self.client.login(username='regular', password='testpass123')
+        base = timezone.now()
+        for i in range(30):
+            order = Order.objects.create(
+                user=self.user, order_number=f'ORD-{i:03d}', status='completed', payment_status='paid'
+            )
+            # Pairs of orders share a timestamp so the pk tie breaker matters
+            Order.objects.filter(pk=order.pk).update(created_at=base - timedelta(hours=i // 2))
+        for i in range(15):
+            Reservation.objects.create(
+                user=self.user, name='Regular', email='r@example.com', phone='123',
+                date=date.today() + timedelta(days=i // 3), time=time(18 + i % 3, 0),
+                number_of_guests=2, status='confirmed' if i % 2 else 'pending'
+            )
+    
+    def walk(self, url, context_name):
+        """Follow next links from url, returning every page's items."""
+        pages = []
+        next_url = url
+        while next_url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(next_url)
+            self.assertEqual(response.status_code, 200)
+            sql = ' '.join(query['sql'].upper() for query in queries.captured_queries)
+            self.assertNotIn('COUNT(', sql)
+            self.assertNotIn('OFFSET', sql)
+            pages.append(list(response.context[context_name]))
+            page = response.context['page']
+            next_url = url.split('?')[0] + page.next_url if page.has_next else None
+        return pages
+    
+    def test_order_pages_cover_every_order_once(self):
+        """Test that following next links visits each order once, newest first."""
+        pages = self.walk(reverse('restaurant:order_list'), 'orders')
+        self.assertEqual([len(page) for page in pages], [12, 12, 6])
+        seen = [order.pk for page in pages for order in page]
+        expected = list(
+            Order.objects.filter(user=self.user).order_by('-created_at', '-pk').values_list('pk', flat=True)
+        )
+        self.assertEqual(seen, expected)
+    
+    def test_previous_link_returns_previous_page(self):
+        """Test that the previous link of page two shows page one again."""
+        url = reverse('restaurant:order_list')
+        first = self.client.get(url)
+        second = self.client.get(url + first.context['page'].next_url)
+        self.assertFalse(first.context['page'].has_previous)
+        self.assertTrue(second.context['page'].has_previous)
+        back = self.client.get(url + second.context['page'].previous_url)
+        self.assertEqual(list(back.context['orders']), list(first.context['orders']))
+        self.assertFalse(back.context['page'].has_previous)
+        self.assertTrue(back.context['page'].has_next)
+    
+    def test_reservation_pages_keep_filter(self):
+        """Test that reservation cursors keep the status filter and the date/time order."""
+        url = reverse('restaurant:reservation_list') + '?status=pending'
+        pages = self.walk(url, 'reservations')
+        reservations = [reservation for page in pages for reservation in page]
+        self.assertEqual(len(reservations), 8)
+        self.assertTrue(all(reservation.status == 'pending' for reservation in reservations))
+        keys = [(reservation.date, reservation.time) for reservation in reservations]
+        self.assertEqual(keys, sorted(keys))
+    
+    def test_menu_pages(self):
+        """Test that the menu is paged from the snapshot in category/name order."""
+        for i in range(30):
+            MenuItem.objects.create(
+                name=f'Dish {i:02d}', price=Decimal('5.00'),
+                category='main' if i % 2 else 'dessert'
+            )
+        url = reverse('restaurant:menu_list')
+        first = self.client.get(url)
+        self.assertEqual(len(first.context['menu_items']), 24)
+        self.assertEqual(first.context['result_count'], 30)
+        second = self.client.get(url + first.context['page'].next_url)
+        self.assertEqual(len(second.context['menu_items']), 6)
+        self.assertFalse(second.context['page'].has_next)
+        names = [item.name for item in first.context['menu_items']] + \
+            [item.name for item in second.context['menu_items']]
+        expected = list(MenuItem.objects.order_by('category', 'name').values_list('name', flat=True))
+        self.assertEqual(names, expected)
+        
+        back = self.client.get(url + second.context['page'].previous_url)
+        self.assertEqual(list(back.context['menu_items']), list(first.context['menu_items']))
+    
+    def test_bad_cursor_shows_first_page(self):
+        """Test that malformed or mistyped cursors fall back to the first page."""
+        url = reverse('restaurant:order_list')
+        first = list(self.client.get(url).context['orders'])
+        for cursor in ('not-a-cursor', encode_cursor('n', ['yesterday', 'x'])):
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context['orders']), first)
+        response = self.client.get(reverse('restaurant:menu_list'), {'cursor': encode_cursor('n', [1, 2])})
+        self.assertEqual(response.status_code, 200)
+    
+    def test_cursor_round_trip(self):
+        """Test that cursors encode and decode their direction and key."""
+        self.assertEqual(decode_cursor(encode_cursor('p', ['main', 'Soup', 3])), ('p', ['main', 'Soup', 3]))
+        self.assertIsNone(decode_cursor('e30'))
+
+
+class MenuApiTest(TestCase):
+    """Test cases for the JSON menu API."""
+    
+    def setUp(self):
+        """Set up a small menu."""
+        self.client = Client()
+        self.url = reverse('restaurant:menu_api')
+        self.soup = MenuItem.objects.create(
+            name='Soup', description='Hot', price=Decimal('5.00'), category='appetizer'
+        )
+        self.cake = MenuItem.objects.create(
+            name='Cake', description='Sweet', price=Decimal('6.50'), category='dessert'
+        )
+        MenuItem.objects.create(name='Hidden', price=Decimal('1.00'), is_available=False)
+    
+    def test_menu_grouped_by_category(self):
+        """Test that available items are returned grouped in CATEGORY_CHOICES order."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = json.loads(response.content)
+        self.assertEqual(data['api_version'], 1)
+        self.assertEqual([category['key'] for category in data['categories']], ['appetizer', 'dessert'])
+        soup = data['categories'][0]['items'][0]
+        self.assertEqual(soup['name'], 'Soup')
+        self.assertEqual(soup['price'], '5.00')
+        self.assertIsNone(soup['image'])
+        self.assertNotIn(b'Hidden', response.content)
+    
+    def test_sparse_fieldset(self):
+        """Test that ?fields limits each item to the requested fields plus id."""
+        response = self.client.get(self.url, {'fields': 'price,name'})
+        data = json.loads(response.content)
+        self.assertEqual(data['fields'], ['id', 'name', 'price'])
+        self.assertEqual(data['categories'][1]['items'], [{'id': self.cake.pk, 'name': 'Cake', 'price': '6.50'}])
+        
+        response = self.client.get(self.url, {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['error'])
+    
+    def test_gzip_variant(self):
+        """Test that gzip clients get the pre-compressed body."""
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+    
+    @skipUnless(brotli, 'brotli is not installed')
+    def test_brotli_variant(self):
+        """Test that brotli is preferred when the client accepts it."""
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+    
+    def test_served_without_queries(self):
+        """Test that a warm body is served from memory and revalidates with 304."""
+        response = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            again = self.client.get(self.url)
+        self.assertEqual(again.content, response.content)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+    
+    def test_menu_change_rebuilds_body(self):
+        """Test that a menu write is reflected in the next response."""
+        etag = self.client.get(self.url)['ETag']
+        self.soup.price = Decimal('5.50')
+        self.soup.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'"5.50"', response.content)
+
+
+class MenuDeltaSyncTest(TestCase):
+    """Test cases for the menu delta-sync endpoint."""
+    
+    def setUp(self):
+        """Set up a menu last changed an hour ago."""
+        self.client = Client()
+        self.url = reverse('restaurant:menu_api_changes')
+        self.soup = MenuItem.objects.create(name='Soup', price=Decimal('5.00'), category='appetizer')
+        self.cake = MenuItem.objects.create(name='Cake', price=Decimal('6.50'), category='dessert')
+        self.tea = MenuItem.objects.create(name='Tea', price=Decimal('2.00'), category='drink')
+        MenuItem.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+    
+    def poll(self, since, **params):
+        """Return the decoded delta payload for since."""
+        response = self.client.get(self.url, {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_only_changes_are_returned(self):
+        """Test that upserts, deletes and newly unavailable items are reported."""
+        token = self.poll(timezone.now().isoformat())['sync_token']
+        self.assertEqual(self.poll(token)['upserted'], [])
+        
+        self.soup.price = Decimal('5.50')
+        self.soup.save()
+        bread = MenuItem.objects.create(name='Bread', price=Decimal('3.00'), category='appetizer')
+        self.cake.is_available = False
+        self.cake.save()
+        tea_pk = self.tea.pk
+        self.tea.delete()
+        
+        data = self.poll(token)
+        self.assertFalse(data['reset'])
+        self.assertEqual(sorted(item['id'] for item in data['upserted']), sorted([self.soup.pk, bread.pk]))
+        self.assertEqual(data['deleted'], sorted([self.cake.pk, tea_pk]))
+        soup = next(item for item in data['upserted'] if item['id'] == self.soup.pk)
+        self.assertEqual(soup['price'], '5.50')
+    
+    def test_since_menu_version_and_fields(self):
+        """Test that a menu version is accepted as since, with a sparse fieldset."""
+        version = self.client.get(reverse('restaurant:menu_api')).json()['menu_version']
+        self.soup.name = 'Tomato Soup'
+        self.soup.save()
+        data = self.poll(version, fields='name')
+        self.assertEqual(data['upserted'], [{'id': self.soup.pk, 'name': 'Tomato Soup'}])
+    
+    def test_queryset_delete_writes_tombstones(self):
+        """Test that bulk deletes (as in the admin) leave tombstones."""
+        MenuItem.objects.filter(pk__in=[self.soup.pk, self.cake.pk]).delete()
+        self.assertEqual(
+            sorted(MenuItemTombstone.objects.values_list('menu_item_id', flat=True)),
+            sorted([self.soup.pk, self.cake.pk])
+        )
+    
+    def test_old_since_requests_reset(self):
+        """Test that clients older than the tombstone retention must resync in full."""
+        data = self.poll((timezone.now() - timedelta(days=90)).isoformat())
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['upserted'], [])
+    
+    def test_invalid_since(self):
+        """Test that a missing or unreadable since is rejected."""
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+    
+    def test_changes_use_updated_at_index(self):
+        """Test that the changed-items query is an index range scan."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN output is SQLite specific')
+        queryset = MenuItem.objects.filter(updated_at__gte=timezone.now()).order_by('updated_at', 'pk')
+        self.assertIn('menuitem_updated_at_idx', queryset.explain())
+
+
+class QueryIndexTest(TestCase):
+    """Test cases proving the hot queries use their indexes (SQLite and PostgreSQL)."""
+    
+    def setUp(self):
+        """Set up a user and make the planner avoid sequential scans on PostgreSQL."""
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('EXPLAIN checks are written for SQLite and PostgreSQL')
+        if connection.vendor == 'postgresql':
+            # Test tables are tiny, so a sequential scan would otherwise win
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        self.user = User.objects.create_user(username='indexed', password='testpass123')
+    
+    def assertUsesIndex(self, queryset, index_name):
+        """Assert that the query plan of queryset reads index_name."""
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f'{index_name} not used:\n{plan}')
+    
+    def test_available_menu_uses_partial_index(self):
+        """Test that the menu snapshot and category filter use the partial index."""
+        self.assertUsesIndex(MenuItem.objects.filter(is_available=True), 'menuitem_available_idx')
+        self.assertUsesIndex(
+            MenuItem.objects.filter(is_available=True, category='main'), 'menuitem_available_idx'
+        )
+    
+    def test_cart_lookup_uses_cart_index(self):
+        """Test that the pending-order (cart) lookup uses the partial cart index."""
+        queryset = Order.objects.filter(
+            user=self.user, status='pending', payment_status='pending'
+        ).order_by()
+        self.assertUsesIndex(queryset, 'order_one_cart_per_user')
+    
+    def test_order_history_uses_user_created_index(self):
+        """Test that a page of order history is read from the (user, created_at) index."""
+        queryset = Order.objects.filter(user=self.user).exclude(
+            status='pending', payment_status='pending'
+        ).order_by('-created_at', '-pk')[:13]
+        self.assertUsesIndex(queryset, 'order_user_created_idx')
+    
+    def test_reservations_use_user_date_index(self):
+        """Test that a page of reservations is read from the (user, date, time) index."""
+        queryset = Reservation.objects.filter(user=self.user).order_by('date', 'time', 'pk')[:13]
+        self.assertUsesIndex(queryset, 'reservation_user_date_idx')
+
+
+class IncrementalOrderTotalTest(TestCase):
+    """Test cases for order totals maintained by OrderItem writes."""
+    
+    def setUp(self):
+        """Set up an empty order and a few dishes."""
+        self.user = User.objects.create_user(username='totals', password='testpass123')
+        self.order = Order.objects.create(user=self.user, order_number='TOTAL-1')
+        self.dishes = [
+            MenuItem.objects.create(name=f'Dish {i}', price=Decimal('2.50') + i) for i in range(25)
+        ]
+    
+    def stored_total(self):
+        """Return the total as stored in the database."""
+        return Order.objects.get(pk=self.order.pk).total_amount
+    
+    def test_save_and_delete_apply_deltas(self):
+        """Test that creating, changing and deleting items moves the stored total."""
+        soup = OrderItem.objects.create(order=self.order, menu_item=self.dishes[0], quantity=2)
+        OrderItem.objects.create(order=self.order, menu_item=self.dishes[1], quantity=1)
+        self.assertEqual(self.stored_total(), Decimal('8.50'))
+        self.assertEqual(self.order.total_amount, Decimal('8.50'))
+        
+        soup = OrderItem.objects.get(pk=soup.pk)
+        soup.quantity = 4
+        soup.save()
+        self.assertEqual(self.stored_total(), Decimal('13.50'))
+        
+        soup.delete()
+        self.assertEqual(self.stored_total(), Decimal('3.50'))
+        
+        OrderItem.objects.filter(order=self.order).delete()
+        self.assertEqual(self.stored_total(), Decimal('0.00'))
+    
+    def test_add_cost_does_not_grow_with_cart(self):
+        """Test that adding an item runs the same queries for small and large carts."""
+        def add(dish):
+            with CaptureQueriesContext(connection) as queries:
+                OrderItem.objects.create(order=self.order, menu_item=dish, quantity=1)
+            return len(queries)
+        
+        first = add(self.dishes[0])
+        for dish in self.dishes[1:-1]:
+            OrderItem.objects.create(order=self.order, menu_item=dish, quantity=1)
+        self.assertEqual(add(self.dishes[-1]), first)
+        self.assertEqual(self.stored_total(), sum(dish.price for dish in self.dishes))
+    
+    def test_calculate_total_reconciles(self):
+        """Test that calculate_total repairs a drifted total with a database Sum."""
+        OrderItem.objects.create(order=self.order, menu_item=self.dishes[0], quantity=3)
+        Order.objects.filter(pk=self.order.pk).update(total_amount=Decimal('99.00'))
+        with self.assertNumQueries(2):
+            total = self.order.calculate_total()
+        self.assertEqual(total, Decimal('7.50'))
+        self.assertEqual(self.stored_total(), Decimal('7.50'))
+    
+    @override_settings(CART_ENGINE='database')
+    def test_cart_views_keep_total(self):
+        """Test that the cart views leave a correct total without recalculating."""
+        client = Client()
+        client.login(username='totals', password='testpass123')
+        self.order.delete()
+        client.post(reverse('restaurant:add_to_cart'), {'menu_item_id': self.dishes[0].pk, 'quantity': 2})
+        client.post(reverse('restaurant:add_to_cart'), {'menu_item_id': self.dishes[0].pk, 'quantity': 1})
+        cart = Order.objects.get(user=self.user, status='pending')
+        self.assertEqual(cart.total_amount, Decimal('7.50'))
+        
+        item = cart.order_items.get()
+        client.post(reverse('restaurant:update_cart_item', args=[item.pk]), {'quantity': 1})
+        self.assertEqual(Order.objects.get(pk=cart.pk).total_amount, Decimal('2.50'))
+        client.post(reverse('restaurant:remove_cart_item', args=[item.pk]))
+        self.assertEqual(Order.objects.get(pk=cart.pk).total_amount, Decimal('0.00'))
+
+
+@override_settings(CART_ENGINE='database')
+class ReadOnlyCartViewTest(TestCase):
+    """Test cases for the read-only cart page."""
+    
+    def setUp(self):
+        """Set up a user with a two-line cart."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='viewer', password='testpass123')
+        self.client.login(username='viewer', password='testpass123')
+        cart = Order.objects.create(user=self.user, order_number='CART-VIEW')
+        for i in range(2):
+            dish = MenuItem.objects.create(name=f'Dish {i}', price=Decimal('4.00'))
+            OrderItem.objects.create(order=cart, menu_item=dish, quantity=i + 1)
+    
+    def test_cart_get_does_not_write(self):
+        """Test that viewing the cart issues no INSERT/UPDATE/DELETE."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('restaurant:cart'))
+        self.assertEqual(response.status_code, 200)
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(response.context['cart_total'], Decimal('12.00'))
+        self.assertContains(response, '£12.00')
+
+
+@override_settings(CART_ENGINE='session')
+class SessionCartTest(TestCase):
+    """Test cases for the session-backed cart engine."""
+    
+    def setUp(self):
+        """Set up a logged-in user and two dishes."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='browser', password='testpass123')
+        self.client.login(username='browser', password='testpass123')
+        self.soup = MenuItem.objects.create(name='Soup', price=Decimal('5.00'))
+        self.cake = MenuItem.objects.create(name='Cake', price=Decimal('6.50'), category='dessert')
+    
+    def add(self, menu_item, quantity=1):
+        """Add a dish through the view."""
+        return self.client.post(reverse('restaurant:add_to_cart'), {
+            'menu_item_id': menu_item.pk, 'quantity': quantity
+        })
+    
+    def test_browsing_writes_no_orders(self):
+        """Test that adding, viewing and editing the cart creates no Order rows."""
+        self.add(self.soup, 2)
+        self.add(self.soup, 1)
+        self.add(self.cake)
+        self.assertEqual(self.client.session[SESSION_CART_KEY], {str(self.soup.pk): 3, str(self.cake.pk): 1})
+        
+        response = self.client.get(reverse('restaurant:cart'))
+        self.assertEqual(response.context['cart_total'], Decimal('21.50'))
+        self.assertEqual(response.context['cart_count'], 2)
+        self.assertContains(response, reverse('restaurant:update_cart_item', args=[self.soup.pk]))
+        
+        self.client.post(reverse('restaurant:update_cart_item', args=[self.soup.pk]), {'quantity': 1})
+        self.client.post(reverse('restaurant:remove_cart_item', args=[self.cake.pk]))
+        self.assertEqual(self.client.session[SESSION_CART_KEY], {str(self.soup.pk): 1})
+        self.assertFalse(Order.objects.exists())
+        
+        response = self.client.post(reverse('restaurant:remove_cart_item', args=[self.cake.pk]))
+        self.assertEqual(response.status_code, 404)
+    
+    def test_unavailable_dish_is_dropped(self):
+        """Test that a dish taken off the menu disappears from the cart."""
+        self.add(self.soup)
+        self.add(self.cake)
+        self.cake.is_available = False
+        self.cake.save()
+        response = self.client.get(reverse('restaurant:cart'))
+        self.assertEqual([line.menu_item.name for line in response.context['order_items']], ['Soup'])
+    
+    def test_checkout_materializes_order_in_bulk(self):
+        """Test that checkout writes the cart to one pending order with a bulk insert."""
+        self.add(self.soup, 2)
+        self.add(self.cake)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('restaurant:checkout'))
+        item_inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT INTO "restaurant_orderitem"')
+        ]
+        self.assertEqual(len(item_inserts), 1)
+        
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.status, 'pending')
+        self.assertEqual(order.total_amount, Decimal('16.50'))
+        self.assertEqual(
+            sorted((item.menu_item.name, item.quantity) for item in order.order_items.all()),
+            [('Cake', 1), ('Soup', 2)]
+        )
+        
+        # Changing the cart and revisiting checkout rewrites the same order,
+        # without a total update per deleted line
+        self.add(self.cake)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('restaurant:checkout'))
+        order_updates = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "restaurant_order"')
+        ]
+        self.assertEqual(len(order_updates), 1)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.total_amount, Decimal('23.00'))
+        self.assertEqual(order.order_items.count(), 2)
+    
+    def test_database_cart_carried_into_session(self):
+        """Test that a pending order left by the database engine becomes the session cart."""
+        order = Order.objects.create(user=self.user, order_number='DB-CART')
+        OrderItem.objects.create(order=order, menu_item=self.soup, quantity=2, price=self.soup.price)
+        response = self.client.get(reverse('restaurant:cart'))
+        self.assertEqual(response.context['cart_count'], 1)
+        self.assertEqual(self.client.session[SESSION_CART_KEY], {str(self.soup.pk): 2})
+        
+        self.client.get(reverse('restaurant:checkout'))
+        order.refresh_from_db()
+        self.assertEqual([(item.menu_item, item.quantity) for item in order.order_items.all()], [(self.soup, 2)])
+
+
+class CartUpsertTest(TestCase):
+    """Test cases for the cart constraints and the atomic line upsert."""
+    
+    def setUp(self):
+        """Set up a user, a cart and a dish."""
+        self.user = User.objects.create_user(username='upserter', password='testpass123')
+        self.order = Order.objects.create(user=self.user, order_number='CART-UPSERT')
+        self.menu_item = MenuItem.objects.create(name='Dumplings', price=Decimal('4.50'))
+    
+    def test_upsert_adds_to_existing_line(self):
+        """Test that adding a dish twice raises one line's quantity and the total."""
+        upsert_line(self.order.pk, self.menu_item, 2)
+        upsert_line(self.order.pk, self.menu_item, 3)
+        line = OrderItem.objects.get(order=self.order)
+        self.assertEqual(line.quantity, 5)
+        self.assertEqual(line.subtotal, Decimal('22.50'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('22.50'))
+    
+    def test_upsert_keeps_price_at_time_of_order(self):
+        """Test that a price change doesn't reprice quantity already in the cart."""
+        upsert_line(self.order.pk, self.menu_item, 1)
+        self.menu_item.price = Decimal('5.00')
+        upsert_line(self.order.pk, self.menu_item, 1)
+        line = OrderItem.objects.get(order=self.order)
+        self.assertEqual(line.price, Decimal('4.50'))
+        self.assertEqual(line.subtotal, Decimal('9.00'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_amount, Decimal('9.00'))
+    
+    def test_one_pending_cart_per_user(self):
+        """Test that the database rejects a second pending cart but allows other orders."""
+        Order.objects.create(user=self.user, order_number='PAID-1', payment_status='paid', status='completed')
+        with self.assertRaises(IntegrityError):
+            Order.objects.create(user=self.user, order_number='CART-TWO')
+    
+    def test_one_line_per_dish(self):
+        """Test that the database rejects a duplicate line for the same dish."""
+        OrderItem.objects.create(order=self.order, menu_item=self.menu_item, quantity=1)
+        with self.assertRaises(IntegrityError):
+            OrderItem.objects.create(order=self.order, menu_item=self.menu_item, quantity=1)
+
+
+class ConcurrentCartTest(TransactionTestCase):
+    """Test cases for database carts under concurrent add-to-cart requests."""
+    
+    def test_concurrent_adds(self):
+        """Test that threads adding to one cart create one cart and one line and lose nothing."""
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Shared-cache in-memory SQLite fails on table locks instead of
+            # waiting; run manage.py stress_cart against the dev database.
+            self.skipTest('needs a file or server database')
+        out = StringIO()
+        call_command('stress_cart', threads=6, adds=10, stdout=out)
+        self.assertIn('no lost updates', out.getvalue())
+
+
+class BatchCartUpdateTest(TestCase):
+    """Test cases for the batch cart update endpoint."""
+    
+    def setUp(self):
+        """Set up a logged-in user and three dishes."""
+        self.client = Client()
+        self.user = User.objects.create_user(username='batcher', password='testpass123')
+        self.client.login(username='batcher', password='testpass123')
+        self.soup = MenuItem.objects.create(name='Soup', price=Decimal('5.00'))
+        self.cake = MenuItem.objects.create(name='Cake', price=Decimal('6.50'), category='dessert')
+        self.tea = MenuItem.objects.create(name='Tea', price=Decimal('2.00'), category='beverage')
+        self.url = reverse('restaurant:update_cart')
+    
+    def post(self, changes):
+        """Post a batch of changes as JSON."""
+        return self.client.post(self.url, json.dumps(changes), content_type='application/json')
+    
+    @override_settings(CART_ENGINE='session')
+    def test_session_cart_batch(self):
+        """Test that a batch updates and removes session cart lines and returns the cart."""
+        for item in (self.soup, self.cake, self.tea):
+            self.client.post(reverse('restaurant:add_to_cart'), {'menu_item_id': item.pk, 'quantity': 1})
+        
+        response = self.post([
+            {'item_id': self.soup.pk, 'quantity': 3},
+            {'item_id': self.cake.pk, 'quantity': 0},
+        ])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total'], '17.00')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(
+            {item['name']: (item['quantity'], item['subtotal']) for item in data['items']},
+            {'Soup': (3, '15.00'), 'Tea': (1, '2.00')}
+        )
+        self.assertEqual(self.client.session[SESSION_CART_KEY], {str(self.soup.pk): 3, str(self.tea.pk): 1})
+    
+    @override_settings(CART_ENGINE='database')
+    def test_database_cart_batch_is_bulk(self):
+        """Test that a database cart batch costs the same queries however many lines it removes."""
+        extras = [MenuItem.objects.create(name=f'Side {i}', price=Decimal('1.00')) for i in range(3)]
+        order = Order.objects.create(user=self.user, order_number='CART-BATCH')
+        lines = [
+            OrderItem.objects.create(order=order, menu_item=item, quantity=1)
+            for item in (self.soup, self.cake, self.tea, *extras)
+        ]
+        
+        # Session and user; savepoint, the locked lines, bulk update, collect
+        # and delete the removed lines, the total (sum and update), release;
+        # then the lines of the response
+        with self.assertNumQueries(11):
+            response = self.post([
+                {'item_id': lines[0].pk, 'quantity': 2},
+                {'item_id': lines[1].pk, 'quantity': 4},
+                *[{'item_id': line.pk, 'quantity': 0} for line in lines[2:]],
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], '36.00')
+        
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('36.00'))
+        self.assertEqual(
+            sorted(order.order_items.values_list('menu_item__name', 'quantity', 'subtotal')),
+            [('Cake', 4, Decimal('26.00')), ('Soup', 2, Decimal('10.00'))]
+        )
+        
+        # Removing a single line costs the same
+        with self.assertNumQueries(11):
+            response = self.post([
+                {'item_id': lines[0].pk, 'quantity': 1},
+                {'item_id': lines[1].pk, 'quantity': 0},
+            ])
+        self.assertEqual(response.json()['total'], '5.00')
+    
+    @override_settings(CART_ENGINE='database')
+    def test_database_cart_batch_invalidates_count(self):
+        """Test that removing lines in a batch still refreshes the cached cart count."""
+        order = Order.objects.create(user=self.user, order_number='CART-BATCH')
+        lines = [
+            OrderItem.objects.create(order=order, menu_item=item, quantity=1)
+            for item in (self.soup, self.cake)
+        ]
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.assertEqual(get_cart_count(request), 2)
+        self.post([{'item_id': lines[1].pk, 'quantity': 0}])
+        self.assertEqual(get_cart_count(request), 1)
+    
+    @override_settings(CART_ENGINE='database')
+    def test_unknown_line_changes_nothing(self):
+        """Test that a batch naming a line outside the cart is rejected as a whole."""
+        order = Order.objects.create(user=self.user, order_number='CART-BATCH')
+        line = OrderItem.objects.create(order=order, menu_item=self.soup, quantity=1)
+        paid = Order.objects.create(user=self.user, order_number='PAID-1', status='completed', payment_status='paid')
+        paid_line = OrderItem.objects.create(order=paid, menu_item=self.soup, quantity=1)
+        
+        response = self.post([
+            {'item_id': line.pk, 'quantity': 5},
+            {'item_id': paid_line.pk, 'quantity': 5},
+        ])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['missing'], [paid_line.pk])
+        line.refresh_from_db()
+        self.assertEqual(line.quantity, 1)
+    
+    def test_invalid_batches(self):
+        """Test that malformed bodies and out-of-range quantities are rejected."""
+        self.assertEqual(self.client.post(self.url, 'not json', content_type='application/json').status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post({'item_id': 1, 'quantity': 1}).status_code, 400)
+        response = self.post([{'item_id': self.soup.pk, 'quantity': 11}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.json()['error'])
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+@override_settings(CART_ENGINE='database')
+class CartCountTest(TestCase):
+    """Test cases for the cached, lazily evaluated navbar cart count."""
+    
+    def setUp(self):
+        """Set up a user with a two-line database cart."""
+        cache.clear()
+        self.user = User.objects.create_user(username='counter', password='testpass123')
+        self.soup = MenuItem.objects.create(name='Soup', price=Decimal('5.00'))
+        self.cake = MenuItem.objects.create(name='Cake', price=Decimal('6.50'))
+        self.order = Order.objects.create(user=self.user, order_number='CART-COUNT')
+        OrderItem.objects.create(order=self.order, menu_item=self.soup, quantity=1)
+        OrderItem.objects.create(order=self.order, menu_item=self.cake, quantity=2)
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+    
+    def test_count_is_cached(self):
+        """Test that the count is queried once and then served from the cache."""
+        with self.assertNumQueries(1):
+            self.assertEqual(get_cart_count(self.request), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart_count(self.request), 2)
+    
+    def test_context_processor_is_lazy(self):
+        """Test that the count costs nothing until a template uses it."""
+        with self.assertNumQueries(0):
+            context = cart_count(self.request)
+        with self.assertNumQueries(1):
+            self.assertEqual(int(context['cart_count']), 2)
+    
+    def test_mutations_keep_count_in_sync(self):
+        """Test that adding, removing and paying update the cached count."""
+        cart = DatabaseCart(self.request)
+        self.assertEqual(get_cart_count(self.request), 2)
+        cart.add(MenuItem.objects.create(name='Tea', price=Decimal('2.00')), 1)
+        self.assertEqual(get_cart_count(self.request), 3)
+        cart.remove(OrderItem.objects.get(menu_item=self.soup).pk)
+        self.assertEqual(get_cart_count(self.request), 2)
+        self.order.payment_status = 'paid'
+        self.order.save()
+        self.assertEqual(get_cart_count(self.request), 0)
+    
+    def test_count_read_before_commit_is_dropped(self):
+        """Test that a count cached while a write is uncommitted is forgotten at commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                OrderItem.objects.create(
+                    order=self.order, menu_item=MenuItem.objects.create(name='Tea', price=Decimal('2.00'))
+                )
+                # A concurrent request recounting before the commit
+                cache.set(cart_count_key(self.user.pk), 2)
+        self.assertEqual(get_cart_count(self.request), 3)
+    
+    def test_pages_do_not_count_twice(self):
+        """Test that a page with the navbar reads the cached count without a query."""
+        self.client.login(username='counter', password='testpass123')
+        get_cart_count(self.request)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('restaurant:reservation_list'))
+        self.assertContains(response, 'with 2 items')
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT(' in q['sql']])
+
+
+class QueryBudgetTest(InvoiceRootMixin, TestCase):
+    """Test cases keeping order pages and admin screens at a constant number of queries."""
+    
+    def setUp(self):
+        """Set up a staff user, a customer and a dish per line."""
+        cache.clear()
+        self.use_throwaway_invoice_root()
+        self.user = User.objects.create_user(username='budget', password='testpass123')
+        self.staff = User.objects.create_superuser(username='boss', password='testpass123', email='boss@example.com')
+        self.dishes = [
+            MenuItem.objects.create(name=f'Dish {i}', price=Decimal('3.00'), description='Long text ' * 50)
+            for i in range(6)
+        ]
+    
+    def make_order(self, lines, status='completed', payment_status='paid', user=None):
+        """Create an order for the customer with the given number of lines."""
+        order = Order.objects.create(
+            user=user or self.user, order_number=f'BUDGET-{Order.objects.count()}',
+            status=status, payment_status=payment_status
+        )
+        for dish in self.dishes[:lines]:
+            OrderItem.objects.create(order=order, menu_item=dish, quantity=2)
+        return order
+    
+    def assertConstantQueries(self, budget, url_for_order, **order_options):
+        """
+        Assert that the page of a one line order and of a six line one each
+        take exactly budget queries (after a warm-up request fills caches).
+        """
+        orders = {lines: self.make_order(lines, **order_options) for lines in (1, 6)}
+        for lines, order in orders.items():
+            self.client.get(url_for_order(order))
+            with self.subTest(lines=lines), self.assertNumQueries(budget):
+                response = self.client.get(url_for_order(order))
+            self.assertEqual(response.status_code, 200)
+    
+    def test_order_detail(self):
+        """Test that order detail reads the order and its lines in a fixed number of queries."""
+        self.client.login(username='budget', password='testpass123')
+        # Session, user, order, lines with their dishes
+        self.assertConstantQueries(4, lambda order: reverse('restaurant:order_detail', args=[order.pk]))
+    
+    def test_order_invoice(self):
+        """Test that the invoice joins the customer and dishes instead of a query per line."""
+        self.client.login(username='budget', password='testpass123')
+        # Session, user, order with its customer; the rendered PDF is stored
+        self.assertConstantQueries(3, lambda order: reverse('restaurant:order_invoice', args=[order.pk]))
+    
+    @override_settings(CART_ENGINE='database')
+    def test_database_cart(self):
+        """Test that the cart page is constant in the number of lines."""
+        self.client.login(username='budget', password='testpass123')
+        url = reverse('restaurant:cart')
+        for lines in (1, 6):
+            Order.objects.filter(user=self.user).delete()
+            self.make_order(lines, status='pending', payment_status='pending')
+            self.client.get(url)
+            # Session, user, lines with their dishes; the count is cached
+            with self.subTest(lines=lines), self.assertNumQueries(3):
+                self.assertEqual(self.client.get(url).status_code, 200)
+    
+    def test_admin_order_change(self):
+        """Test that the order admin's item inline doesn't query per row."""
+        self.client.login(username='boss', password='testpass123')
+        # Session, user, order, its customer, customer choices, menu item
+        # choices (count and rows, once for all rows), lines with dish and order
+        self.assertConstantQueries(8, lambda order: reverse('admin:restaurant_order_change', args=[order.pk]))
+    
+    def test_admin_changelists(self):
+        """Test that the order and reservation lists join the user instead of a query per row."""
+        self.client.login(username='boss', password='testpass123')
+        customers = [User.objects.create_user(username=f'guest{i}') for i in range(5)]
+        for i, customer in enumerate(customers):
+            self.make_order(1, user=customer)
+            Reservation.objects.create(
+                user=customer, name=customer.username, email='guest@example.com', phone='1234567890',
+                date=date.today() + timedelta(days=i + 1), time=time(19, 0), number_of_guests=2
+            )
+        for name in ('admin:restaurant_order_changelist', 'admin:restaurant_reservation_changelist'):
+            self.client.get(reverse(name))
+            # Session, user, filtered count, total count, rows joined with users
+            with self.subTest(name), self.assertNumQueries(5):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+
+class RouteBudgetTest(FakeStripeMixin, InvoiceRootMixin, TestCase):
+    """
+    Performance regression tests: every named route in restaurant.urls is
+    requested against scaled data and must stay within its query-count and
+    wall-clock budget. A JSON report of the measurements is written to
+    $PERF_REPORT (default: restaurant-perf-report.json in the temp directory).
+    """
+    
+    MENU_ITEMS = 300
+    ORDERS = 40
+    LINES_PER_ORDER = 4
+    RESERVATIONS = 40
+    RUNS = 3
+    
+    # Route name: (max queries, max milliseconds). Query counts are exact
+    # today; raise one only with a reason. Times are the best of RUNS and
+    # leave room for slow CI machines.
+    BUDGETS = {
+        'menu_list': (2, 500),
+        'menu_autocomplete': (0, 250),
+        'menu_detail': (2, 250),
+        'menu_item_create': (2, 250),
+        'menu_item_update': (3, 250),
+        'menu_item_delete': (3, 250),
+        'menu_api': (0, 250),
+        'menu_api_changes': (2, 500),
+        'cart': (2, 250),
+        'add_to_cart': (5, 250),
+        'update_cart': (5, 250),
+        'update_cart_item': (5, 250),
+        'remove_cart_item': (5, 250),
+        'checkout': (15, 500),
+        'payment_success': (4, 250),
+        'payment_cancel': (2, 250),
+        'order_list': (3, 250),
+        'order_detail': (4, 250),
+        'order_invoice': (3, 250),
+        'order_export': (3, 500),
+        'reservation_list': (3, 250),
+        'reservation_create': (2, 250),
+        'reservation_detail': (3, 250),
+        'reservation_update': (3, 250),
+        'reservation_delete': (3, 250),
+    }
+    
+    @classmethod
+    def setUpTestData(cls):
+        """Seed a full menu, a customer with an order history and reservations, and a staff user."""
+        cls.staff = User.objects.create_user(username='perf-staff', password='testpass123', is_staff=True)
+        cls.customer = User.objects.create_user(username='perf-customer', password='testpass123')
+        categories = [value for value, label in MenuItem.CATEGORY_CHOICES]
+        MenuItem.objects.bulk_create([
+            MenuItem(
+                name=f'Dish {i:03d}', description='Slow-cooked and seasonal. ' * 20,
+                price=Decimal('7.50'), category=categories[i % len(categories)]
+            )
+            for i in range(cls.MENU_ITEMS)
+        ])
+        cls.dishes = list(MenuItem.objects.order_by('pk'))
+        orders = Order.objects.bulk_create([
+            Order(
+                user=cls.customer, order_number=f'PERF-{i:04d}', status='completed',
+                payment_status='paid', total_amount=Decimal('7.50') * cls.LINES_PER_ORDER
+            )
+            for i in range(cls.ORDERS)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menu_item=dish, quantity=1, price=dish.price, subtotal=dish.price)
+            for order in orders
+            for dish in cls.dishes[:cls.LINES_PER_ORDER]
+        ])
+        cls.order = orders[0]
+        Reservation.objects.bulk_create([
+            Reservation(
+                user=cls.customer, name='Perf Customer', email='perf@example.com',
+                phone='1234567890', date=date.today() + timedelta(days=i + 1),
+                time=time(19, 0), number_of_guests=2
+            )
+            for i in range(cls.RESERVATIONS)
+        ])
+        cls.reservation = Reservation.objects.filter(user=cls.customer).first()
+    
+    def setUp(self):
+        """Start from empty caches, with Stripe calls going to a local fake."""
+        cache.clear()
+        self.use_throwaway_invoice_root()
+        self.use_fake_stripe()
+        self.dish = self.dishes[0]
+    
+    def fill_cart(self):
+        """Put a few dishes in the customer's cart."""
+        for dish in self.dishes[:self.LINES_PER_ORDER]:
+            self.client.post(reverse('restaurant:add_to_cart'), {'menu_item_id': dish.pk, 'quantity': 1})
+    
+    def prepare(self, name):
+        """
+        Log in the route's user, set up the state the request needs and return
+        (method, path, data, extra client kwargs) for the request to measure.
+        """
+        staff_routes = {'menu_item_create', 'menu_item_update', 'menu_item_delete', 'order_export'}
+        self.client.force_login(self.staff if name in staff_routes else self.customer)
+        dish, order, reservation = self.dish.pk, self.order.pk, self.reservation.pk
+        if name in ('cart', 'update_cart', 'update_cart_item', 'remove_cart_item', 'checkout'):
+            self.fill_cart()
+        payment_intent = self.stripe.create_intent(status='succeeded')['id']
+        if name == 'payment_success':
+            Order.objects.filter(user=self.customer, status='pending', payment_status='pending').delete()
+            Order.objects.create(user=self.customer, order_number=f'PERF-{payment_intent}',
+                                 stripe_payment_intent_id=payment_intent)
+        
+        get = lambda path, data=None: ('get', path, data, {})
+        url = lambda route, *args: reverse(f'restaurant:{route}', args=args)
+        return {
+            'menu_list': get(url('menu_list')),
+            'menu_autocomplete': get(url('menu_autocomplete'), {'q': 'Dish 1'}),
+            'menu_detail': get(url('menu_detail', dish)),
+            'menu_item_create': get(url('menu_item_create')),
+            'menu_item_update': get(url('menu_item_update', dish)),
+            'menu_item_delete': get(url('menu_item_delete', dish)),
+            'menu_api': get(url('menu_api')),
+            'menu_api_changes': get(url('menu_api_changes'),
+                                    {'since': (timezone.now() - timedelta(hours=1)).isoformat()}),
+            'cart': get(url('cart')),
+            'add_to_cart': ('post', url('add_to_cart'), {'menu_item_id': dish, 'quantity': 1}, {}),
+            'update_cart': ('post', url('update_cart'), json.dumps([{'item_id': dish, 'quantity': 2}]),
+                            {'content_type': 'application/json'}),
+            'update_cart_item': ('post', url('update_cart_item', dish), {'quantity': 2}, {}),
+            'remove_cart_item': ('post', url('remove_cart_item', dish), None, {}),
+            'checkout': get(url('checkout')),
+            'payment_success': get(url('payment_success'), {'payment_intent': payment_intent}),
+            'payment_cancel': get(url('payment_cancel')),
+            'order_list': get(url('order_list')),
+            'order_detail': get(url('order_detail', order)),
+            'order_invoice': get(url('order_invoice', order)),
+            'order_export': get(url('order_export'), {'payment_status': 'paid'}),
+            'reservation_list': get(url('reservation_list')),
+            'reservation_create': get(url('reservation_create')),
+            'reservation_detail': get(url('reservation_detail', reservation)),
+            'reservation_update': get(url('reservation_update', reservation)),
+            'reservation_delete': get(url('reservation_delete', reservation)),
+        }[name]
+    
+    def measure(self, name):
+        """Request a route once to warm caches, then RUNS times measured; return its report entry."""
+        queries, timings, status = 0, [], None
+        for run in range(self.RUNS + 1):
+            method, path, data, extra = self.prepare(name)
+            with CaptureQueriesContext(connection) as captured:
+                start = clock.perf_counter()
+                response = getattr(self.client, method)(path, data, **extra)
+                if response.streaming:
+                    # A streamed body does its work while it is read
+                    b''.join(response.streaming_content)
+                elapsed = (clock.perf_counter() - start) * 1000
+            if run:
+                queries = max(queries, len(captured))
+                timings.append(elapsed)
+            status = response.status_code
+        max_queries, max_ms = self.BUDGETS[name]
+        ms = round(min(timings), 2)
+        return {
+            'route': name,
+            'status': status,
+            'queries': queries,
+            'max_queries': max_queries,
+            'ms': ms,
+            'max_ms': max_ms,
+            'within_budget': status < 400 and queries <= max_queries and ms <= max_ms,
+        }
+    
+    def write_report(self, results):
+        """Write the measurements as JSON for CI to collect."""
+        path = os.environ.get('PERF_REPORT') or os.path.join(
+            tempfile.gettempdir(), 'restaurant-perf-report.json'
+        )
+        report = {
+            'menu_items': self.MENU_ITEMS,
+            'orders': self.ORDERS,
+            'reservations': self.RESERVATIONS,
+            'runs': self.RUNS,
+            'routes': results,
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    
+    def test_every_route_has_a_budget(self):
+        """Test that a new route can't be added without a performance budget."""
+        names = {pattern.name for pattern in restaurant_urls.urlpatterns if pattern.name}
+        self.assertEqual(names, set(self.BUDGETS))
+    
+    def test_routes_within_budget(self):
+        """Test that every route stays within its query and time budget."""
+        results = [self.measure(name) for name in self.BUDGETS]
+        self.write_report(results)
+        for result in results:
+            with self.subTest(result['route']):
+                self.assertLess(result['status'], 400)
+                self.assertLessEqual(result['queries'], result['max_queries'], 'query budget exceeded')
+                self.assertLessEqual(result['ms'], result['max_ms'], 'time budget exceeded')
+
+
+class InvoiceCacheTest(InvoiceRootMixin, TestCase):
+    """Test cases for stored, ETag-validated invoice PDFs."""
+    
+    def setUp(self):
+        """Set up a customer with a paid order."""
+        self.use_throwaway_invoice_root()
+        self.user = User.objects.create_user(username='invoiced', password='testpass123')
+        self.client.login(username='invoiced', password='testpass123')
+        self.order = Order.objects.create(
+            user=self.user, order_number='INV-001', status='completed', payment_status='paid'
+        )
+        OrderItem.objects.create(
+            order=self.order, menu_item=MenuItem.objects.create(name='Pie', price=Decimal('8.00')), quantity=2
+        )
+        self.order.refresh_from_db()
+        self.url = reverse('restaurant:order_invoice', args=[self.order.pk])
+    
+    def download(self, **headers):
+        """Download the invoice and return (response, body)."""
+        response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.status_code == 200 else b''
+        return response, body
+    
+    def test_invoice_rendered_once_and_streamed(self):
+        """Test that the PDF is stored on first download and streamed from storage after."""
+        response, first = self.download()
+        self.assertTrue(response.streaming)
+        self.assertTrue(first.startswith(b'%PDF'))
+        self.assertIn('attachment; filename="Invoice_INV-001.pdf"', response['Content-Disposition'])
+        self.assertTrue(invoice_storage().exists(invoice_name(self.order)))
+        
+        with mock.patch('restaurant.invoices.render_invoice_pdf') as render:
+            response, second = self.download()
+        render.assert_not_called()
+        self.assertEqual(second, first)
+    
+    def test_unchanged_invoice_is_not_modified(self):
+        """Test that a client holding the current ETag gets a 304."""
+        response, _ = self.download()
+        response, _ = self.download(if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+    
+    def test_changed_order_renders_new_invoice(self):
+        """Test that saving the order selects a new invoice and deletes the old file."""
+        response, _ = self.download()
+        old_name = invoice_name(self.order)
+        self.order.delivery_address = '1 New Street'
+        self.order.save()
+        
+        response, body = self.download(if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(body.startswith(b'%PDF'))
+        self.assertTrue(invoice_storage().exists(invoice_name(self.order)))
+        self.assertFalse(invoice_storage().exists(old_name))
+    
+    def test_unpaid_order_has_no_invoice(self):
+        """Test that pending orders redirect instead of rendering an invoice."""
+        self.order.payment_status = 'pending'
+        self.order.status = 'processing'
+        self.order.save()
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('restaurant:order_detail', args=[self.order.pk]))
+        self.assertEqual(os.listdir(self.invoice_root), [])
+
+
+class InvoiceRendererTest(TestCase):
+    """Test cases for the shared invoice renderer."""
+    
+    def setUp(self):
+        """Set up a paid order with customer-entered text."""
+        user = User.objects.create_user(username='renderee', email='renderee@example.com')
+        self.order = Order.objects.create(
+            user=user, order_number='INV-R1', status='completed', payment_status='paid',
+            stripe_payment_intent_id='pi_123', delivery_address='1 High Street',
+            special_instructions='No <onions> & extra chips',
+        )
+        OrderItem.objects.create(
+            order=self.order, menu_item=MenuItem.objects.create(name='Fish', price=Decimal('9.00')), quantity=1
+        )
+        self.order.refresh_from_db()
+    
+    def test_renderer_is_shared(self):
+        """Test that styles are built once per process."""
+        self.assertIs(get_invoice_renderer(), get_invoice_renderer())
+    
+    def test_renders_pdf_with_customer_markup(self):
+        """Test that instructions containing markup characters render instead of breaking the PDF."""
+        pdf = get_invoice_renderer().render(self.order, self.order.order_items.select_related('menu_item'))
+        self.assertTrue(pdf.startswith(b'%PDF'))
+    
+    def test_benchmark_command(self):
+        """Test that the benchmark reports throughput and memory for both modes."""
+        out = StringIO()
+        call_command('benchmark_invoice_render', lines=2, runs=1, stdout=out)
+        self.assertIn('Styles per render', out.getvalue())
+        self.assertIn('KiB/invoice', out.getvalue())
+
+
+class InvoiceArchiveTest(InvoiceRootMixin, TestCase):
+    """Test cases for bulk invoice archives."""
+    
+    def setUp(self):
+        """Set up two customers with paid orders in different months and an unpaid one."""
+        self.use_throwaway_invoice_root()
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com')
+        bob = User.objects.create_user(username='bob', email='bob@example.com')
+        dish = MenuItem.objects.create(name='Stew', price=Decimal('7.50'))
+        self.orders = {}
+        for number, user, month, payment_status in [
+            ('ARC-1', self.alice, 1, 'paid'),
+            ('ARC-2', self.alice, 2, 'paid'),
+            ('ARC-3', bob, 1, 'paid'),
+            ('ARC-4', bob, 1, 'pending'),
+        ]:
+            order = Order.objects.create(
+                user=user, order_number=number, status='completed', payment_status=payment_status
+            )
+            OrderItem.objects.create(order=order, menu_item=dish, quantity=2)
+            created = timezone.make_aware(datetime(2025, month, 15, 12, 0))
+            Order.objects.filter(pk=order.pk).update(created_at=created)
+            self.orders[number] = order
+    
+    def export(self, **options):
+        """Run the command in-process; return (output, names in the archive)."""
+        path = os.path.join(self.archive_dir, 'invoices.zip')
+        out = StringIO()
+        call_command('export_invoices', path, workers=1, stdout=out, **options)
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                self.assertTrue(archive.read(info).startswith(b'%PDF'))
+            return out.getvalue(), sorted(archive.namelist())
+    
+    def test_exports_paid_invoices(self):
+        """Test that every paid order, and only those, gets an invoice in the archive."""
+        output, names = self.export()
+        self.assertEqual(names, ['Invoice_ARC-1.pdf', 'Invoice_ARC-2.pdf', 'Invoice_ARC-3.pdf'])
+        self.assertIn('3 invoices (3 rendered, 0 from storage)', output)
+        self.assertIn('PDFs/sec', output)
+    
+    def test_filters_by_month_and_account(self):
+        """Test the --month and --user filters."""
+        _, names = self.export(month='2025-01')
+        self.assertEqual(names, ['Invoice_ARC-1.pdf', 'Invoice_ARC-3.pdf'])
+        _, names = self.export(month='2025-01', user='alice@example.com')
+        self.assertEqual(names, ['Invoice_ARC-1.pdf'])
+    
+    def test_reuses_stored_invoices(self):
+        """Test that invoices already in storage are copied instead of rendered."""
+        order = Order.objects.get(order_number='ARC-2')
+        with open_invoice(order) as f:
+            stored = f.read()
+        output, _ = self.export(month='2025-02')
+        self.assertIn('1 invoices (0 rendered, 1 from storage)', output)
+        with zipfile.ZipFile(os.path.join(self.archive_dir, 'invoices.zip')) as archive:
+            self.assertEqual(archive.read('Invoice_ARC-2.pdf'), stored)
+    
+    def test_loads_orders_in_chunks(self):
+        """Test that each chunk of orders costs two queries, however many lines they have."""
+        # Two chunks of orders and lines, then the query that finds no more
+        with self.assertNumQueries(5):
+            stats = write_invoice_archive(Order.objects.all(), BytesIO(), chunk_size=2)
+        self.assertEqual(stats.invoices, 3)
+    
+    def test_worker_renders_without_queries(self):
+        """Test that an order sent to a worker process carries everything its invoice needs."""
+        order = Order.objects.select_related('user').prefetch_related('order_items__menu_item').get(
+            order_number='ARC-1'
+        )
+        order = pickle.loads(pickle.dumps(order))
+        with self.assertNumQueries(0):
+            pdf = get_invoice_renderer().render(order, order.order_items.all())
+        self.assertTrue(pdf.startswith(b'%PDF'))
+    
+    def test_admin_action_downloads_zip(self):
+        """Test that the OrderAdmin action returns a ZIP of the selected paid orders."""
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='testpass123')
+        self.client.login(username='admin', password='testpass123')
+        response = self.client.post(reverse('admin:restaurant_order_changelist'), {
+            'action': 'download_invoices',
+            '_selected_action': [self.orders['ARC-1'].pk, self.orders['ARC-4'].pk],
+        })
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ['Invoice_ARC-1.pdf'])
+
+
+class OrderExportTest(TestCase):
+    """Test cases for the streaming order export."""
+    
+    def setUp(self):
+        """Set up orders in different months and states, and a staff user."""
+        self.staff = User.objects.create_user(username='exporter', password='testpass123', is_staff=True)
+        customer = User.objects.create_user(username='diner', email='diner@example.com')
+        soup = MenuItem.objects.create(name='Soup, "hot"', price=Decimal('4.50'))
+        bread = MenuItem.objects.create(name='Bread', price=Decimal('2.00'))
+        for number, month, payment_status, dishes in [
+            ('EXP-1', 1, 'paid', [soup, bread]),
+            ('EXP-2', 2, 'paid', [soup]),
+            ('EXP-3', 2, 'refunded', [bread]),
+        ]:
+            order = Order.objects.create(
+                user=customer, order_number=number, status='completed', payment_status=payment_status
+            )
+            for dish in dishes:
+                OrderItem.objects.create(order=order, menu_item=dish, quantity=2)
+            created = timezone.make_aware(datetime(2025, month, 10, 18, 30))
+            Order.objects.filter(pk=order.pk).update(created_at=created)
+        self.url = reverse('restaurant:order_export')
+    
+    def download(self, **params):
+        """Download the export as staff; return the response and its text."""
+        self.client.login(username='exporter', password='testpass123')
+        response = self.client.get(self.url, params)
+        body = b''.join(response.streaming_content).decode() if response.streaming else ''
+        return response, body
+    
+    async def test_export_streams_under_asgi(self):
+        """Test that under ASGI the export is sent block by block, not read into memory first."""
+        await sync_to_async(self.client.force_login)(self.staff)
+        session = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+            'method': 'GET', 'path': self.url, 'query_string': b'format=csv',
+            'headers': [(b'host', b'testserver'), (b'cookie', f'{settings.SESSION_COOKIE_NAME}={session}'.encode())],
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+        }
+        received = []
+        
+        async def receive():
+            if received:
+                await asyncio.Event().wait()  # the client stays connected
+            received.append(True)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        
+        sent = []
+        
+        async def send(message):
+            sent.append(message)
+        
+        with warnings.catch_warnings(record=True) as caught, mock.patch('restaurant.order_export.EXPORT_BLOCK_SIZE', 1):
+            warnings.simplefilter('always')
+            # handle() rather than __call__, whose thread-sensitive context
+            # would run the view off this test's database connection
+            await ASGIHandler().handle(scope, receive, send)
+        self.assertFalse([w for w in caught if 'must consume synchronous iterators' in str(w.message)])
+        self.assertEqual(sent[0]['status'], 200)
+        blocks = [message['body'] for message in sent if message.get('body')]
+        self.assertGreater(len(blocks), 2)
+        rows = list(csv.DictReader(StringIO(b''.join(blocks).decode())))
+        self.assertEqual(len(rows), 4)
+    
+    def test_csv_export(self):
+        """Test that the CSV has a header and one row per order line."""
+        response, body = self.download()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual([row['order_number'] for row in rows], ['EXP-1', 'EXP-1', 'EXP-2', 'EXP-3'])
+        self.assertEqual(rows[0]['menu_item'], 'Soup, "hot"')
+        self.assertEqual(rows[0]['subtotal'], '9.00')
+        self.assertEqual(rows[0]['order_total'], '13.00')
+    
+    def test_jsonl_export_with_filters(self):
+        """Test the JSON Lines format with date range and payment status filters."""
+        response, body = self.download(format='jsonl', start='2025-02-01', end='2025-02-28', payment_status='paid')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['order_number'], 'EXP-2')
+        self.assertEqual(rows[0]['price'], '4.50')
+        self.assertTrue(rows[0]['created_at'].startswith('2025-02-10T'))
+    
+    def test_end_date_is_inclusive(self):
+        """Test that orders placed during the end date are exported."""
+        _, body = self.download(format='jsonl', end='2025-01-10')
+        self.assertEqual({json.loads(line)['order_number'] for line in body.splitlines()}, {'EXP-1'})
+    
+    def test_invalid_filters(self):
+        """Test that unknown statuses and reversed ranges are rejected."""
+        response, _ = self.download(status='lost')
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.download(start='2025-03-01', end='2025-01-01')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_staff_only(self):
+        """Test that customers can't export orders."""
+        User.objects.create_user(username='nosy', password='testpass123')
+        self.client.login(username='nosy', password='testpass123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+    
+    def test_rows_stream_in_chunks(self):
+        """Test that rows are read through an iterator, not a cached queryset."""
+        rows = export_rows()
+        self.assertIs(iter(rows), rows)
+        with mock.patch('restaurant.order_export.EXPORT_BLOCK_SIZE', 1):
+            blocks = list(export_blocks(rows, 'csv'))
+        # One block per row (the header goes with the first), then the empty remainder
+        self.assertEqual(len(blocks), 5)
+    
+    def test_command_writes_file(self):
+        """Test the export_orders command."""
+        path = os.path.join(tempfile.mkdtemp(), 'orders.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        out = StringIO()
+        call_command('export_orders', output=path, payment_status='paid', stdout=out)
+        self.assertIn('Exported 3 order lines', out.getvalue())
+        with open(path, newline='') as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 3)
+
+
+class StripePaymentTest(FakeStripeMixin, TestCase):
+    """Test cases for the async checkout and payment views against a fake Stripe."""
+    
+    def setUp(self):
+        """Set up a customer with a dish in their cart."""
+        self.use_fake_stripe()
+        self.user = User.objects.create_user(username='payer', password='testpass123')
+        self.client.login(username='payer', password='testpass123')
+        self.dish = MenuItem.objects.create(name='Curry', price=Decimal('11.50'))
+        self.client.post(reverse('restaurant:add_to_cart'), {'menu_item_id': self.dish.pk, 'quantity': 2})
+    
+    def paid_order(self, number='PAY-1'):
+        """Create an order whose PaymentIntent has succeeded."""
+        intent = self.stripe.create_intent(amount=2300, status='succeeded')
+        return Order.objects.create(
+            user=self.user, order_number=number, status='processing', stripe_payment_intent_id=intent['id']
+        )
+    
+    def test_checkout_creates_payment_intent(self):
+        """Test that checkout creates a PaymentIntent for the order total."""
+        response = self.client.get(reverse('restaurant:checkout'))
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(user=self.user, status='pending')
+        intent = self.stripe.intents[order.stripe_payment_intent_id]
+        self.assertEqual(intent['amount'], 2300)
+        self.assertEqual(intent['currency'], 'gbp')
+        self.assertEqual(intent['metadata'], {'order_number': order.order_number, 'user_id': str(self.user.pk)})
+        self.assertContains(response, intent['client_secret'])
+    
+    def test_payment_success_marks_order_paid(self):
+        """Test that a succeeded PaymentIntent marks the order paid."""
+        self.client.get(reverse('restaurant:checkout'))
+        order = Order.objects.get(user=self.user, status='pending')
+        self.stripe.succeed(order.stripe_payment_intent_id)
+        response = self.client.get(reverse('restaurant:payment_success'),
+                                   {'payment_intent': order.stripe_payment_intent_id})
+        self.assertContains(response, 'Payment successful')
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.payment_status), ('processing', 'paid'))
+    
+    def test_payment_keeps_total_changed_during_stripe_call(self):
+        """Test that marking an order paid doesn't write back a total read before the Stripe call."""
+        order = self.paid_order()
+        retrieve = restaurant_views.retrieve_payment_intent
+        
+        async def retrieve_while_total_moves(payment_intent_id):
+            await sync_to_async(shift_order_total)(order.pk, Decimal('5.00'))
+            return await retrieve(payment_intent_id)
+        
+        with mock.patch.object(restaurant_views, 'retrieve_payment_intent', retrieve_while_total_moves):
+            self.client.get(reverse('restaurant:payment_success'), {'payment_intent': order.stripe_payment_intent_id})
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, 'paid')
+        self.assertEqual(order.total_amount, Decimal('5.00'))
+    
+    def test_unfinished_payment_returns_to_checkout(self):
+        """Test that an unpaid PaymentIntent sends the customer back to checkout."""
+        self.client.get(reverse('restaurant:checkout'))
+        order = Order.objects.get(user=self.user, status='pending')
+        response = self.client.get(reverse('restaurant:payment_success'),
+                                   {'payment_intent': order.stripe_payment_intent_id})
+        self.assertRedirects(response, reverse('restaurant:checkout'), fetch_redirect_response=False)
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, 'pending')
+    
+    def test_slow_stripe_times_out(self):
+        """Test that a Stripe call slower than STRIPE_TIMEOUT fails fast instead of holding the request."""
+        order = self.paid_order()
+        self.stripe.latency = 1.0
+        with override_settings(STRIPE_TIMEOUT=0.1):
+            start = clock.perf_counter()
+            response = self.client.get(reverse('restaurant:payment_success'),
+                                       {'payment_intent': order.stripe_payment_intent_id})
+            elapsed = clock.perf_counter() - start
+        self.assertLess(elapsed, 0.9)
+        self.assertContains(response, 'Payment verification error')
+        order.refresh_from_db()
+        self.assertEqual(order.payment_status, 'pending')
+    
+    async def test_concurrent_payments_share_the_event_loop(self):
+        """Test that, under ASGI, slow Stripe calls of concurrent requests overlap."""
+        orders = [await sync_to_async(self.paid_order)(f'PAY-{i}') for i in range(5)]
+        self.stripe.latency = 0.3
+        await self.async_client.aforce_login(self.user)
+        url = reverse('restaurant:payment_success')
+        start = clock.perf_counter()
+        responses = await asyncio.gather(*[
+            self.async_client.get(url, {'payment_intent': order.stripe_payment_intent_id})
+            for order in orders
+        ])
+        elapsed = clock.perf_counter() - start
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        # One after another this would take 1.5s
+        self.assertLess(elapsed, 1.2)
+        paid = await Order.objects.filter(payment_status='paid', order_number__startswith='PAY-').acount()
+        self.assertEqual(paid, 5)
+
+
+class AsyncWhiteNoiseTest(TestCase):
+    """Test cases for the async-capable WhiteNoise middleware."""
+    
+    def setUp(self):
+        """Set up a static directory with one stylesheet."""
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root, ignore_errors=True)
+        with open(os.path.join(self.static_root, 'site.css'), 'w') as f:
+            f.write('body {}')
+        self.factory = RequestFactory()
+    
+    def test_async_stack(self):
+        """Test that in an async stack static files are served and other requests awaited."""
+        async def view(request):
+            return HttpResponse('view')
+        
+        middleware = AsyncWhiteNoiseMiddleware(view)
+        middleware.add_files(self.static_root, prefix='static/')
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(self.factory.get('/static/site.css'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'body {}')
+        self.assertEqual(async_to_sync(middleware)(self.factory.get('/menu/')).content, b'view')
+    
+    def test_sync_stack(self):
+        """Test that in a sync stack it behaves like WhiteNoiseMiddleware."""
+        middleware = AsyncWhiteNoiseMiddleware(lambda request: HttpResponse('view'))
+        self.assertFalse(iscoroutinefunction(middleware))
+        self.assertEqual(middleware(self.factory.get('/menu/')).content, b'view')
+
+
+class StripeBenchmarkTest(TransactionTestCase):
+    """Test cases for the Stripe latency benchmark."""
+    
+    def test_benchmark_command(self):
+        """Test that the benchmark serves every request in both modes and reports throughput."""
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Worker threads need their own connections to a shared database
+            self.skipTest('needs a file or server database')
+        out = StringIO()
+        call_command('benchmark_stripe', latency=50, requests=4, workers=2, stdout=out)
+        self.assertIn('ASGI event loop', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='stripe-benchmark-').exists())
@@ -9,14 +9,20 @@ urlpatterns = [
     
     # Menu items
     path('menu/', views.menu_list, name='menu_list'),
+    path('menu/autocomplete/', views.menu_autocomplete, name='menu_autocomplete'),
     path('menu/<int:pk>/', views.menu_detail, name='menu_detail'),
     path('menu/create/', views.menu_item_create, name='menu_item_create'),
     path('menu/<int:pk>/update/', views.menu_item_update, name='menu_item_update'),
     path('menu/<int:pk>/delete/', views.menu_item_delete, name='menu_item_delete'),
     
+    # JSON API
+    path('api/v1/menu/', views.menu_api, name='menu_api'),
+    path('api/v1/menu/changes/', views.menu_api_changes, name='menu_api_changes'),
+    
     # Cart and checkout
     path('cart/', views.cart, name='cart'),
     path('cart/add/', views.add_to_cart, name='add_to_cart'),
+    path('cart/update/', views.update_cart, name='update_cart'),
     path('cart/item/<int:item_id>/update/', views.update_cart_item, name='update_cart_item'),
     path('cart/item/<int:item_id>/remove/', views.remove_cart_item, name='remove_cart_item'),
     path('checkout/', views.checkout, name='checkout'),
@@ -27,6 +33,7 @@ urlpatterns = [
     path('orders/', views.order_list, name='order_list'),
     path('orders/<int:pk>/', views.order_detail, name='order_detail'),
     path('orders/<int:pk>/invoice/', views.order_invoice, name='order_invoice'),
+    path('orders/export/', views.order_export, name='order_export'),
     
     # Reservations
     path('reservations/', views.reservation_list, name='reservation_list'),
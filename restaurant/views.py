@@ -1,31 +1,37 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST
-from django.db.models import Q
+from django.http import Http404, JsonResponse, HttpResponse
+from django.views.decorators.http import require_POST, require_safe
 from django.utils import timezone
 from django.conf import settings
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 from urllib.parse import urlparse, parse_qs
-import uuid
 from decimal import Decimal
-from io import BytesIO
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 
-try:
-    import stripe
-    stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
-except ImportError:
-    stripe = None
+from flavour.responses import AsyncFileResponse, AsyncStreamingHttpResponse
 
-from .models import MenuItem, Order, OrderItem, Reservation
-from .forms import MenuItemForm, ReservationForm, OrderItemForm
+from .models import MenuItem, Order, Reservation, order_item_rows
+from .forms import MenuItemForm, ReservationForm, OrderExportForm, OrderItemForm
+from .invoices import invoice_etag, open_invoice
+from .autocomplete import get_autocomplete_index
+from .cart import cart_payload, get_cart, parse_cart_changes
+from .conditional import conditional_page, page_etag
+from .menu_api import choose_encoding, get_menu_body, parse_fields
+from .menu_sync import menu_changes, parse_since
+from .order_export import CONTENT_TYPES, export_blocks, export_rows
+from .menu_cache import get_menu_snapshot, get_menu_version, group_by_category, menu_sort_key
+from .pagination import keyset_paginate, keyset_paginate_list
+from .payments import create_payment_intent, payments_configured, retrieve_payment_intent, stripe
+from .search import search_menu_item_ids
+
+
+# Page sizes for the keyset-paginated listings
+MENU_PAGE_SIZE = 24
+ORDER_PAGE_SIZE = 12
+RESERVATION_PAGE_SIZE = 12
 
 
 def is_staff_user(user):
@@ -33,10 +39,42 @@ def is_staff_user(user):
     return user.is_staff
 
 
+def _menu_etag(request, *args, **kwargs):
+    """ETag for pages built from the whole menu."""
+    return page_etag(request, 'menu', get_menu_version())
+
+
+def _menu_last_modified(request, *args, **kwargs):
+    """Last-Modified for pages built from the whole menu."""
+    return get_menu_snapshot().last_modified
+
+
+def _menu_item_updated_at(pk):
+    """Return a menu item's updated_at, from the snapshot when possible."""
+    menu_item = get_menu_snapshot().by_pk.get(pk)
+    if menu_item is not None:
+        return menu_item.updated_at
+    return MenuItem.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+
+
+def _menu_item_etag(request, pk):
+    """ETag for a menu item's detail page."""
+    updated_at = _menu_item_updated_at(pk)
+    if updated_at is None:
+        return None
+    return page_etag(request, 'menu_detail', pk, updated_at.isoformat())
+
+
+def _menu_item_last_modified(request, pk):
+    """Last-Modified for a menu item's detail page."""
+    return _menu_item_updated_at(pk)
+
+
+@conditional_page(_menu_etag, _menu_last_modified)
 def home(request):
     """Home page view."""
     # Get featured menu items (available items)
-    featured_items = MenuItem.objects.filter(is_available=True)[:6]
+    featured_items = get_menu_snapshot().items[:6]
     
     context = {
         'featured_items': featured_items,
@@ -44,46 +82,134 @@ def home(request):
     return render(request, 'restaurant/home.html', context)
 
 
+@conditional_page(_menu_etag, _menu_last_modified)
 def menu_list(request):
     """
     View function for displaying the menu list.
     Includes filtering and search functionality.
+    Browsing is paginated by cursor; search results are shown in rank order on one page.
     """
-    menu_items = MenuItem.objects.filter(is_available=True)
     category_filter = request.GET.get('category', '')
     search_query = request.GET.get('search', '')
+    fuzzy_match = False
     
-    # Filter by category
-    if category_filter:
-        menu_items = menu_items.filter(category=category_filter)
-    
-    # Search functionality
+    # Serve from the in-memory snapshot instead of querying on every hit
+    snapshot = get_menu_snapshot()
     if search_query:
-        menu_items = menu_items.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
+        # Ranked matches from the full-text index, best first
+        menu_items = snapshot.filter(
+            category=category_filter,
+            ids=search_menu_item_ids(search_query)
         )
+        if not menu_items:
+            # Nothing matched exactly; fall back to typo-tolerant matches
+            menu_items = snapshot.filter(
+                category=category_filter,
+                ids=get_autocomplete_index().suggest(search_query, limit=None)
+            )
+            fuzzy_match = bool(menu_items)
+        page = None
+    else:
+        menu_items = snapshot.filter(category=category_filter)
+        page = keyset_paginate_list(request, menu_items, menu_sort_key, MENU_PAGE_SIZE)
+    result_count = len(menu_items)
+    if page is not None:
+        menu_items = page.object_list
     
     # Group by category for display
-    categories = {}
-    for item in menu_items:
-        if item.category not in categories:
-            categories[item.category] = []
-        categories[item.category].append(item)
+    if category_filter or search_query or (page is not None and page.has_other_pages):
+        categories = group_by_category(menu_items)
+    else:
+        categories = snapshot.categories
     
     context = {
         'menu_items': menu_items,
+        'result_count': result_count,
+        'page': page,
         'categories': categories,
         'category_filter': category_filter,
         'search_query': search_query,
+        'fuzzy_match': fuzzy_match,
         'category_choices': MenuItem.CATEGORY_CHOICES,
     }
     return render(request, 'restaurant/menu_list.html', context)
 
 
+def menu_autocomplete(request):
+    """
+    Return typo-tolerant menu suggestions as JSON for the search box.
+    Answered entirely from memory; the database is only read when the menu changes.
+    """
+    query = request.GET.get('q', '').strip()[:100]
+    snapshot = get_menu_snapshot()
+    results = []
+    for pk in get_autocomplete_index().suggest(query):
+        item = snapshot.by_pk.get(pk)
+        if item is None:
+            continue
+        results.append({
+            'id': item.pk,
+            'name': item.name,
+            'category': item.get_category_display(),
+            'price': str(item.price),
+            'url': reverse('restaurant:menu_detail', args=[item.pk]),
+        })
+    return JsonResponse({'query': query, 'results': results})
+
+
+@require_safe
+def menu_api(request):
+    """
+    Serve the available menu as JSON, grouped by category (API v1).
+    ?fields=name,price limits each item to those fields; the body is
+    pre-serialized and pre-compressed, so no query runs per request.
+    """
+    try:
+        fields = parse_fields(request.GET.get('fields', ''))
+    except ValueError as e:
+        return JsonResponse({'error': f'Unknown field(s): {e}'}, status=400)
+    
+    body = get_menu_body(fields)
+    encoding = choose_encoding(body, request.headers.get('Accept-Encoding'))
+    etag = body.etags[encoding]
+    
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body.encodings[encoding], content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+@require_safe
+def menu_api_changes(request):
+    """
+    Return menu items changed and deleted since ?since= (a sync token,
+    ISO timestamp or menu version) so clients can sync incrementally.
+    """
+    try:
+        since = parse_since(request.GET.get('since'))
+    except ValueError:
+        return JsonResponse(
+            {'error': 'Pass ?since= with a sync_token, ISO timestamp or menu_version.'}, status=400
+        )
+    try:
+        fields = parse_fields(request.GET.get('fields', ''))
+    except ValueError as e:
+        return JsonResponse({'error': f'Unknown field(s): {e}'}, status=400)
+    
+    response = JsonResponse(menu_changes(since, fields))
+    patch_cache_control(response, no_store=True)
+    return response
+
+
+@conditional_page(_menu_item_etag, _menu_item_last_modified)
 def menu_detail(request, pk):
     """View for displaying menu item details."""
-    menu_item = get_object_or_404(MenuItem, pk=pk)
+    menu_item = get_menu_snapshot().by_pk.get(pk) or get_object_or_404(MenuItem, pk=pk)
     context = {
         'menu_item': menu_item,
     }
@@ -160,33 +286,14 @@ def add_to_cart(request):
             menu_item_id = form.cleaned_data['menu_item_id']
             quantity = form.cleaned_data['quantity']
             
-            try:
-                menu_item = MenuItem.objects.get(pk=menu_item_id, is_available=True)
-            except MenuItem.DoesNotExist:
+            # Available items are all in the menu snapshot
+            menu_item = get_menu_snapshot().by_pk.get(menu_item_id)
+            if menu_item is None:
                 messages.error(request, 'Menu item not found or unavailable.')
                 return redirect('restaurant:menu_list')
             
-            # Get or create cart (pending order)
-            cart, created = Order.objects.get_or_create(
-                user=request.user,
-                status='pending',
-                payment_status='pending',
-                defaults={'order_number': f'CART-{uuid.uuid4().hex[:8].upper()}'}
-            )
-            
-            # Check if item already in cart
-            order_item, created = OrderItem.objects.get_or_create(
-                order=cart,
-                menu_item=menu_item,
-                defaults={'quantity': quantity, 'price': menu_item.price}
-            )
+            get_cart(request).add(menu_item, quantity)
             
-            if not created:
-                # Update quantity if item already exists
-                order_item.quantity += quantity
-                order_item.save()
-            
-            cart.calculate_total()
             messages.success(request, f'✓ Added {quantity}x {menu_item.name} to cart! Continue shopping or view your cart.')
             
             # Redirect back to menu page, preserving any filters
@@ -211,19 +318,15 @@ def add_to_cart(request):
 @login_required
 def cart(request):
     """View shopping cart."""
-    try:
-        cart = Order.objects.get(user=request.user, status='pending', payment_status='pending')
-        order_items = cart.order_items.all()
-        
-        # Ensure total is up-to-date
-        cart.calculate_total()
-    except Order.DoesNotExist:
-        cart = None
-        order_items = []
+    # Read-only: viewing the cart never writes; totals are kept by cart mutations
+    cart = get_cart(request)
+    order_items = cart.lines()
     
     context = {
         'cart': cart,
         'order_items': order_items,
+        # Shown total comes from the rows on the page, so it always matches them
+        'cart_total': sum((item.subtotal for item in order_items), Decimal('0.00')),
     }
     return render(request, 'restaurant/cart.html', context)
 
@@ -232,21 +335,15 @@ def cart(request):
 @require_POST
 def update_cart_item(request, item_id):
     """Update quantity of cart item."""
-    order_item = get_object_or_404(OrderItem, pk=item_id, order__user=request.user)
-    cart = order_item.order
     quantity = int(request.POST.get('quantity', 1))
     
+    if not get_cart(request).set_quantity(item_id, quantity):
+        raise Http404('Cart item not found')
     if quantity > 0:
-        order_item.quantity = quantity
-        order_item.save()
         messages.success(request, 'Cart updated!')
     else:
-        order_item.delete()
         messages.success(request, 'Item removed from cart!')
     
-    # Recalculate cart total after update/delete
-    cart.calculate_total()
-    
     return redirect('restaurant:cart')
 
 
@@ -254,43 +351,80 @@ def update_cart_item(request, item_id):
 @require_POST
 def remove_cart_item(request, item_id):
     """Remove item from cart."""
-    order_item = get_object_or_404(OrderItem, pk=item_id, order__user=request.user)
-    cart = order_item.order
-    order_item.delete()
-    
-    # Recalculate cart total after item removal
-    cart.calculate_total()
+    if not get_cart(request).remove(item_id):
+        raise Http404('Cart item not found')
     
     messages.success(request, 'Item removed from cart!')
     return redirect('restaurant:cart')
 
 
 @login_required
-def checkout(request):
-    """Checkout view - create payment intent with Stripe."""
+@require_POST
+def update_cart(request):
+    """
+    Apply a batch of cart changes and return the cart as JSON.
+    The body is a JSON list of {"item_id": ..., "quantity": ...}; 0 removes a line.
+    """
     try:
-        cart = Order.objects.get(user=request.user, status='pending', payment_status='pending')
-        order_items = cart.order_items.all()
-    except Order.DoesNotExist:
-        messages.error(request, 'Your cart is empty.')
-        return redirect('restaurant:cart')
+        changes = parse_cart_changes(request.body)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
-    if not order_items:
+    cart = get_cart(request)
+    missing = cart.apply_changes(changes)
+    if missing:
+        return JsonResponse({'error': 'Cart item(s) not found', 'missing': missing}, status=404)
+    return JsonResponse(cart_payload(cart.lines()))
+
+
+async def _auser(request):
+    """
+    Return the user that login_required loaded with request.auser(), and make
+    request.user the same object so sync code doesn't query it again.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+def _checkout_order(request):
+    """Write the cart to its pending order; return (order, its lines) or None."""
+    cart = get_cart(request).checkout_order()
+    if cart is None:
+        return None
+    return cart, list(order_item_rows(cart.order_items.all()))
+
+
+def _mark_paid(request, order):
+    """Record a successful payment and empty the cart."""
+    order.payment_status = 'paid'
+    order.status = 'processing'
+    # Not a full save: total_amount was read before the Stripe round trip
+    # and may have moved since (see shift_order_total)
+    order.save(update_fields=['status', 'payment_status', 'updated_at'])
+    get_cart(request).clear()
+
+
+@login_required
+async def checkout(request):
+    """
+    Checkout view - create payment intent with Stripe.
+    Async, so the Stripe round trip doesn't hold a worker (see restaurant.payments).
+    """
+    user = await _auser(request)
+    # Write the cart to a pending order (and reconcile its total) before charging
+    checkout_order = await sync_to_async(_checkout_order)(request)
+    if checkout_order is None:
         messages.error(request, 'Your cart is empty.')
         return redirect('restaurant:cart')
-    
-    # Calculate total
-    total_amount = cart.calculate_total()
+    cart, order_items = checkout_order
+    total_amount = cart.total_amount
     
     # Create Stripe payment intent
     if not stripe:
         messages.error(request, 'Payment system is not available. Please contact support.')
         return redirect('restaurant:cart')
     
-    stripe_secret_key = getattr(settings, 'STRIPE_SECRET_KEY', '')
-    stripe_publishable_key = getattr(settings, 'STRIPE_PUBLISHABLE_KEY', '')
-    
-    if not stripe_secret_key or not stripe_publishable_key:
+    if not payments_configured():
         messages.error(request, 'Payment system is not configured. Please contact support.')
         return redirect('restaurant:cart')
     
@@ -298,54 +432,53 @@ def checkout(request):
         # Convert to cents for Stripe
         amount_in_cents = int(total_amount * 100)
         
-        payment_intent = stripe.PaymentIntent.create(
+        payment_intent = await create_payment_intent(
             amount=amount_in_cents,
             currency='gbp',
             metadata={
                 'order_number': cart.order_number,
-                'user_id': str(request.user.id),
+                'user_id': str(user.id),
             }
         )
-        
-        cart.stripe_payment_intent_id = payment_intent.id
-        cart.save()
-        
-        context = {
-            'cart': cart,
-            'order_items': order_items,
-            'total_amount': total_amount,
-            'stripe_publishable_key': stripe_publishable_key,
-            'client_secret': payment_intent.client_secret,
-        }
-        return render(request, 'restaurant/checkout.html', context)
-    
     except stripe.error.StripeError as e:
         messages.error(request, f'Payment error: {str(e)}')
         return redirect('restaurant:cart')
+    
+    cart.stripe_payment_intent_id = payment_intent.id
+    await cart.asave(update_fields=['stripe_payment_intent_id', 'updated_at'])
+    
+    context = {
+        'cart': cart,
+        'order_items': order_items,
+        'total_amount': total_amount,
+        'stripe_publishable_key': settings.STRIPE_PUBLISHABLE_KEY,
+        'client_secret': payment_intent.client_secret,
+    }
+    # Context processors and the template may query the database
+    return await sync_to_async(render)(request, 'restaurant/checkout.html', context)
 
 
 @login_required
-def payment_success(request):
-    """Handle successful payment."""
+async def payment_success(request):
+    """Handle successful payment. Async for the same reason as checkout."""
+    user = await _auser(request)
     payment_intent_id = request.GET.get('payment_intent')
     order = None
     
     if payment_intent_id:
         try:
-            order = Order.objects.get(
-                user=request.user,
+            order = await Order.objects.aget(
+                user=user,
                 stripe_payment_intent_id=payment_intent_id
             )
             
             # Verify payment with Stripe
             if stripe:
                 try:
-                    payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+                    payment_intent = await retrieve_payment_intent(payment_intent_id)
                     
                     if payment_intent.status == 'succeeded':
-                        order.payment_status = 'paid'
-                        order.status = 'processing'
-                        order.save()
+                        await sync_to_async(_mark_paid)(request, order)
                         messages.success(request, f'Payment successful! Order #{order.order_number} is being processed.')
                     else:
                         messages.error(request, 'Payment was not successful. Please try again.')
@@ -354,9 +487,7 @@ def payment_success(request):
                     messages.error(request, f'Payment verification error: {str(e)}')
             else:
                 # If Stripe is not available, assume payment succeeded (for testing)
-                order.payment_status = 'paid'
-                order.status = 'processing'
-                order.save()
+                await sync_to_async(_mark_paid)(request, order)
                 messages.success(request, f'Payment successful! Order #{order.order_number} is being processed.')
         
         except Order.DoesNotExist:
@@ -365,7 +496,7 @@ def payment_success(request):
     context = {
         'order': order,
     }
-    return render(request, 'restaurant/payment_success.html', context)
+    return await sync_to_async(render)(request, 'restaurant/payment_success.html', context)
 
 
 @login_required
@@ -379,10 +510,11 @@ def payment_cancel(request):
 def order_list(request):
     """View user's orders."""
     orders = Order.objects.filter(user=request.user).exclude(status='pending', payment_status='pending')
-    orders = orders.order_by('-created_at')
+    page = keyset_paginate(request, orders, ['-created_at'], ORDER_PAGE_SIZE)
     
     context = {
-        'orders': orders,
+        'orders': page.object_list,
+        'page': page,
     }
     return render(request, 'restaurant/order_list.html', context)
 
@@ -391,7 +523,7 @@ def order_list(request):
 def order_detail(request, pk):
     """View order details."""
     order = get_object_or_404(Order, pk=pk, user=request.user)
-    order_items = order.order_items.all()
+    order_items = list(order_item_rows(order.order_items.all()))
     
     context = {
         'order': order,
@@ -402,217 +534,52 @@ def order_detail(request, pk):
 
 @login_required
 def order_invoice(request, pk):
-    """Generate and download invoice PDF for an order."""
-    order = get_object_or_404(Order, pk=pk, user=request.user)
+    """
+    Download the invoice PDF of a paid order. It is rendered once per order
+    version and then streamed from storage, or answered 304 by ETag.
+    """
+    order = get_object_or_404(Order.objects.select_related('user'), pk=pk, user=request.user)
     
     # Only allow invoice download for paid orders
     if order.payment_status != 'paid':
         messages.error(request, 'Invoice is only available for paid orders.')
         return redirect('restaurant:order_detail', pk=pk)
     
-    order_items = order.order_items.all()
-    
-    # Create PDF buffer
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    
-    # Container for the 'Flowable' objects
-    elements = []
-    
-    # Define styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#c41e3a'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor('#1a1a1a'),
-        spaceAfter=12,
-        fontName='Helvetica-Bold'
-    )
-    
-    normal_style = styles['Normal']
-    normal_style.fontSize = 10
-    
-    # Restaurant information
-    restaurant_info = [
-        [Paragraph('<b>FLAVOUR RESTAURANT</b>', title_style)],
-        [Paragraph('32 Chepstow', normal_style)],
-        [Paragraph('Newport', normal_style)],
-        [Paragraph('Phone: +44 20 1234 5678', normal_style)],
-        [Paragraph('Email: info@flavourrestaurant.com', normal_style)],
-    ]
-    
-    restaurant_table = Table(restaurant_info, colWidths=[7*inch])
-    restaurant_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(restaurant_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Invoice title
-    elements.append(Paragraph('INVOICE', heading_style))
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Order and customer information
-    customer_name = order.user.get_full_name() if order.user.get_full_name() else order.user.username
-    
-    info_data = [
-        ['Invoice Number:', order.order_number],
-        ['Invoice Date:', order.created_at.strftime('%B %d, %Y')],
-        ['Order Date:', order.created_at.strftime('%B %d, %Y at %I:%M %p')],
-        ['Customer Name:', customer_name],
-        ['Customer Email:', order.user.email or 'N/A'],
-    ]
-    
-    if order.delivery_address:
-        info_data.append(['Delivery Address:', order.delivery_address])
-    
-    info_table = Table(info_data, colWidths=[2*inch, 5*inch])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8f9fa')),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#1a1a1a')),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Order items table
-    elements.append(Paragraph('Order Items', heading_style))
-    
-    # Table header
-    table_data = [['Item', 'Category', 'Quantity', 'Unit Price', 'Subtotal']]
-    
-    # Table rows
-    for item in order_items:
-        table_data.append([
-            item.menu_item.name,
-            item.menu_item.get_category_display(),
-            str(item.quantity),
-            f'£{item.price:.2f}',
-            f'£{item.subtotal:.2f}'
-        ])
-    
-    # Table footer with total
-    table_data.append([
-        '',
-        '',
-        '',
-        Paragraph('<b>Total:</b>', normal_style),
-        Paragraph(f'<b>£{order.total_amount:.2f}</b>', normal_style)
-    ])
-    
-    items_table = Table(table_data, colWidths=[2.5*inch, 1.5*inch, 0.8*inch, 1.2*inch, 1*inch])
-    items_table.setStyle(TableStyle([
-        # Header row
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#c41e3a')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TOPPADDING', (0, 0), (-1, 0), 12),
-        
-        # Data rows
-        ('BACKGROUND', (0, 1), (-1, -2), colors.white),
-        ('TEXTCOLOR', (0, 1), (-1, -2), colors.HexColor('#1a1a1a')),
-        ('ALIGN', (0, 1), (-1, -2), 'LEFT'),
-        ('ALIGN', (2, 1), (2, -2), 'CENTER'),
-        ('ALIGN', (3, 1), (4, -2), 'RIGHT'),
-        ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -2), 9),
-        ('BOTTOMPADDING', (0, 1), (-1, -2), 8),
-        ('TOPPADDING', (0, 1), (-1, -2), 8),
-        ('GRID', (0, 0), (-1, -2), 0.5, colors.HexColor('#dee2e6')),
-        
-        # Total row
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f8f9fa')),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#1a1a1a')),
-        ('ALIGN', (0, -1), (2, -1), 'RIGHT'),
-        ('ALIGN', (3, -1), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, -1), (-1, -1), 12),
-        ('TOPPADDING', (0, -1), (-1, -1), 12),
-        ('LINEABOVE', (3, -1), (-1, -1), 1, colors.HexColor('#c41e3a')),
-    ]))
-    elements.append(items_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Payment information
-    payment_info = [
-        [Paragraph('<b>Payment Information</b>', heading_style)],
-        [Paragraph(f'Payment Status: <b>{order.get_payment_status_display()}</b>', normal_style)],
-        [Paragraph(f'Payment Method: Stripe', normal_style)],
-    ]
-    
-    if order.stripe_payment_intent_id:
-        payment_info.append([Paragraph(f'Transaction ID: {order.stripe_payment_intent_id}', normal_style)])
-    
-    payment_table = Table(payment_info, colWidths=[7*inch])
-    payment_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    elements.append(payment_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Special instructions if any
-    if order.special_instructions:
-        instructions = [
-            [Paragraph('<b>Special Instructions</b>', heading_style)],
-            [Paragraph(order.special_instructions, normal_style)],
-        ]
-        instructions_table = Table(instructions, colWidths=[7*inch])
-        instructions_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        elements.append(instructions_table)
-        elements.append(Spacer(1, 0.3*inch))
-    
-    # Footer
-    footer_text = Paragraph(
-        '<i>Thank you for your order! We appreciate your business.</i><br/>'
-        '<i>For any inquiries, please contact us at info@flavourrestaurant.com</i>',
-        ParagraphStyle(
-            'Footer',
-            parent=normal_style,
-            fontSize=9,
-            textColor=colors.HexColor('#6c757d'),
-            alignment=TA_CENTER,
-            spaceBefore=20
+    etag = invoice_etag(order)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = AsyncFileResponse(
+            open_invoice(order),
+            as_attachment=True,
+            filename=f'Invoice_{order.order_number}.pdf',
+            content_type='application/pdf',
         )
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+@user_passes_test(is_staff_user)
+@require_safe
+def order_export(request):
+    """
+    Stream order lines as CSV or JSON Lines (staff only), filtered by
+    ?start=&end= (dates, inclusive), ?status=, ?payment_status= and ?format=.
+    """
+    form = OrderExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Invalid export filters', 'fields': form.errors.get_json_data()}, status=400)
+    
+    filters = form.cleaned_data
+    export_format = filters.pop('format')
+    response = AsyncStreamingHttpResponse(
+        export_blocks(export_rows(**filters), export_format),
+        content_type=CONTENT_TYPES[export_format],
     )
-    elements.append(footer_text)
-    
-    # Build PDF
-    doc.build(elements)
-    
-    # Get PDF value from buffer
-    buffer.seek(0)
-    response = HttpResponse(buffer.read(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="Invoice_{order.order_number}.pdf"'
-    
+    filename = f'orders-{timezone.localdate():%Y%m%d}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    patch_cache_control(response, private=True, no_store=True)
     return response
 
 
@@ -642,15 +609,17 @@ def reservation_create(request):
 @login_required
 def reservation_list(request):
     """View user's reservations."""
-    reservations = Reservation.objects.filter(user=request.user).order_by('date', 'time')
+    reservations = Reservation.objects.filter(user=request.user)
     
     # Filter by status if provided
     status_filter = request.GET.get('status', '')
     if status_filter:
         reservations = reservations.filter(status=status_filter)
+    page = keyset_paginate(request, reservations, ['date', 'time'], RESERVATION_PAGE_SIZE)
     
     context = {
-        'reservations': reservations,
+        'reservations': page.object_list,
+        'page': page,
         'status_filter': status_filter,
     }
     return render(request, 'restaurant/reservation_list.html', context)